@@ -0,0 +1,118 @@
+"""
+Streamed ZIP and tar archives of encrypted documents.
+
+Each document is decrypted one chunk at a time straight into the archive
+stream, and the archive bytes are handed to the response as soon as they are
+produced, so memory use does not grow with the number or size of documents
+and nothing is written to temporary files.
+
+ZIP entries use data descriptors (sizes are written after the data), which
+zipfile does automatically on an unseekable output. Tar headers need the size
+up front: it is taken from StoredObject.meta['size'] (recorded at upload) or,
+for older uploads, counted by a first decryption pass.
+"""
+import os
+import tarfile
+import time
+import zipfile
+
+from storage.utils import iter_decrypt
+
+ARCHIVE_FORMATS = {
+    'zip': ('application/zip', '.zip'),
+    'tar': ('application/x-tar', '.tar'),
+}
+
+
+class _StreamBuffer:
+    """Write-only, unseekable file object whose contents are drained by the generator."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def decrypted_chunks(stored):
+    with stored.encrypted_file.open('rb') as fileobj:
+        yield from iter_decrypt(fileobj)
+
+
+def plaintext_size(stored):
+    size = stored.meta.get('size') if isinstance(stored.meta, dict) else None
+    if size is None:
+        size = sum(len(chunk) for chunk in decrypted_chunks(stored))
+    return size
+
+
+def unique_names(stored_objects):
+    """Archive member names for `stored_objects`, suffixing duplicates: a.txt, a (2).txt, ..."""
+    seen = set()
+    names = []
+    for stored in stored_objects:
+        base, ext = os.path.splitext(os.path.basename(stored.name) or f'document-{stored.pk}')
+        name, n = base + ext, 1
+        while name in seen:
+            n += 1
+            name = f'{base} ({n}){ext}'
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def zip_stream(stored_objects):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, stored in zip(unique_names(stored_objects), stored_objects):
+            info = zipfile.ZipInfo(name, date_time=time.localtime(stored.created_at.timestamp())[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, mode='w', force_zip64=True) as member:
+                for chunk in decrypted_chunks(stored):
+                    member.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def tar_stream(stored_objects):
+    written = 0
+    for name, stored in zip(unique_names(stored_objects), stored_objects):
+        info = tarfile.TarInfo(name)
+        info.size = plaintext_size(stored)
+        info.mtime = int(stored.created_at.timestamp())
+        info.mode = 0o644
+        header = info.tobuf(format=tarfile.PAX_FORMAT)
+        yield header
+        size = 0
+        for chunk in decrypted_chunks(stored):
+            size += len(chunk)
+            yield chunk
+        if size != info.size:
+            raise ValueError(f"Size of {stored.name} changed while archiving")
+        padding = -size % tarfile.BLOCKSIZE
+        yield b'\0' * padding
+        written += len(header) + size + padding
+    # End-of-archive marker, padded to a full record like tarfile does
+    end = b'\0' * (2 * tarfile.BLOCKSIZE)
+    written += len(end)
+    yield end + b'\0' * (-written % tarfile.RECORDSIZE)
+
+
+def archive_stream(stored_objects, fmt):
+    if fmt == 'zip':
+        return zip_stream(stored_objects)
+    if fmt == 'tar':
+        return tar_stream(stored_objects)
+    raise ValueError(f"Unsupported archive format: {fmt}")
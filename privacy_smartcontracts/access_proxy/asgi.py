@@ -0,0 +1,46 @@
+"""
+Lean ASGI handler for signed blob URLs.
+
+privacy_smartcontracts.asgi routes requests under BLOB_PREFIX here instead of
+through Django's handler, so a signed download skips the session, auth,
+messages and CSRF middleware and never touches the database. File reads and
+decryption run in a worker thread, one chunk at a time.
+"""
+from asgiref.sync import sync_to_async
+from django.urls import reverse
+
+from .views import blob_response
+
+BLOB_PREFIX = reverse('access_proxy:blob', args=['-'])[:-len('-/')]
+
+_next_chunk = sync_to_async(next, thread_sensitive=False)
+
+
+def _encode_headers(headers):
+    return [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+
+async def blob_app(scope, receive, send):
+    if scope['method'] not in ('GET', 'HEAD'):
+        status, headers, body = 405, [('Allow', 'GET, HEAD'), ('Content-Type', 'text/plain')], 'Method not allowed'
+    else:
+        token = scope['path'][len(BLOB_PREFIX):].rstrip('/')
+        status, headers, body = await sync_to_async(blob_response, thread_sensitive=False)(token)
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': _encode_headers(headers)})
+    if status != 200:
+        await send({'type': 'http.response.body', 'body': body.encode()})
+        return
+    if scope['method'] == 'HEAD':
+        body.close()
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    try:
+        while True:
+            chunk = await _next_chunk(body, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        body.close()
+    await send({'type': 'http.response.body', 'body': b''})
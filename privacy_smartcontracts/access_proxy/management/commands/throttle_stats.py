@@ -0,0 +1,19 @@
+"""
+Django management command to report admission control counters
+Usage: python manage.py throttle_stats
+"""
+from django.core.management.base import BaseCommand
+from access_proxy.throttling import OUTCOMES, stats
+
+class Command(BaseCommand):
+    help = 'Show how many requests each throttled endpoint admitted and rejected'
+
+    def handle(self, *args, **options):
+        report = stats()
+        if not report:
+            self.stdout.write('No throttled requests recorded')
+            return
+        for scope, counts in sorted(report.items()):
+            summary = ', '.join(f"{outcome}={counts.get(outcome, 0)}" for outcome in OUTCOMES)
+            self.stdout.write(f"{scope}: {summary}")
+        self.stdout.write(self.style.SUCCESS(f"{len(report)} scope(s) reported"))
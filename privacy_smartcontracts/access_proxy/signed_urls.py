@@ -0,0 +1,72 @@
+"""
+Short-lived capability URLs for encrypted blobs.
+
+Once retrieve has checked a request (requester, approval, oracle attestation),
+the proxy mints a URL whose token carries everything needed to serve the blob:
+the user it was issued to, the StoredObject id, its storage path, the download
+name and an expiry, authenticated with an HMAC keyed from SECRET_KEY. The blob
+endpoint validates the token without touching the database or the session, so
+automation clients can repeat a download cheaply until the URL expires.
+
+Tokens are bearer credentials: anyone holding the URL can download until the
+expiry, so RETRIEVAL_URL_TTL should stay short.
+"""
+import base64
+import json
+import time
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+SALT = 'access_proxy.signed_urls'
+DEFAULT_TTL = 300
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signature(body):
+    return _b64encode(salted_hmac(SALT, body, algorithm='sha256').digest())
+
+
+def make_token(user, stored, expires_at):
+    claims = {
+        'u': user.pk,
+        'o': stored.pk,
+        'p': stored.encrypted_file.name,
+        'n': stored.name,
+        'e': int(expires_at),
+    }
+    body = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    return f"{body}.{_signature(body)}"
+
+
+def read_token(token, now=None):
+    """Return the claims of a valid, unexpired token; raises InvalidToken otherwise."""
+    body, _, signature = token.partition('.')
+    if not body or not constant_time_compare(signature, _signature(body)):
+        raise InvalidToken('Bad signature')
+    try:
+        claims = json.loads(_b64decode(body))
+    except ValueError:
+        raise InvalidToken('Malformed token')
+    if claims['e'] < (now or time.time()):
+        raise InvalidToken('Link expired')
+    return claims
+
+
+def blob_url(user, stored, ttl=None):
+    """Return (path, expiry timestamp) of a signed download URL for `stored`."""
+    ttl = ttl if ttl is not None else getattr(settings, 'RETRIEVAL_URL_TTL', DEFAULT_TTL)
+    expires_at = int(time.time() + ttl)
+    return reverse('access_proxy:blob', args=[make_token(user, stored, expires_at)]), expires_at
@@ -1,3 +1,257 @@
-from django.test import TestCase
+import asyncio
+import base64
+import io
+import tarfile
+import threading
+import time
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from contracts.models import Contract, ContractDocument
+from oracle.services import attestation_service
+from requests_app.models import DataAccessRequest
+from storage.utils import save_encrypted_file
+from . import throttling, verification
+from .asgi import blob_app
+from .signed_urls import InvalidToken, make_token, read_token
+
+User = get_user_model()
+
+
+class VerifiedAttestationCacheTestCase(TestCase):
+    def setUp(self):
+        verification.clear()
+        owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=owner)
+        self.dar = DataAccessRequest.objects.create(contract=contract, requester=requester, reason='Test')
+        self.att, _ = attestation_service.sign_one(self.dar)
+
+    def test_repeat_verification_is_cached(self):
+        with mock.patch.object(verification, 'verify_attestation', wraps=verification.verify_attestation) as verify:
+            self.assertTrue(verification.is_verified(self.att))
+            self.assertTrue(verification.is_verified(self.att))
+        self.assertEqual(verify.call_count, 1)
+
+    def test_failures_are_not_cached(self):
+        self.att.signature_b64 = base64.b64encode(b'\0' * 64).decode()
+        with mock.patch.object(verification, 'verify_attestation', wraps=verification.verify_attestation) as verify:
+            self.assertFalse(verification.is_verified(self.att))
+            self.assertFalse(verification.is_verified(self.att))
+        self.assertEqual(verify.call_count, 2)
+
+    def test_changed_signature_misses_cache(self):
+        self.assertTrue(verification.is_verified(self.att))
+        self.att.signature_b64 = base64.b64encode(b'\0' * 64).decode()
+        self.assertFalse(verification.is_verified(self.att))
+
+    def test_key_rotation_flushes_cache(self):
+        self.assertTrue(verification.is_verified(self.att))
+        rotated = Ed25519PrivateKey.generate().public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+        with override_settings(ORACLE_PUBLIC_KEY=base64.b64encode(rotated).decode()):
+            self.assertFalse(verification.is_verified(self.att))
+        with mock.patch.object(verification, 'verify_attestation', wraps=verification.verify_attestation) as verify:
+            self.assertTrue(verification.is_verified(self.att))
+        self.assertEqual(verify.call_count, 1)
+
+
+class SignedBlobUrlTestCase(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=owner)
+        self.stored = save_encrypted_file(owner, SimpleUploadedFile('report.txt', b'secret data'), name='report.txt')
+        self.doc = ContractDocument.objects.create(contract=contract, stored_object=self.stored, uploaded_by=owner)
+        self.dar = DataAccessRequest.objects.create(contract=contract, requester=self.requester, reason='Test')
+        self.dar.status = 'APPROVED'
+        self.dar.save()  # auto-attested by the approval signal
+
+    def tearDown(self):
+        self.stored.encrypted_file.delete(save=False)
+
+    def mint(self):
+        self.client.login(username='requester', password='pass')
+        return self.client.get(reverse('access_proxy:document_link', args=[self.dar.id, self.doc.id])).json()['url']
+
+    def test_token_round_trip_and_tampering(self):
+        token = make_token(self.requester, self.stored, time.time() + 60)
+        self.assertEqual(read_token(token)['o'], self.stored.pk)
+        body, _, signature = token.partition('.')
+        with self.assertRaises(InvalidToken):
+            read_token(body + 'x.' + signature)
+        with self.assertRaises(InvalidToken):
+            read_token(make_token(self.requester, self.stored, time.time() - 1))
+
+    def test_signed_url_streams_without_session_or_queries(self):
+        url = self.mint()
+        self.client.logout()
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+            body = b''.join(response.streaming_content)
+        self.assertEqual(body, b'secret data')
+        self.assertIn('report.txt', response['Content-Disposition'])
+
+    def test_link_requires_the_requester(self):
+        User.objects.create_user(username='stranger', password='pass')
+        self.client.login(username='stranger', password='pass')
+        response = self.client.get(reverse('access_proxy:document_link', args=[self.dar.id, self.doc.id]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_asgi_blob_app(self):
+        path = self.mint().split('testserver', 1)[1]
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(blob_app({'type': 'http', 'method': 'GET', 'path': path}, None, send))
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(b''.join(m.get('body', b'') for m in messages[1:]), b'secret data')
+
+        messages.clear()
+        asyncio.run(blob_app({'type': 'http', 'method': 'GET', 'path': path[:-3] + 'xx/'}, None, send))
+        self.assertEqual(messages[0]['status'], 403)
+
+
+class ArchiveRetrievalTestCase(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=owner)
+        self.files = {'a.txt': b'alpha', 'b.bin': bytes(range(256)) * 600}
+        self.stored = []
+        for name, data in list(self.files.items()) + [('a.txt', b'second alpha')]:
+            stored = save_encrypted_file(owner, SimpleUploadedFile(name, data), name=name)
+            ContractDocument.objects.create(contract=self.contract, stored_object=stored, uploaded_by=owner)
+            self.stored.append(stored)
+        self.dar = DataAccessRequest.objects.create(
+            contract=self.contract, requester=User.objects.get(username='requester'), reason='Test'
+        )
+        self.dar.status = 'APPROVED'
+        self.dar.save()
+        self.client.login(username='requester', password='pass')
+
+    def tearDown(self):
+        for stored in self.stored:
+            stored.encrypted_file.delete(save=False)
+
+    def expected(self):
+        return {'a.txt': b'alpha', 'b.bin': self.files['b.bin'], 'a (2).txt': b'second alpha'}
+
+    def test_zip_archive(self):
+        response = self.client.get(reverse('access_proxy:retrieve', args=[self.dar.id]))
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual({n: archive.read(n) for n in archive.namelist()}, self.expected())
+
+    def test_tar_archive(self):
+        response = self.client.get(reverse('access_proxy:retrieve_archive', args=[self.dar.id]) + '?format=tar')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(len(body) % tarfile.RECORDSIZE, 0)
+        with tarfile.open(fileobj=io.BytesIO(body)) as archive:
+            self.assertEqual({m.name: archive.extractfile(m).read() for m in archive.getmembers()}, self.expected())
+
+    def test_tar_without_recorded_size(self):
+        for stored in self.stored:
+            stored.meta = {}
+            stored.save()
+        response = self.client.get(reverse('access_proxy:retrieve_archive', args=[self.dar.id]) + '?format=tar')
+        with tarfile.open(fileobj=io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.extractfile('b.bin').read(), self.files['b.bin'])
+
+    def test_single_document(self):
+        doc = ContractDocument.objects.get(stored_object=self.stored[0])
+        response = self.client.get(reverse('access_proxy:retrieve_document', args=[self.dar.id, doc.id]))
+        self.assertEqual(b''.join(response.streaming_content), b'alpha')
+
+    def test_archive_requires_attested_approval(self):
+        User.objects.create_user(username='stranger', password='pass')
+        self.client.login(username='stranger', password='pass')
+        response = self.client.get(reverse('access_proxy:retrieve_archive', args=[self.dar.id]))
+        self.assertContains(response, 'Not authorized')
+
+
+class AdmissionControlTestCase(TestCase):
+    def setUp(self):
+        throttling.flush_stats()
+        caches[settings.THROTTLE_CACHE].clear()
+        owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=owner)
+        self.stored = save_encrypted_file(owner, SimpleUploadedFile('a.txt', b'alpha'), name='a.txt')
+        ContractDocument.objects.create(contract=contract, stored_object=self.stored, uploaded_by=owner)
+        self.dar = DataAccessRequest.objects.create(contract=contract, requester=self.requester, reason='Test')
+        self.dar.status = 'APPROVED'
+        self.dar.save()
+        self.client.login(username='requester', password='pass')
+        self.url = reverse('access_proxy:retrieve', args=[self.dar.id])
+
+    def tearDown(self):
+        self.stored.encrypted_file.delete(save=False)
+        caches[settings.THROTTLE_CACHE].clear()
+
+    def test_bucket_refills(self):
+        with override_settings(THROTTLE_BUCKETS={'retrieve': (2, 0.5)}):
+            self.assertTrue(throttling.take_token('retrieve', 'u', now=100)[0])
+            self.assertTrue(throttling.take_token('retrieve', 'u', now=100)[0])
+            self.assertEqual(throttling.take_token('retrieve', 'u', now=100), (False, 2))
+            self.assertTrue(throttling.take_token('retrieve', 'u', now=102)[0])
+            self.assertTrue(throttling.take_token('retrieve', 'other', now=102)[0])
+
+    @override_settings(THROTTLE_BUCKETS={'retrieve': (10, 0.001)})
+    def test_concurrent_requests_share_the_bucket_exactly(self):
+        """Contention is serialized, not refused: exactly `capacity` of many concurrent requests get in"""
+        results = []
+        barrier = threading.Barrier(8)
+
+        def client():
+            barrier.wait()
+            results.extend(throttling.take_token('retrieve', 'u', now=100)[0] for _ in range(5))
+
+        threads = [threading.Thread(target=client) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 10)
+
+    @override_settings(THROTTLE_CACHE='shared')
+    def test_database_cache_is_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            throttling.take_token('retrieve', 'u')
+
+    def test_counters_are_batched(self):
+        """Admitted requests only count in memory until the next flush"""
+        throttle_cache = caches[settings.THROTTLE_CACHE]
+        throttling.record('retrieve', 'allowed')
+        self.assertIsNone(throttle_cache.get('throttle:count:retrieve:allowed'))
+        self.assertEqual(throttling.stats()['retrieve'], {'allowed': 1})
+        self.assertEqual(throttle_cache.get('throttle:count:retrieve:allowed'), 1)
+
+    @override_settings(THROTTLE_BUCKETS={'retrieve': (1, 0.1)})
+    def test_exhausted_bucket_returns_429(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual(throttling.stats()['retrieve'], {'allowed': 1, 'throttled': 1})
+
+    @override_settings(THROTTLE_MAX_CONCURRENT_DECRYPTS=1)
+    def test_decrypt_slot_held_while_streaming(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url).status_code, 429)
+        self.assertEqual(b''.join(response.streaming_content), b'alpha')
+        response.close()
+        second = self.client.get(self.url)
+        self.assertEqual(second.status_code, 200)
+        second.close()  # closing unread still frees the slot
+        self.assertEqual(self.client.get(self.url).status_code, 200)
@@ -0,0 +1,281 @@
+"""
+Admission control for hot endpoints.
+
+Each throttled endpoint ("scope") has a token bucket per user: a request takes
+one token, tokens refill at a steady rate up to the bucket's capacity, and a
+request that finds the bucket empty is answered 429 Too Many Requests with a
+Retry-After header. Endpoints that decrypt documents additionally share a
+limit on concurrent decryptions (global with Redis, per process otherwise),
+so one client streaming in a loop cannot occupy every worker's CPU.
+
+State lives in the cache named by settings.THROTTLE_CACHE: Redis when it is
+configured, so the limits hold across worker processes, otherwise the
+per-process local memory cache (each process then enforces its own limits).
+Never point it at the database cache: admission control must not write to
+the database it protects. A bucket is updated atomically, by a Lua script on
+Redis and under a process-local mutex otherwise, so concurrent requests are
+serialized rather than refused. Decrypt slots are individual keys with a
+timeout, so a crashed worker cannot leak one for longer than SLOT_TIMEOUT.
+
+Outcome counters are kept in process memory and added to the throttle cache
+at most every STATS_FLUSH_SECONDS, not on every request.
+
+Buckets are configured in settings.THROTTLE_BUCKETS as
+{scope: (capacity, refill per second)}, merged over DEFAULT_BUCKETS, and the
+concurrency limit in settings.THROTTLE_MAX_CONCURRENT_DECRYPTS.
+"""
+from collections import Counter
+from functools import wraps
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+
+DEFAULT_BUCKETS = {
+    'create_request': (10, 10 / 60),
+    'retrieve': (30, 0.5),
+    'view_document': (60, 1.0),
+    'download_document': (30, 0.5),
+    'blob': (60, 1.0),
+}
+DEFAULT_MAX_CONCURRENT_DECRYPTS = 8
+SLOT_TIMEOUT = 300
+BUCKET_TTL = 3600
+STATS_FLUSH_SECONDS = 10
+
+OUTCOMES = ('allowed', 'throttled', 'busy')
+BUSY_RETRY_AFTER = 1
+
+# KEYS[1] bucket hash; ARGV capacity, refill per second, now, ttl. Returns {allowed, tokens left}
+TOKEN_BUCKET_SCRIPT = """
+local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+return {allowed, tostring(tokens)}
+"""
+
+_bucket_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+
+
+def _cache():
+    cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+    if isinstance(cache, DatabaseCache):
+        raise ImproperlyConfigured("THROTTLE_CACHE must not be a database cache; use Redis or local memory")
+    return cache
+
+
+def bucket_config(scope):
+    buckets = {**DEFAULT_BUCKETS, **getattr(settings, 'THROTTLE_BUCKETS', {})}
+    return buckets[scope]
+
+
+def max_concurrent_decrypts():
+    return getattr(settings, 'THROTTLE_MAX_CONCURRENT_DECRYPTS', DEFAULT_MAX_CONCURRENT_DECRYPTS)
+
+
+def record(scope, outcome):
+    """Count `outcome` for `scope` in this process; counts reach the cache in batches."""
+    global _last_flush
+    with _stats_lock:
+        _pending[scope, outcome] += 1
+        if time.monotonic() - _last_flush < STATS_FLUSH_SECONDS:
+            return
+        batch = _pending.copy()
+        _pending.clear()
+        _last_flush = time.monotonic()
+    _flush(batch)
+
+
+def _flush(batch):
+    cache = _cache()
+    for (scope, outcome), count in batch.items():
+        key = f'throttle:count:{scope}:{outcome}'
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+
+def flush_stats():
+    """Add this process's pending counts to the cache now."""
+    global _last_flush
+    with _stats_lock:
+        batch = _pending.copy()
+        _pending.clear()
+        _last_flush = time.monotonic()
+    _flush(batch)
+
+
+def stats():
+    """Counters per scope and outcome since the cache was last cleared (including this process's pending counts)."""
+    flush_stats()
+    cache = _cache()
+    scopes = {**DEFAULT_BUCKETS, **getattr(settings, 'THROTTLE_BUCKETS', {})}
+    keys = {f'throttle:count:{s}:{o}': (s, o) for s in list(scopes) + ['decrypt'] for o in OUTCOMES}
+    values = cache.get_many(list(keys))
+    report = {}
+    for key, (scope, outcome) in keys.items():
+        if values.get(key):
+            report.setdefault(scope, {})[outcome] = values[key]
+    return report
+
+
+def _redis_take(cache, key, capacity, rate, now):
+    # RedisCache exposes no scripting; run the script on the client it would use for this key
+    client = cache._cache.get_client(key, write=True)
+    allowed, tokens = client.eval(
+        TOKEN_BUCKET_SCRIPT, 1, cache.make_and_validate_key(key), capacity, rate, now, BUCKET_TTL
+    )
+    return bool(allowed), float(tokens)
+
+
+def _local_take(cache, key, capacity, rate, now):
+    with _bucket_lock:
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0, now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(key, (tokens, now), BUCKET_TTL)
+    return allowed, tokens
+
+
+def take_token(scope, ident, now=None):
+    """
+    Take one token from the (scope, ident) bucket. Returns (allowed, retry_after
+    seconds) and records a 'throttled' outcome on refusal.
+    """
+    capacity, rate = bucket_config(scope)
+    cache = _cache()
+    key = f'throttle:bucket:{scope}:{ident}'
+    now = now if now is not None else time.time()
+    take = _redis_take if isinstance(cache, RedisCache) else _local_take
+    allowed, tokens = take(cache, key, capacity, rate, now)
+    if not allowed:
+        record(scope, 'throttled')
+        return False, max(1, math.ceil((1 - tokens) / rate))
+    return True, 0
+
+
+def acquire_decrypt_slot():
+    """Claim one of the global decrypt slots; returns its key, or None if all are busy."""
+    cache = _cache()
+    for i in range(max_concurrent_decrypts()):
+        key = f'throttle:decrypt-slot:{i}'
+        if cache.add(key, 1, SLOT_TIMEOUT):
+            return key
+    return None
+
+
+def release_decrypt_slot(key):
+    _cache().delete(key)
+
+
+class SlotReleasingIterator:
+    """
+    Iterate `chunks`, releasing decrypt `slot` when the stream is exhausted or
+    closed (including a response closed before its body was read).
+    """
+
+    def __init__(self, chunks, slot):
+        self._chunks = iter(chunks)
+        self._slot = slot
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self._slot:
+            release_decrypt_slot(self._slot)
+            self._slot = None
+        close = getattr(self._chunks, 'close', None)
+        if close:
+            close()
+
+
+def admit(scope, ident, decrypt=False):
+    """
+    Admission check shared by the decorator and the lean blob endpoint. Returns
+    (slot, retry_after): retry_after is set when the request must be rejected;
+    slot is the decrypt slot to release once the response has been produced.
+    """
+    allowed, retry_after = take_token(scope, ident)
+    if not allowed:
+        return None, retry_after
+    slot = None
+    if decrypt:
+        slot = acquire_decrypt_slot()
+        if slot is None:
+            record('decrypt', 'busy')
+            return None, BUSY_RETRY_AFTER
+    record(scope, 'allowed')
+    return slot, None
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Too many requests, please retry later.', status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def client_ident(request):
+    if request.user.is_authenticated:
+        return f'user-{request.user.pk}'
+    return f"ip-{request.META.get('REMOTE_ADDR', 'unknown')}"
+
+
+def throttle(scope, decrypt=False, methods=None):
+    """
+    Decorate a view with the `scope` token bucket and, with decrypt=True, the
+    global decrypt concurrency limit. With `methods`, only requests using those
+    HTTP methods are throttled. Place below @login_required.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods and request.method not in methods:
+                return view(request, *args, **kwargs)
+            slot, retry_after = admit(scope, client_ident(request), decrypt)
+            if retry_after:
+                return too_many_requests(retry_after)
+            if slot is None:
+                return view(request, *args, **kwargs)
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                release_decrypt_slot(slot)
+                raise
+            if response.streaming:
+                # Decryption happens while the body streams; hold the slot until then
+                response.streaming_content = SlotReleasingIterator(response.streaming_content, slot)
+            else:
+                release_decrypt_slot(slot)
+            return response
+        return wrapper
+    return decorator
@@ -1,7 +1,11 @@
 from django.urls import path
-from .views import retrieve
+from .views import blob, document_link, retrieve, retrieve_archive, retrieve_document
 
 app_name = 'access_proxy'
 urlpatterns = [
     path('retrieve/<int:data_request_id>/', retrieve, name='retrieve'),
+    path('retrieve/<int:data_request_id>/archive/', retrieve_archive, name='retrieve_archive'),
+    path('retrieve/<int:data_request_id>/<int:document_id>/', retrieve_document, name='retrieve_document'),
+    path('link/<int:data_request_id>/<int:document_id>/', document_link, name='document_link'),
+    path('blob/<str:token>/', blob, name='blob'),
 ]
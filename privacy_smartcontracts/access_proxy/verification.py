@@ -0,0 +1,69 @@
+"""
+Process-local cache of verified attestations for the retrieve path.
+
+Attestation rows are immutable once issued (revocation only sets revoked_at,
+and retrieve never looks at revoked rows), so a successful verification is
+remembered and repeat downloads skip payload serialization and Ed25519
+verification. Entries are keyed by (attestation id, digest of the signature
+material, oracle key fingerprint); only successes are cached. A change of
+ORACLE_PUBLIC_KEY changes the fingerprint and flushes the cache.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from oracle.services import verify_attestation
+
+MAX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_verified = OrderedDict()
+_fingerprint = None
+
+
+def key_fingerprint():
+    b64 = getattr(settings, 'ORACLE_PUBLIC_KEY', None)
+    if not b64:
+        return None
+    return hashlib.sha256(b64.encode()).hexdigest()[:16]
+
+
+def signature_digest(att):
+    if att.batch_id:
+        material = '|'.join([att.batch.root_hash, att.batch.signature_b64, json.dumps(att.proof)])
+    else:
+        material = att.signature_b64
+    return hashlib.sha256(material.encode() + b'|' + bytes(att.signed_bytes or b'')).hexdigest()
+
+
+def clear():
+    with _lock:
+        _verified.clear()
+
+
+def is_verified(att):
+    """verify_attestation(att), answered from the cache after the first success."""
+    global _fingerprint
+    fingerprint = key_fingerprint()
+    if fingerprint is None:
+        return False
+    key = (att.pk, signature_digest(att), fingerprint)
+    with _lock:
+        if fingerprint != _fingerprint:
+            # Key rotation: nothing verified under the old key is trusted any more
+            _verified.clear()
+            _fingerprint = fingerprint
+        if key in _verified:
+            _verified.move_to_end(key)
+            return True
+
+    if not verify_attestation(att):
+        return False
+    with _lock:
+        if fingerprint == _fingerprint:
+            _verified[key] = True
+            while len(_verified) > MAX_ENTRIES:
+                _verified.popitem(last=False)
+    return True
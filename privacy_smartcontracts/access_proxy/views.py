@@ -1,60 +1,174 @@
 from django.shortcuts import get_object_or_404, redirect, render
-from django.http import HttpResponse
-from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.utils.http import content_disposition_header
+from django.utils.text import slugify
+from django.views.decorators.http import require_GET
+from contracts.models import ContractDocument
 from oracle.models import Attestation
+from oracle.services import load_public_key
 from requests_app.models import DataAccessRequest
-from storage.utils import decrypt_bytes
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
-import base64, json
+from storage.utils import iter_decrypt
 from audit.utils import log_event
+from .archives import ARCHIVE_FORMATS, archive_stream
+from .signed_urls import InvalidToken, blob_url, read_token
+from .throttling import SlotReleasingIterator, admit, throttle
+from .verification import is_verified
 
-def load_public_key():
-    b64 = getattr(settings, 'ORACLE_PUBLIC_KEY', None)
-    if not b64:
-        return None
-    raw = base64.b64decode(b64)
-    return Ed25519PublicKey.from_public_bytes(raw)
-
-@login_required
-def retrieve(request, data_request_id):
+def authorize(user, dar):
     """
-    Retrieve endpoint for requester to click. Will look up the latest attestation for the data_request_id,
-    verify signature using ORACLE_PUBLIC_KEY and then decrypt & send the stored object attached to the contract.
+    Check that `user` may retrieve the documents of `dar`: requester (or superuser),
+    live and valid oracle attestation, approved request. Returns (attestation, error).
     """
-    dar = get_object_or_404(DataAccessRequest, pk=data_request_id)
     # ensure requester matches the user (only requester can retrieve)
-    if request.user != dar.requester and not request.user.is_superuser:
-        return render(request, 'access_proxy/error.html', {'error': 'Not authorized'})
+    if user != dar.requester and not user.is_superuser:
+        return None, 'Not authorized'
 
     # find attestation
-    att = Attestation.objects.filter(data_request=dar).order_by('-issued_at').first()
+    att = Attestation.objects.live().select_related('batch').filter(data_request=dar).order_by('-issued_at').first()
     if not att:
-        return render(request, 'access_proxy/error.html', {'error': 'Attestation not found'})
+        return None, 'Attestation not found'
 
     # verify signature
-    pub = load_public_key()
-    if not pub:
-        return render(request, 'access_proxy/error.html', {'error': 'Server misconfigured: ORACLE_PUBLIC_KEY missing'})
+    if not load_public_key():
+        return None, 'Server misconfigured: ORACLE_PUBLIC_KEY missing'
 
-    payload_bytes = json.dumps(att.payload, sort_keys=True).encode()
-    try:
-        pub.verify(base64.b64decode(att.signature_b64), payload_bytes)
-    except Exception:
-        return render(request, 'access_proxy/error.html', {'error': 'Invalid attestation signature'})
+    # individual signature, or Merkle proof plus the batch root signature; cached after the first success
+    if not is_verified(att):
+        return None, 'Invalid attestation signature'
 
     # ensure request APPROVED
     if dar.status != 'APPROVED':
-        return render(request, 'access_proxy/error.html', {'error': 'Request not approved'})
+        return None, 'Request not approved'
+    return att, None
 
-    # get stored object
-    stored = dar.contract.stored_object
-    if not stored:
-        return render(request, 'access_proxy/error.html', {'error': 'No stored object available'})
+def _documents(dar):
+    return list(
+        ContractDocument.objects.filter(contract_id=dar.contract_id)
+        .select_related('stored_object').order_by('uploaded_at', 'id')
+    )
 
-    enc = stored.encrypted_file.read()
-    raw = decrypt_bytes(enc)
+def _stream_document(request, dar, att, stored):
     log_event('access_granted', request.user, {'request_id': dar.id, 'object_id': stored.id, 'attestation_id': att.id})
-    resp = HttpResponse(raw, content_type='application/octet-stream')
-    resp['Content-Disposition'] = f'attachment; filename="{stored.name}"'
+    resp = StreamingHttpResponse(stream_blob(stored.encrypted_file.name), content_type='application/octet-stream')
+    resp['Content-Disposition'] = content_disposition_header(True, stored.name)
+    return resp
+
+def _stream_archive(request, dar, att, documents, fmt):
+    stored_objects = [doc.stored_object for doc in documents]
+    log_event('access_granted', request.user, {
+        'request_id': dar.id, 'object_ids': [s.id for s in stored_objects], 'attestation_id': att.id, 'archive': fmt,
+    })
+    content_type, extension = ARCHIVE_FORMATS[fmt]
+    resp = StreamingHttpResponse(archive_stream(stored_objects, fmt), content_type=content_type)
+    resp['Content-Disposition'] = content_disposition_header(True, f"{slugify(dar.contract.title) or 'contract'}-{dar.id}{extension}")
     return resp
+
+@login_required
+@throttle('retrieve', decrypt=True)
+def retrieve(request, data_request_id):
+    """
+    Retrieve endpoint for requester to click. Will look up the latest attestation for the data_request_id,
+    verify it against ORACLE_PUBLIC_KEY and then stream the contract's document, or a ZIP archive
+    of all of them when the contract has several.
+    """
+    dar = get_object_or_404(DataAccessRequest.objects.select_related('contract'), pk=data_request_id)
+    att, error = authorize(request.user, dar)
+    if error:
+        return render(request, 'access_proxy/error.html', {'error': error})
+
+    documents = _documents(dar)
+    if not documents:
+        return render(request, 'access_proxy/error.html', {'error': 'No documents available'})
+    if len(documents) == 1:
+        return _stream_document(request, dar, att, documents[0].stored_object)
+    return _stream_archive(request, dar, att, documents, 'zip')
+
+@login_required
+@throttle('retrieve', decrypt=True)
+def retrieve_document(request, data_request_id, document_id):
+    """Stream a single document of the contract."""
+    dar = get_object_or_404(DataAccessRequest, pk=data_request_id)
+    att, error = authorize(request.user, dar)
+    if error:
+        return render(request, 'access_proxy/error.html', {'error': error})
+    doc = get_object_or_404(ContractDocument.objects.select_related('stored_object'), pk=document_id, contract_id=dar.contract_id)
+    return _stream_document(request, dar, att, doc.stored_object)
+
+@login_required
+@throttle('retrieve', decrypt=True)
+def retrieve_archive(request, data_request_id):
+    """Stream all documents of the contract as one archive (?format=zip, the default, or tar)."""
+    dar = get_object_or_404(DataAccessRequest.objects.select_related('contract'), pk=data_request_id)
+    att, error = authorize(request.user, dar)
+    if error:
+        return render(request, 'access_proxy/error.html', {'error': error})
+    fmt = request.GET.get('format', 'zip')
+    if fmt not in ARCHIVE_FORMATS:
+        return render(request, 'access_proxy/error.html', {'error': f'Unsupported archive format: {fmt}'})
+    documents = _documents(dar)
+    if not documents:
+        return render(request, 'access_proxy/error.html', {'error': 'No documents available'})
+    return _stream_archive(request, dar, att, documents, fmt)
+
+@login_required
+def document_link(request, data_request_id, document_id):
+    """
+    Mint a short-lived signed URL for one document of an approved request. Returns
+    JSON {"url", "expires_at"}; the URL can be fetched without a session until it expires.
+    """
+    dar = get_object_or_404(DataAccessRequest.objects.select_related('requester'), pk=data_request_id)
+    att, error = authorize(request.user, dar)
+    if error:
+        return JsonResponse({'error': error}, status=403)
+    doc = get_object_or_404(ContractDocument.objects.select_related('stored_object'), pk=document_id, contract_id=dar.contract_id)
+    url, expires_at = blob_url(request.user, doc.stored_object)
+    log_event('access_link_issued', request.user, {
+        'request_id': dar.id, 'object_id': doc.stored_object_id, 'attestation_id': att.id, 'expires_at': expires_at,
+    })
+    return JsonResponse({'url': request.build_absolute_uri(url), 'expires_at': expires_at})
+
+def stream_blob(path):
+    """Yield the decrypted contents of the blob stored at `path`, chunk by chunk."""
+    with default_storage.open(path, 'rb') as fileobj:
+        yield from iter_decrypt(fileobj)
+
+def blob_response(token):
+    """
+    Validate a signed blob token, apply admission control and build the streaming
+    response, without any database access (throttle state is in Redis or process
+    memory, never the database cache). Returns (status, headers, body), where body
+    is the chunk iterator on success and an error message otherwise.
+    """
+    try:
+        claims = read_token(token)
+    except InvalidToken as e:
+        return 403, [('Content-Type', 'text/plain')], str(e)
+    if not default_storage.exists(claims['p']):
+        return 404, [('Content-Type', 'text/plain')], 'Not found'
+    slot, retry_after = admit('blob', f"user-{claims['u']}", decrypt=True)
+    if retry_after:
+        return 429, [('Content-Type', 'text/plain'), ('Retry-After', str(retry_after))], 'Too many requests, please retry later.'
+    headers = [
+        ('Content-Type', 'application/octet-stream'),
+        ('Content-Disposition', content_disposition_header(True, claims['n'])),
+        ('Cache-Control', 'private, no-store'),
+    ]
+    return 200, headers, SlotReleasingIterator(stream_blob(claims['p']), slot)
+
+@require_GET
+def blob(request, token):
+    """
+    Signed-URL download. Under ASGI these requests are answered by
+    access_proxy.asgi.blob_app before the Django middleware stack; this view
+    serves the same URLs under WSGI and the development server.
+    """
+    status, headers, body = blob_response(token)
+    if status != 200:
+        response = HttpResponse(body, status=status)
+    else:
+        response = StreamingHttpResponse(body)
+    for name, value in headers:
+        response[name] = value
+    return response
@@ -0,0 +1,153 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from contracts.models import Contract
+from requests_app.models import DataAccessRequest
+
+User = get_user_model()
+
+
+class ContractApiTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contracts = [
+            Contract.objects.create(owner=self.owner, title=f'Contract {i}', status='ACTIVE', visibility='PUBLIC')
+            for i in range(5)
+        ]
+        self.client.login(username='owner', password='pass')
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        response = self.client.get(reverse('api:contract_list'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_sparse_fieldsets(self):
+        """Only the requested fields are returned"""
+        response = self.client.get(reverse('api:contract_list'), {'fields': 'id,title'})
+        self.assertEqual(response.status_code, 200)
+        for row in response.json()['results']:
+            self.assertEqual(set(row), {'id', 'title'})
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get(reverse('api:contract_list'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        """Following next_cursor visits every contract exactly once, newest first"""
+        seen = []
+        params = {'fields': 'id', 'limit': 2}
+        while True:
+            body = self.client.get(reverse('api:contract_list'), params).json()
+            seen.extend(row['id'] for row in body['results'])
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(seen, [c.id for c in reversed(self.contracts)])
+
+    def test_conditional_get_returns_304_without_loading_rows(self):
+        """A matching If-None-Match short-circuits to 304 after a single aggregate query"""
+        url = reverse('api:contract_detail', args=[self.contracts[0].pk])
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('"description"' in q['sql'] for q in queries.captured_queries))
+
+    def test_etag_changes_when_contract_changes(self):
+        url = reverse('api:contract_detail', args=[self.contracts[0].pk])
+        etag = self.client.get(url)['ETag']
+        self.contracts[0].accept('owner')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_private_contract_hidden_from_other_users(self):
+        private = Contract.objects.create(owner=self.owner, title='Private', visibility='PRIVATE')
+        self.client.login(username='requester', password='pass')
+        response = self.client.get(reverse('api:contract_detail', args=[private.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_public_catalogue_is_anonymous(self):
+        self.client.logout()
+        response = self.client.get(reverse('api:public_contract_list'), {'limit': 100})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_public_catalogue_hides_allowed_users(self):
+        Contract.objects.filter(pk=self.contracts[0].pk).update(policy={'allowed_users': ['friend@test.com']})
+        self.client.logout()
+        response = self.client.get(reverse('api:public_contract_list'), {'limit': 100})
+        self.assertNotIn('friend@test.com', response.content.decode())
+        self.assertTrue(all('policy' not in row for row in response.json()['results']))
+        response = self.client.get(reverse('api:public_contract_list'), {'fields': 'id,policy'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag_changes_when_owner_is_renamed(self):
+        """Related values in the response are part of the ETag, though the contract row is untouched"""
+        url = reverse('api:contract_detail', args=[self.contracts[0].pk])
+        etag = self.client.get(url)['ETag']
+        User.objects.filter(pk=self.owner.pk).update(username='renamed')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['owner'], 'renamed')
+
+    def test_list_etag_changes_when_owner_is_renamed(self):
+        url = reverse('api:contract_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        User.objects.filter(pk=self.owner.pk).update(username='renamed')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['owner'] for row in response.json()['results']}, {'renamed'})
+
+    def test_list_etag_ignores_related_values_not_requested(self):
+        url = reverse('api:contract_list')
+        etag = self.client.get(url, {'fields': 'id,title'})['ETag']
+        User.objects.filter(pk=self.owner.pk).update(username='renamed')
+        self.assertEqual(self.client.get(url, {'fields': 'id,title'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class RequestApiTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        contract = Contract.objects.create(owner=self.owner, title='Contract')
+        self.dar = DataAccessRequest.objects.create(contract=contract, requester=self.requester, reason='Research')
+
+    def test_requester_and_owner_views(self):
+        self.client.login(username='requester', password='pass')
+        mine = self.client.get(reverse('api:request_list')).json()['results']
+        self.assertEqual([r['id'] for r in mine], [self.dar.id])
+
+        self.client.login(username='owner', password='pass')
+        inbox = self.client.get(reverse('api:request_list'), {'role': 'owner', 'status': 'pending'}).json()['results']
+        self.assertEqual([r['id'] for r in inbox], [self.dar.id])
+
+    def test_request_etag_tracks_processing(self):
+        self.client.login(username='requester', password='pass')
+        url = reverse('api:request_detail', args=[self.dar.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.dar.status = 'DENIED'
+        self.dar.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_request_etag_tracks_contract_title(self):
+        self.client.login(username='requester', password='pass')
+        url = reverse('api:request_detail', args=[self.dar.pk])
+        etag = self.client.get(url)['ETag']
+        Contract.objects.filter(pk=self.dar.contract_id).update(title='Renamed')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_request_list_etag_tracks_contract_title(self):
+        self.client.login(username='requester', password='pass')
+        url = reverse('api:request_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Contract.objects.filter(pk=self.dar.contract_id).update(title='Renamed')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['contract_title'], 'Renamed')
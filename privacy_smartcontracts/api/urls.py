@@ -0,0 +1,12 @@
+from django.urls import path
+from . import views
+
+app_name = 'api'
+urlpatterns = [
+    path('contracts/', views.contract_list, name='contract_list'),
+    path('contracts/public/', views.public_contract_list, name='public_contract_list'),
+    path('contracts/<int:pk>/', views.contract_detail, name='contract_detail'),
+    path('contracts/<int:pk>/documents/', views.document_list, name='document_list'),
+    path('requests/', views.request_list, name='request_list'),
+    path('requests/<int:pk>/', views.request_detail, name='request_detail'),
+]
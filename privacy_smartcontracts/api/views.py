@@ -0,0 +1,317 @@
+"""
+Read-only JSON API for contracts, contract documents and data access requests.
+
+Every endpoint answers conditional GETs. ETags are derived from the rows'
+updated_at (or the newest timestamp in a listing), plus the related values a
+response includes, and are checked before any row is loaded, so an unchanged resource comes back as a 304 Not Modified
+without serialization. Listings support sparse fieldsets (?fields=id,title)
+and keyset cursor pagination (?cursor=...&limit=...).
+"""
+from functools import wraps
+import base64
+import hashlib
+import json
+
+from django.db import models
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import condition, require_GET
+
+from contracts import cache as catalogue_cache
+from contracts.models import Contract, ContractDocument
+from requests_app.models import DataAccessRequest
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Public field name -> ORM lookup passed to values()
+CONTRACT_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'status': 'status',
+    'visibility': 'visibility',
+    'owner': 'owner__username',
+    'second_party': 'second_party__username',
+    'owner_accepted': 'owner_accepted',
+    'second_party_accepted': 'second_party_accepted',
+    'policy': 'policy',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+# The anonymous catalogue; its cache is invalidated on changes to exactly these fields
+PUBLIC_CONTRACT_FIELDS = catalogue_cache.PUBLIC_CONTRACT_FIELDS
+DOCUMENT_FIELDS = {
+    'id': 'id',
+    'contract_id': 'contract_id',
+    'name': 'stored_object__name',
+    'uploaded_by': 'uploaded_by__username',
+    'uploaded_at': 'uploaded_at',
+}
+REQUEST_FIELDS = {
+    'id': 'id',
+    'contract_id': 'contract_id',
+    'contract_title': 'contract__title',
+    'requester': 'requester__username',
+    'reason': 'reason',
+    'status': 'status',
+    'created_at': 'created_at',
+    'processed_at': 'processed_at',
+    'updated_at': 'updated_at',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_endpoint(etag_func, login_required=True):
+    """
+    Wrap a GET-only JSON view with authentication, ApiError handling and
+    conditional GET support driven by etag_func.
+    """
+    def safe_etag(request, *args, **kwargs):
+        # Bad parameters or missing rows fall through to the view, which reports them
+        try:
+            return etag_func(request, *args, **kwargs)
+        except ApiError:
+            return None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=safe_etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if login_required and not request.user.is_authenticated:
+                return _error('Authentication required', 401)
+            try:
+                return conditional_view(request, *args, **kwargs)
+            except ApiError as e:
+                return _error(e.message, e.status)
+        return require_GET(wrapper)
+    return decorator
+
+
+def _make_etag(*parts):
+    digest = hashlib.sha256('|'.join(str(p) for p in parts).encode()).hexdigest()
+    return digest[:32]
+
+
+def _selected_fields(request, available):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('limit must be an integer')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _encode_cursor(timestamp, pk):
+    raw = json.dumps([timestamp.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(padded))
+        timestamp = parse_datetime(timestamp)
+        if timestamp is None:
+            raise ValueError
+        return timestamp, int(pk)
+    except (ValueError, TypeError):
+        raise ApiError('Invalid cursor')
+
+
+def _page_queryset(request, queryset, order_field):
+    """`queryset` from the request's cursor on, newest first on (order_field, id)."""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        timestamp, pk = _decode_cursor(cursor)
+        queryset = queryset.filter(
+            models.Q(**{f'{order_field}__lt': timestamp}) |
+            models.Q(**{order_field: timestamp, 'id__lt': pk})
+        )
+    return queryset.order_by(f'-{order_field}', '-id')
+
+
+def _paginate(request, queryset, available, order_field):
+    """
+    Return one page of `queryset` ordered newest first on (order_field, id),
+    fetching only the requested columns.
+    """
+    fields = _selected_fields(request, available)
+    limit = _limit(request)
+    lookups = {available[f] for f in fields} | {order_field, 'id'}
+    rows = list(_page_queryset(request, queryset, order_field).values(*lookups)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1][order_field], rows[-1]['id'])
+    results = [{f: row[available[f]] for f in fields} for row in rows]
+    return {'results': results, 'next_cursor': next_cursor}
+
+
+def _list_etag(request, queryset, timestamp_field, scope, available, order_field):
+    """
+    Listing ETag from one aggregate query, plus, when the page serializes related
+    values (e.g. owner__username), those values for the page's rows: they change
+    without touching the listed rows' timestamps.
+    """
+    stats = queryset.aggregate(latest=Max(timestamp_field), total=Count('id'))
+    latest = stats['latest'].isoformat() if stats['latest'] else ''
+    related = sorted({available[f] for f in _selected_fields(request, available) if '__' in available[f]})
+    related_values = ()
+    if related:
+        page = _page_queryset(request, queryset, order_field)[:_limit(request)]
+        related_values = list(page.values_list('id', *related))
+    return _make_etag(
+        scope, request.user.pk, latest, stats['total'], related_values,
+        request.GET.get('fields', ''), request.GET.get('cursor', ''), request.GET.get('limit', ''),
+    )
+
+
+def _detail_etag(request, queryset, pk, scope, available):
+    """
+    Detail ETag from the row's updated_at and the related values it serializes
+    (e.g. owner__username), which change without touching updated_at.
+    """
+    related = sorted({available[f] for f in _selected_fields(request, available) if '__' in available[f]})
+    row = queryset.filter(pk=pk).values_list('updated_at', *related).first()
+    if row is None:
+        return None
+    return _make_etag(scope, pk, row[0].isoformat(), *row[1:], request.GET.get('fields', ''))
+
+
+def _detail(request, queryset, pk, available, label):
+    fields = _selected_fields(request, available)
+    row = queryset.filter(pk=pk).values(*{available[f] for f in fields}).first()
+    if row is None:
+        raise ApiError(f'{label} not found', 404)
+    return {f: row[available[f]] for f in fields}
+
+
+# --- Scopes (mirroring the HTML views' permission rules) ---
+
+def _company_contract_ids(user):
+    return Contract.allowed_companies.through.objects.filter(userprofile__user=user).values('contract_id')
+
+
+def dashboard_contracts(user):
+    """Contracts shown on the user's dashboard."""
+    if user.is_superuser:
+        return Contract.objects.all()
+    return Contract.objects.filter(models.Q(owner=user) | models.Q(second_party=user))
+
+
+def public_contracts(user):
+    """Active contracts in the public catalogue, including private ones shared with the user's company."""
+    qs = Contract.objects.filter(status='ACTIVE')
+    if user.is_authenticated:
+        return qs.filter(models.Q(visibility='PUBLIC') | models.Q(visibility='PRIVATE', pk__in=_company_contract_ids(user)))
+    return qs.filter(visibility='PUBLIC')
+
+
+def viewable_contracts(user):
+    """Contracts whose detail page the user may open."""
+    if user.is_superuser:
+        return Contract.objects.all()
+    return Contract.objects.filter(
+        models.Q(owner=user) | models.Q(second_party=user) |
+        models.Q(visibility='PUBLIC') |
+        models.Q(visibility='PRIVATE', pk__in=_company_contract_ids(user))
+    )
+
+
+def user_requests(user, role):
+    if role == 'owner':
+        return DataAccessRequest.objects.filter(contract__owner=user)
+    if role == 'requester':
+        return DataAccessRequest.objects.filter(requester=user)
+    raise ApiError("role must be 'requester' or 'owner'")
+
+
+def viewable_requests(user):
+    if user.is_superuser:
+        return DataAccessRequest.objects.all()
+    return DataAccessRequest.objects.filter(models.Q(requester=user) | models.Q(contract__owner=user))
+
+
+def _filtered_requests(request):
+    qs = user_requests(request.user, request.GET.get('role', 'requester'))
+    status = request.GET.get('status')
+    if status:
+        qs = qs.filter(status=status.upper())
+    return qs
+
+
+def _contract_documents(request, pk):
+    if not viewable_contracts(request.user).filter(pk=pk).exists():
+        raise ApiError('Contract not found', 404)
+    return ContractDocument.objects.filter(contract_id=pk)
+
+
+# --- Endpoints ---
+
+@api_endpoint(lambda request: _list_etag(
+    request, dashboard_contracts(request.user), 'updated_at', 'contracts', CONTRACT_FIELDS, 'created_at',
+))
+def contract_list(request):
+    return JsonResponse(_paginate(request, dashboard_contracts(request.user), CONTRACT_FIELDS, 'created_at'))
+
+
+@api_endpoint(
+    lambda request: _list_etag(
+        request, public_contracts(request.user), 'updated_at', 'public', PUBLIC_CONTRACT_FIELDS, 'created_at',
+    ),
+    login_required=False,
+)
+def public_contract_list(request):
+    return catalogue_cache.serve(
+        request, 'api', ('cursor', 'limit', 'fields'),
+        lambda: JsonResponse(_paginate(request, public_contracts(request.user), PUBLIC_CONTRACT_FIELDS, 'created_at')),
+    )
+
+
+@api_endpoint(lambda request, pk: _detail_etag(request, viewable_contracts(request.user), pk, 'contract', CONTRACT_FIELDS))
+def contract_detail(request, pk):
+    return JsonResponse(_detail(request, viewable_contracts(request.user), pk, CONTRACT_FIELDS, 'Contract'))
+
+
+@api_endpoint(lambda request, pk: _list_etag(
+    request, _contract_documents(request, pk), 'uploaded_at', f'documents-{pk}', DOCUMENT_FIELDS, 'uploaded_at',
+))
+def document_list(request, pk):
+    return JsonResponse(_paginate(request, _contract_documents(request, pk), DOCUMENT_FIELDS, 'uploaded_at'))
+
+
+@api_endpoint(lambda request: _list_etag(
+    request, _filtered_requests(request), 'updated_at',
+    f"requests-{request.GET.get('role', '')}-{request.GET.get('status', '')}", REQUEST_FIELDS, 'created_at',
+))
+def request_list(request):
+    return JsonResponse(_paginate(request, _filtered_requests(request), REQUEST_FIELDS, 'created_at'))
+
+
+@api_endpoint(lambda request, pk: _detail_etag(request, viewable_requests(request.user), pk, 'request', REQUEST_FIELDS))
+def request_detail(request, pk):
+    return JsonResponse(_detail(request, viewable_requests(request.user), pk, REQUEST_FIELDS, 'Request'))
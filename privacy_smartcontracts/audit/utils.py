@@ -6,3 +6,15 @@ def log_event(event_type: str, user, details: dict):
     except Exception:
         # keep audit writes best-effort (shouldn't break main flows)
         pass
+
+
+def log_events(events):
+    """Write many (event_type, user, details) audit events with one bulk insert."""
+    try:
+        AuditEvent.objects.bulk_create([
+            AuditEvent(event_type=event_type, user=user if user and hasattr(user, 'pk') else None, details=details or {})
+            for event_type, user, details in events
+        ], batch_size=500)
+    except Exception:
+        # keep audit writes best-effort (shouldn't break main flows)
+        pass
@@ -0,0 +1,153 @@
+"""
+Shared response cache for the anonymous public catalogue.
+
+Anonymous visitors all see the same ACTIVE + PUBLIC listing, so rendered
+pages are cached per page/cursor and shared between them. Entries are
+stamped with a catalogue version; any change to a contract that is (or was)
+listed publicly bumps the version, which invalidates every page at once.
+Pages are kept in the per-process default cache, but the version lives in
+the cache named by settings.CATALOGUE_VERSION_CACHE (the "shared" cache), so
+a change saved by any process invalidates the pages of every process.
+
+Entries outlive their freshness window (stale-while-revalidate): when a page
+is stale or from an older version, one request takes a short lock and
+re-renders it while concurrent requests keep serving the previous copy. On a
+completely cold key, requests that lose the lock wait briefly for the winner
+instead of all hitting the database at once.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+
+FRESH_SECONDS = 60
+STALE_SECONDS = 600
+LOCK_SECONDS = 10
+COLD_WAIT_SECONDS = 2.0
+COLD_POLL_SECONDS = 0.05
+
+VERSION_KEY = 'public_catalogue:version'
+# Public field name -> ORM lookup of everything the catalogue renders: the JSON
+# API serializes exactly these, and the HTML page (contracts/public_contracts.html)
+# shows a subset of them. The policy (its allowed_users are email addresses) and
+# the counterparty are never public.
+PUBLIC_CONTRACT_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'description': 'description',
+    'status': 'status',
+    'visibility': 'visibility',
+    'owner': 'owner__username',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+# Contract columns behind PUBLIC_CONTRACT_FIELDS (a related lookup is read
+# through its foreign key column); a change to any of them changes a page
+LISTED_FIELDS = tuple(
+    f"{lookup.split('__')[0]}_id" if '__' in lookup else lookup for lookup in PUBLIC_CONTRACT_FIELDS.values()
+)
+
+
+def is_listed(state):
+    """`state` is a dict of LISTED_FIELDS values (or None when unknown)."""
+    return bool(state) and state.get('status') == 'ACTIVE' and state.get('visibility') == 'PUBLIC'
+
+
+def _version_cache():
+    return caches[getattr(settings, 'CATALOGUE_VERSION_CACHE', 'default')]
+
+
+def current_version():
+    version_cache = _version_cache()
+    version = version_cache.get(VERSION_KEY)
+    if version is None:
+        # A fresh, never-reused value, so pages cached before an eviction cannot look current
+        version_cache.add(VERSION_KEY, time.time_ns(), None)
+        version = version_cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Mark every cached catalogue page, in every process, as stale."""
+    version_cache = _version_cache()
+    try:
+        version_cache.incr(VERSION_KEY)
+    except ValueError:
+        version_cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_if_changed(before, after):
+    """Invalidate when a contract entering, leaving or changing within the catalogue changed a listed field."""
+    # before is None when the previous values are unknown (deferred fields), so stay conservative
+    if before != after and (before is None or is_listed(before) or is_listed(after)):
+        invalidate()
+
+
+def _page_key(namespace, request, params):
+    raw = '&'.join(f'{p}={request.GET.get(p, "")}' for p in params)
+    return f'public_catalogue:{namespace}:{hashlib.sha256(raw.encode()).hexdigest()[:32]}'
+
+
+def _store(key, version, response):
+    cache.set(key, {
+        'version': version,
+        'fresh_until': time.time() + FRESH_SECONDS,
+        'content': response.content,
+        'content_type': response['Content-Type'],
+    }, FRESH_SECONDS + STALE_SECONDS)
+
+
+def _from_entry(entry, state):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['X-Catalogue-Cache'] = state
+    return response
+
+
+def _render(render):
+    response = render()
+    if hasattr(response, 'render'):
+        response = response.render()
+    return response
+
+
+def serve(request, namespace, params, render):
+    """
+    Return a cached response for this anonymous catalogue page, calling `render()`
+    (which must return a fully renderable HttpResponse) only when needed.
+    `params` are the query parameters that distinguish pages (page number, cursor, ...).
+    """
+    if request.user.is_authenticated or len(messages.get_messages(request)):
+        return render()
+
+    key = _page_key(namespace, request, params)
+    lock_key = f'{key}:lock'
+    version = current_version()
+    entry = cache.get(key)
+
+    if entry and entry['version'] == version and entry['fresh_until'] > time.time():
+        return _from_entry(entry, 'HIT')
+
+    locked = cache.add(lock_key, 1, LOCK_SECONDS)
+    if not locked:
+        if entry:
+            return _from_entry(entry, 'STALE')
+        # Cold key and someone else is rendering it: wait for their copy
+        deadline = time.monotonic() + COLD_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(COLD_POLL_SECONDS)
+            entry = cache.get(key)
+            if entry:
+                return _from_entry(entry, 'HIT')
+
+    try:
+        response = _render(render)
+        if response.status_code == 200:
+            _store(key, version, response)
+        response['X-Catalogue-Cache'] = 'MISS'
+        return response
+    finally:
+        if locked:
+            cache.delete(lock_key)
@@ -0,0 +1,47 @@
+"""
+Django management command to enforce policy.retention_days
+Usage: python manage.py enforce_retention [--batch-size N] [--blob-chunk-size N] [--max-batches N] [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+from contracts.retention import sweep_expired_contracts, DEFAULT_BATCH_SIZE, DEFAULT_BLOB_CHUNK_SIZE
+
+class Command(BaseCommand):
+    help = 'Archive contracts whose retention period has lapsed and delete their stored blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Contracts archived per batch (one audit event each)',
+            default=DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--blob-chunk-size',
+            type=int,
+            help='Stored objects deleted per chunk',
+            default=DEFAULT_BLOB_CHUNK_SIZE
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches (default: until nothing is expired)',
+            default=None
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be swept without changing anything'
+        )
+
+    def handle(self, *args, **options):
+        summary = sweep_expired_contracts(
+            batch_size=options['batch_size'],
+            blob_chunk_size=options['blob_chunk_size'],
+            max_batches=options['max_batches'],
+            dry_run=options['dry_run'],
+        )
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary['contracts_archived']} contract(s) archived in {summary['batches']} batch(es), "
+            f"{summary['documents_detached']} document(s) detached, {summary['objects_deleted']} stored object(s) deleted"
+        ))
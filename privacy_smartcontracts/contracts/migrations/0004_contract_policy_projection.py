@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contracts', '0003_remove_contract_stored_object_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contract',
+            name='purpose',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='contract',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ContractAllowedUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(db_index=True, max_length=254)),
+                ('contract', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allowed_users', to='contracts.contract')),
+            ],
+            options={
+                'unique_together': {('contract', 'email')},
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def parse_allowed_users(value):
+    # Frozen copy of contracts.models.parse_allowed_users
+    if not value:
+        return set()
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    return {str(email).strip().lower() for email in value if str(email).strip()}
+
+
+def parse_retention_days(value):
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return None
+    return days if days >= 0 else None
+
+
+def backfill_policy(apps, schema_editor):
+    """Project existing policy JSON into the new columns and join table, BATCH_SIZE contracts at a time."""
+    Contract = apps.get_model("contracts", "Contract")
+    ContractAllowedUser = apps.get_model("contracts", "ContractAllowedUser")
+
+    last_pk = 0
+    while True:
+        batch = list(
+            Contract.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "policy")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        allowed = []
+        for contract in batch:
+            policy = contract.policy or {}
+            contract.purpose = (policy.get("purpose") or "")[:255]
+            contract.retention_days = parse_retention_days(policy.get("retention_days"))
+            allowed.extend(
+                ContractAllowedUser(contract_id=contract.pk, email=email)
+                for email in parse_allowed_users(policy.get("allowed_users"))
+            )
+        Contract.objects.bulk_update(batch, ["purpose", "retention_days"])
+        ContractAllowedUser.objects.bulk_create(allowed, ignore_conflicts=True)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0004_contract_policy_projection"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_policy, migrations.RunPython.noop),
+    ]
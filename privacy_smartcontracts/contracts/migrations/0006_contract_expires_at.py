@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:44
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def backfill_expires_at(apps, schema_editor):
+    Contract = apps.get_model("contracts", "Contract")
+    pending = Contract.objects.filter(retention_days__isnull=False).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(
+            pending.filter(pk__gt=last_pk).only("pk", "created_at", "retention_days")[
+                :BATCH_SIZE
+            ]
+        )
+        if not batch:
+            break
+        for contract in batch:
+            contract.expires_at = contract.created_at + timedelta(
+                days=contract.retention_days
+            )
+        Contract.objects.bulk_update(batch, ["expires_at"])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0005_backfill_contract_policy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contract",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,35 @@
-from django.db import models
+from django.db import models, connection, transaction
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from datetime import timedelta
+from . import cache as catalogue_cache
+
+def parse_allowed_users(value):
+    """Normalise policy['allowed_users'] (a comma/whitespace separated string or a list) to a set of emails."""
+    if not value:
+        return set()
+    if isinstance(value, str):
+        value = value.replace(',', ' ').split()
+    return {str(email).strip().lower() for email in value if str(email).strip()}
+
+
+def parse_retention_days(value):
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return None
+    return days if days >= 0 else None
+
+
+class ContractQuerySet(models.QuerySet):
+    def allowed_for(self, email):
+        """Contracts whose policy lists `email` in allowed_users, resolved through the indexed join table."""
+        email = (email or '').strip().lower()
+        return self.filter(pk__in=ContractAllowedUser.objects.filter(email=email).values('contract_id'))
+
 
 class Contract(models.Model):
     STATUS_CHOICES = (
@@ -19,6 +48,10 @@ class Contract(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     policy = models.JSONField(default=dict, blank=True)
+    # Relational projection of policy, kept in sync by save() so it can be queried and indexed
+    purpose = models.CharField(max_length=255, blank=True, db_index=True)
+    retention_days = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)  # created_at + retention_days
     
     # New fields for two-sided confirmation
     owner_accepted = models.BooleanField(default=False)
@@ -32,19 +65,172 @@ class Contract(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ContractQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created_at',)
 
     def __str__(self):
         return f"{self.title} ({self.owner})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._catalogue_state = instance.catalogue_state()
+        return instance
+
+    def catalogue_state(self):
+        """Values of the fields the public catalogue renders, or None if any of them are deferred."""
+        if any(f not in self.__dict__ for f in catalogue_cache.LISTED_FIELDS):
+            return None
+        return {f: self.__dict__[f] for f in catalogue_cache.LISTED_FIELDS}
+
     def save(self, *args, **kwargs):
         # Update status based on confirmations
         if self.owner_accepted and self.second_party_accepted and self.status == 'PENDING_CONFIRMATION':
             self.status = 'ACTIVE'
         elif (self.owner_accepted or self.second_party_accepted) and self.status == 'DRAFT':
             self.status = 'PENDING_CONFIRMATION'
+        update_fields = kwargs.get('update_fields')
+        sync_policy = update_fields is None or 'policy' in update_fields
+        if sync_policy:
+            self.project_policy()
+        if update_fields is not None:
+            # The status may have moved above, and auto_now only applies to listed fields
+            update_fields = set(update_fields) | {'status', 'updated_at'}
+            if sync_policy:
+                update_fields |= {'purpose', 'retention_days', 'expires_at'}
+            kwargs['update_fields'] = update_fields
+        adding = self._state.adding
+        before = {} if adding else getattr(self, '_catalogue_state', None)
         super().save(*args, **kwargs)
+        if sync_policy:
+            self.sync_allowed_users(adding=adding)
+        self._catalogue_state = self.catalogue_state()
+        catalogue_cache.invalidate_if_changed(before, self._catalogue_state)
+
+    def project_policy(self):
+        """Copy the scalar policy fields into their indexed columns and derive the retention expiry."""
+        policy = self.policy or {}
+        self.purpose = (policy.get('purpose') or '')[:255]
+        self.retention_days = parse_retention_days(policy.get('retention_days'))
+        if self.retention_days is None:
+            self.expires_at = None
+        else:
+            self.expires_at = (self.created_at or timezone.now()) + timedelta(days=self.retention_days)
+
+    def sync_allowed_users(self, adding=False):
+        """Bring the ContractAllowedUser rows in line with policy['allowed_users']."""
+        wanted = parse_allowed_users((self.policy or {}).get('allowed_users'))
+        existing = set() if adding else set(self.allowed_users.values_list('email', flat=True))
+        if existing - wanted:
+            self.allowed_users.filter(email__in=existing - wanted).delete()
+        if wanted - existing:
+            ContractAllowedUser.objects.bulk_create(
+                [ContractAllowedUser(contract=self, email=email) for email in wanted - existing],
+                ignore_conflicts=True,
+            )
+
+    def accept(self, party):
+        """
+        Record an acceptance by 'owner' or 'second_party' as a single conditional UPDATE.
+
+        The status transition is computed by the database from the row as it is at
+        write time, so two parties accepting at the same moment cannot overwrite each
+        other. Only the acceptance flag, status and updated_at columns are written.
+        The in-memory instance is refreshed from the UPDATE's RETURNING clause (or a
+        locked re-read on backends without UPDATE ... RETURNING) and the new status
+        is returned. Returns None if the row no longer exists.
+        """
+        if party not in ACCEPTANCE_FLAGS:
+            raise ValueError(f"Unknown contract party: {party!r}")
+        flag, other = ACCEPTANCE_FLAGS[party]
+        qn = connection.ops.quote_name
+        table = qn(self._meta.db_table)
+        status = qn('status')
+        returned = ('owner_accepted', 'second_party_accepted', 'status', 'visibility')
+        now = timezone.now()
+        sql = (
+            f"UPDATE {table} SET {qn(flag)} = %s, {qn('updated_at')} = %s, "
+            f"{status} = CASE"
+            f" WHEN {qn(other)} = %s AND {status} = %s THEN %s"
+            f" WHEN {status} = %s THEN %s"
+            f" ELSE {status} END"
+            f" WHERE {qn(self._meta.pk.column)} = %s"
+        )
+        params = [
+            True, connection.ops.adapt_datetimefield_value(now),
+            True, 'PENDING_CONFIRMATION', 'ACTIVE',
+            'DRAFT', 'PENDING_CONFIRMATION',
+            self.pk,
+        ]
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                if _supports_update_returning():
+                    cursor.execute(f"{sql} RETURNING {', '.join(qn(c) for c in returned)}", params)
+                    row = cursor.fetchone()
+                else:
+                    cursor.execute(sql, params)
+                    row = None
+                    if cursor.rowcount:
+                        row = type(self).objects.select_for_update().filter(pk=self.pk).values_list(*returned).first()
+        if row is None:
+            return None
+        before = getattr(self, '_catalogue_state', None)
+        # Raw cursors hand back driver values (0/1 on SQLite), so coerce the flags
+        self.owner_accepted = bool(row[0])
+        self.second_party_accepted = bool(row[1])
+        self.status, self.visibility = row[2], row[3]
+        self.updated_at = now
+        self._catalogue_state = self.catalogue_state()
+        # updated_at always moves, so this invalidates whenever the contract is (or just became) listed
+        catalogue_cache.invalidate_if_changed(before, self._catalogue_state)
+        return self.status
+
+
+class ContractAllowedUser(models.Model):
+    """One row per email listed in a contract's policy['allowed_users']."""
+    contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name='allowed_users')
+    email = models.EmailField(db_index=True)
+
+    class Meta:
+        unique_together = ('contract', 'email')
+
+    def __str__(self):
+        return f"{self.email} allowed on {self.contract_id}"
+
+
+def _supports_update_returning():
+    """
+    Whether UPDATE ... RETURNING can be used as written here. Only PostgreSQL and
+    SQLite 3.35+ accept it; Oracle needs RETURNING ... INTO and MariaDB only
+    supports RETURNING on INSERT, so those take the locked re-read path.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    # Django ties this flag to SQLite 3.35, the release that added RETURNING
+    return connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert
+
+
+# party -> (flag written by that party, flag of the counterparty)
+ACCEPTANCE_FLAGS = {
+    'owner': ('owner_accepted', 'second_party_accepted'),
+    'second_party': ('second_party_accepted', 'owner_accepted'),
+}
+
+@receiver(post_delete, sender=Contract)
+def invalidate_catalogue_on_delete(sender, instance, **kwargs):
+    catalogue_cache.invalidate_if_changed(getattr(instance, '_catalogue_state', None), {})
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_catalogue_on_owner_rename(sender, instance, created, update_fields=None, **kwargs):
+    # The catalogue shows owner usernames, which live on the user row
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    if Contract.objects.filter(owner=instance, status='ACTIVE', visibility='PUBLIC').exists():
+        catalogue_cache.invalidate()
+
 
 class ContractDocument(models.Model):
     contract = models.ForeignKey(Contract, on_delete=models.CASCADE, related_name='documents')
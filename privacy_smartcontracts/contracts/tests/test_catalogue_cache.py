@@ -0,0 +1,106 @@
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from contracts import cache as catalogue_cache
+from contracts.models import Contract
+
+
+class PublicCatalogueCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches[settings.CATALOGUE_VERSION_CACHE].clear()
+        self.owner = User.objects.create_user("owner", "owner@test.com", "pass")
+        self.party = User.objects.create_user("party", "party@test.com", "pass")
+        self.listed = Contract.objects.create(owner=self.owner, title="Listed", status='ACTIVE', visibility='PUBLIC')
+        self.url = reverse('contracts:public')
+
+    def assertNoAppQueries(self):
+        """Only the shared cache holding the catalogue version may be queried"""
+        test = self
+
+        class Capture(CaptureQueriesContext):
+            def __exit__(self, *exc_info):
+                super().__exit__(*exc_info)
+                table = settings.CACHES[settings.CATALOGUE_VERSION_CACHE].get('LOCATION', '')
+                test.assertEqual([q['sql'] for q in self.captured_queries if table not in q['sql']], [])
+
+        return Capture(connection)
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        """The second anonymous hit on a page touches none of the application's tables"""
+        self.assertEqual(self.client.get(self.url)['X-Catalogue-Cache'], 'MISS')
+        with self.assertNoAppQueries():
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Catalogue-Cache'], 'HIT')
+        self.assertContains(response, "Listed")
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.login(username='party', password='pass')
+        response = self.client.get(self.url)
+        self.assertNotIn('X-Catalogue-Cache', response)
+
+    def test_title_change_invalidates(self):
+        self.client.get(self.url)
+        self.listed.title = "Renamed"
+        self.listed.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Catalogue-Cache'], 'MISS')
+        self.assertContains(response, "Renamed")
+
+    def test_unlisted_changes_do_not_invalidate(self):
+        """Edits to private or draft contracts leave cached pages untouched"""
+        draft = Contract.objects.create(owner=self.owner, title="Draft")
+        self.client.get(self.url)
+        draft.title = "Still a draft"
+        draft.save()
+        self.assertEqual(self.client.get(self.url)['X-Catalogue-Cache'], 'HIT')
+
+    def test_activation_by_acceptance_invalidates(self):
+        contract = Contract.objects.create(owner=self.owner, second_party=self.party, title="Joint", owner_accepted=True)
+        self.client.get(self.url)
+        contract.accept('second_party')
+        response = self.client.get(self.url)
+        self.assertContains(response, "Joint")
+
+    def test_stale_copy_served_while_another_request_revalidates(self):
+        self.client.get(self.url)
+        catalogue_cache.invalidate()
+        key = catalogue_cache._page_key('html', self.client.get(self.url).wsgi_request, ('page',))
+        catalogue_cache.invalidate()
+        cache.add(f'{key}:lock', 1)  # another worker is re-rendering
+        with self.assertNoAppQueries():
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Catalogue-Cache'], 'STALE')
+
+    def test_owner_rename_invalidates(self):
+        self.client.get(self.url)
+        self.owner.username = "renamed-owner"
+        self.owner.save()
+        self.assertContains(self.client.get(self.url), "renamed-owner")
+
+    def test_login_of_owner_does_not_invalidate(self):
+        self.client.get(self.url)
+        self.client.login(username='owner', password='pass')
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url)['X-Catalogue-Cache'], 'HIT')
+
+    def test_invalidation_is_seen_through_the_shared_version(self):
+        """A change saved elsewhere invalidates this process's pages through the shared cache"""
+        self.client.get(self.url)
+        caches[settings.CATALOGUE_VERSION_CACHE].incr(catalogue_cache.VERSION_KEY)
+        self.assertEqual(self.client.get(self.url)['X-Catalogue-Cache'], 'MISS')
+
+    def test_listed_fields_cover_the_rendered_fields(self):
+        """Everything the HTML catalogue shows of a contract is a public field, so its changes invalidate"""
+        template = Path(settings.BASE_DIR, 'templates', 'contracts', 'public_contracts.html').read_text()
+        rendered = {'id' if f == 'pk' else f for f in re.findall(r'contract\.(\w+)', template)}
+        self.assertLessEqual(rendered, set(catalogue_cache.PUBLIC_CONTRACT_FIELDS))
+        self.assertIn('owner_id', catalogue_cache.LISTED_FIELDS)
+        self.assertNotIn('policy', catalogue_cache.PUBLIC_CONTRACT_FIELDS)
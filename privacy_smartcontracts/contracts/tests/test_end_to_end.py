@@ -1,13 +1,14 @@
  
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
-from contracts.models import Contract
+from contracts.models import Contract, ContractDocument
 from requests_app.models import DataAccessRequest
 from oracle.models import Attestation
 from storage.utils import save_encrypted_file
 from io import BytesIO
 import json
 
+@override_settings(APPROVAL_JOBS_EAGER=True)
 class EndToEndFlowTest(TestCase):
     def setUp(self):
         # create users
@@ -26,9 +27,11 @@ class EndToEndFlowTest(TestCase):
         uploaded_file = BytesIO(b"secret data")
         uploaded_file.name = "test.txt"
         self.contract = Contract.objects.create(owner=self.owner, title="Test Contract")
-        save_encrypted_file(self.owner, uploaded_file, name="test.txt", meta={})
-        self.contract.stored_object = self.contract.owner.stored_objects.first()
-        self.contract.save()
+        self.stored = save_encrypted_file(self.owner, uploaded_file, name="test.txt", meta={})
+        ContractDocument.objects.create(contract=self.contract, stored_object=self.stored, uploaded_by=self.owner)
+
+    def tearDown(self):
+        self.stored.encrypted_file.delete(save=False)
 
     def test_full_flow(self):
         # requester creates access request
@@ -50,4 +53,4 @@ class EndToEndFlowTest(TestCase):
         # requester retrieves file
         resp = self.client_requester.get(f"/access/retrieve/{dar.id}/")
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(resp.content, b"secret data")
+        self.assertEqual(b"".join(resp.streaming_content), b"secret data")
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from contracts.forms import ContractForm
+from contracts.models import Contract, ContractAllowedUser
+
+
+class ContractPolicyProjectionTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", "owner@test.com", "pass")
+
+    def test_form_policy_is_projected(self):
+        """Saving through ContractForm fills the indexed policy columns and join table"""
+        form = ContractForm(data={
+            'title': 'Flood data', 'visibility': 'PUBLIC', 'purpose': 'research',
+            'retention_days': 30, 'allowed_users': 'A@test.com, b@test.com\nc@test.com',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        contract = form.save(owner=self.owner)
+        self.assertEqual(contract.purpose, 'research')
+        self.assertEqual(contract.retention_days, 30)
+        self.assertEqual(
+            set(contract.allowed_users.values_list('email', flat=True)),
+            {'a@test.com', 'b@test.com', 'c@test.com'},
+        )
+
+    def test_allowed_users_resync_on_policy_change(self):
+        contract = Contract.objects.create(owner=self.owner, title='C', policy={'allowed_users': 'a@test.com,b@test.com'})
+        contract.policy = {'allowed_users': 'b@test.com,d@test.com'}
+        contract.save()
+        self.assertEqual(set(contract.allowed_users.values_list('email', flat=True)), {'b@test.com', 'd@test.com'})
+
+    def test_allowed_for_lookup(self):
+        """allowed_for resolves contracts by email without parsing policy JSON"""
+        first = Contract.objects.create(owner=self.owner, title='One', policy={'allowed_users': 'x@test.com'})
+        Contract.objects.create(owner=self.owner, title='Two', policy={'allowed_users': 'y@test.com'})
+        third = Contract.objects.create(owner=self.owner, title='Three', policy={'allowed_users': 'x@test.com, y@test.com'})
+        self.assertEqual(set(Contract.objects.allowed_for('X@test.com')), {first, third})
+
+    def test_partial_save_skips_policy_sync(self):
+        contract = Contract.objects.create(owner=self.owner, title='C', policy={'allowed_users': 'a@test.com'})
+        ContractAllowedUser.objects.all().delete()
+        contract.title = 'Renamed'
+        contract.save(update_fields=['title'])
+        self.assertFalse(contract.allowed_users.exists())
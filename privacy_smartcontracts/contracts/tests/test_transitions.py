@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase
+from contracts.models import Contract
+
+
+class ContractAcceptanceTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", "owner@test.com", "pass")
+        self.party = User.objects.create_user("party", "party@test.com", "pass")
+        self.contract = Contract.objects.create(owner=self.owner, second_party=self.party, title="Test Contract")
+
+    def test_first_acceptance_moves_to_pending(self):
+        """A single acceptance on a draft moves it to pending confirmation"""
+        status = self.contract.accept('owner')
+        self.assertEqual(status, 'PENDING_CONFIRMATION')
+        self.assertTrue(self.contract.owner_accepted)
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.status, 'PENDING_CONFIRMATION')
+
+    def test_second_acceptance_activates(self):
+        """Both acceptances activate the contract and the returned state matches the row"""
+        self.contract.accept('owner')
+        status = self.contract.accept('second_party')
+        self.assertEqual(status, 'ACTIVE')
+        self.assertTrue(self.contract.owner_accepted and self.contract.second_party_accepted)
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.status, 'ACTIVE')
+
+    def test_stale_instances_do_not_lose_acceptances(self):
+        """Two parties holding stale copies of the row both get their acceptance recorded"""
+        owner_copy = Contract.objects.get(pk=self.contract.pk)
+        party_copy = Contract.objects.get(pk=self.contract.pk)
+        owner_copy.accept('owner')
+        party_copy.accept('second_party')
+        self.assertEqual(party_copy.status, 'ACTIVE')
+        self.assertTrue(party_copy.owner_accepted)
+
+    def test_accept_does_not_touch_policy(self):
+        """Accepting writes only the acceptance columns, leaving the policy intact"""
+        stale = Contract.objects.get(pk=self.contract.pk)
+        Contract.objects.filter(pk=self.contract.pk).update(policy={"purpose": "research"})
+        stale.accept('owner')
+        self.contract.refresh_from_db()
+        self.assertEqual(self.contract.policy, {"purpose": "research"})
+
+    def test_backends_without_update_returning_re_read_the_row(self):
+        """Backends such as MariaDB and Oracle get the same result through a locked re-read"""
+        with mock.patch('contracts.models._supports_update_returning', return_value=False):
+            self.contract.accept('owner')
+            status = self.contract.accept('second_party')
+        self.assertEqual(status, 'ACTIVE')
+        self.assertTrue(self.contract.owner_accepted and self.contract.second_party_accepted)
+
+    def test_update_returning_is_decided_by_vendor(self):
+        from contracts import models as contract_models
+        for vendor, expected in (('postgresql', True), ('mysql', False), ('oracle', False)):
+            with mock.patch.object(connection, 'vendor', vendor):
+                self.assertEqual(contract_models._supports_update_returning(), expected)
+
+    def test_unknown_party_rejected(self):
+        with self.assertRaises(ValueError):
+            self.contract.accept('oracle')
+
+
+class ContractAcceptanceConcurrencyTest(TransactionTestCase):
+    ROUNDS = 25
+
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", "owner@test.com", "pass")
+        self.party = User.objects.create_user("party", "party@test.com", "pass")
+
+    def test_concurrent_acceptances_are_never_lost(self):
+        """Owner and second party accepting simultaneously always ends ACTIVE with both flags set"""
+        for _ in range(self.ROUNDS):
+            contract = Contract.objects.create(owner=self.owner, second_party=self.party, title="Race")
+            barrier = threading.Barrier(2)
+
+            def accept(party):
+                try:
+                    copy = Contract.objects.get(pk=contract.pk)
+                    barrier.wait()
+                    # The shared-cache SQLite test database reports lock contention
+                    # immediately instead of waiting, so retry the (atomic) UPDATE
+                    for _ in range(50):
+                        try:
+                            return copy.accept(party)
+                        except OperationalError:
+                            time.sleep(0.01)
+                    return copy.accept(party)
+                finally:
+                    connection.close()
+
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                statuses = list(pool.map(accept, ['owner', 'second_party']))
+
+            contract.refresh_from_db()
+            self.assertTrue(contract.owner_accepted)
+            self.assertTrue(contract.second_party_accepted)
+            self.assertEqual(contract.status, 'ACTIVE')
+            self.assertIn('ACTIVE', statuses)
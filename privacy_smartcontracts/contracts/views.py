@@ -13,6 +13,8 @@ from django.core.exceptions import ValidationError
 import mimetypes
 from storage.utils import decrypt_bytes
 from users.models import UserProfile
+from . import cache as catalogue_cache
+from access_proxy.throttling import throttle
 
 class OwnerOrSecondPartyRequiredMixin(UserPassesTestMixin):
     def test_func(self):
@@ -134,6 +136,11 @@ class PublicContractsView(ListView):
     context_object_name = 'contracts'
     paginate_by = 12
 
+    def get(self, request, *args, **kwargs):
+        # Anonymous visitors share one cached copy of each catalogue page
+        render = super().get
+        return catalogue_cache.serve(request, 'html', ('page',), lambda: render(request, *args, **kwargs))
+
     def get_queryset(self):
         user = self.request.user
         qs = Contract.objects.filter(status='ACTIVE') # Only show active contracts
@@ -157,16 +164,15 @@ def accept_contract(request, pk):
     user = request.user
 
     if user == contract.owner:
-        contract.owner_accepted = True
+        contract.accept('owner') # Atomic UPDATE; also moves the status if both have accepted
         messages.success(request, "You have accepted the contract as the owner.")
     elif user == contract.second_party:
-        contract.second_party_accepted = True
+        contract.accept('second_party')
         messages.success(request, "You have accepted the contract as the second party.")
     else:
         messages.error(request, "You are not authorized to accept this contract.")
         return redirect('contracts:detail', pk=pk)
 
-    contract.save() # This will update the status if both are accepted
     return redirect('contracts:detail', pk=pk)
 
 @login_required
@@ -210,6 +216,7 @@ def encryption_visualization_view(request, pk):
     return render(request, 'contracts/encryption_visualization.html', {'contract': contract})
 
 @login_required
+@throttle('view_document', decrypt=True)
 def view_document(request, contract_pk, doc_pk):
     """Serve file data to the browser without downloads"""
     contract = get_object_or_404(Contract, pk=contract_pk)
@@ -315,6 +322,7 @@ def universal_viewer(request, contract_pk, doc_pk):
     })
 
 @login_required
+@throttle('download_document', decrypt=True)
 def download_document(request, contract_pk, doc_pk):
     """Serve file data for download"""
     contract = get_object_or_404(Contract, pk=contract_pk)
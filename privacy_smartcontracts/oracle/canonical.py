@@ -0,0 +1,120 @@
+"""
+Canonical JSON for signed and hashed payloads (RFC 8785 style).
+
+canonicalize() is the one encoder behind every byte string that is signed or
+hashed: oracle attestation payloads, TEE attestation data and computation
+results. Its output depends only on the value, never on json.dumps defaults:
+
+- no whitespace; object members sorted by the UTF-16 code units of their keys
+- strings as UTF-8, escaping only '"', '\\' and control characters
+  (\\b \\f \\n \\r \\t, else \\u00xx)
+- floats in the shortest form that round-trips, written as ECMAScript does
+  (1.0 -> 1, 1e21 -> 1e+21, 1e-7 -> 1e-7); NaN and infinities are rejected
+- integers exactly, in decimal (RFC 8785 would round those beyond 2**53)
+
+Object keys must be strings and lone surrogates are rejected, so every value
+has exactly one encoding. Signers store the bytes they signed next to the
+payload, and verification accepts a payload only if it encodes to exactly
+those bytes (matches()); legacy_bytes() is the encoding of rows signed before
+this module existed.
+"""
+import json
+import math
+
+_ESCAPES = {'"': '\\"', '\\': '\\\\', '\b': '\\b', '\f': '\\f', '\n': '\\n', '\r': '\\r', '\t': '\\t'}
+_ESCAPES.update({chr(c): f'\\u{c:04x}' for c in range(0x20) if chr(c) not in _ESCAPES})
+_ESCAPE_TABLE = str.maketrans(_ESCAPES)
+
+
+def _string(value):
+    return '"' + value.translate(_ESCAPE_TABLE) + '"'
+
+
+def _float(value):
+    if not math.isfinite(value):
+        raise ValueError(f"{value} has no canonical JSON encoding")
+    if value == 0:
+        return '0'
+    # repr gives the shortest round-tripping digits; re-lay them out the ECMAScript way
+    sign = '-' if value < 0 else ''
+    mantissa, _, exponent = repr(abs(value)).partition('e')
+    integer, _, fraction = mantissa.partition('.')
+    all_digits = integer + fraction
+    significant = all_digits.lstrip('0')
+    point = len(integer) + int(exponent or 0) - (len(all_digits) - len(significant))
+    digits = significant.rstrip('0')
+    # value = 0.digits * 10**point
+    if len(digits) <= point <= 21:
+        text = digits + '0' * (point - len(digits))
+    elif 0 < point <= 21:
+        text = digits[:point] + '.' + digits[point:]
+    elif -6 < point <= 0:
+        text = '0.' + '0' * -point + digits
+    else:
+        exp = point - 1
+        text = digits[0] + ('.' + digits[1:] if len(digits) > 1 else '') + 'e' + ('+' if exp > 0 else '-') + str(abs(exp))
+    return sign + text
+
+
+def _sort_key(key):
+    return key.encode('utf-16-be')
+
+
+def _encode(value, out):
+    if value is None:
+        out.append('null')
+    elif value is True:
+        out.append('true')
+    elif value is False:
+        out.append('false')
+    elif isinstance(value, str):
+        out.append(_string(value))
+    elif isinstance(value, int):
+        out.append(str(int(value)))
+    elif isinstance(value, float):
+        out.append(_float(value))
+    elif isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError("Canonical JSON object keys must be strings")
+        out.append('{')
+        for i, key in enumerate(sorted(value, key=_sort_key)):
+            if i:
+                out.append(',')
+            out.append(_string(key))
+            out.append(':')
+            _encode(value[key], out)
+        out.append('}')
+    elif isinstance(value, (list, tuple)):
+        out.append('[')
+        for i, item in enumerate(value):
+            if i:
+                out.append(',')
+            _encode(item, out)
+        out.append(']')
+    else:
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def canonicalize(value):
+    """The canonical JSON encoding of `value`, as UTF-8 bytes."""
+    out = []
+    _encode(value, out)
+    # 'strict' rejects lone surrogates
+    return ''.join(out).encode('utf-8')
+
+
+def legacy_bytes(value):
+    """The json.dumps(sort_keys=True) encoding that rows signed before canonicalize() used."""
+    return json.dumps(value, sort_keys=True).encode()
+
+
+def matches(signed_bytes, value):
+    """
+    True if stored `signed_bytes` are exactly the canonical encoding of `value`.
+    A parse-and-compare would accept payloads that differ from what was signed
+    (1 == 1.0 == True in Python, and bytes with duplicate keys or another layout).
+    """
+    try:
+        return canonicalize(value) == bytes(signed_bytes)
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,28 @@
+"""
+Django management command to attest approved requests in Merkle batches
+Usage: python manage.py attest_pending [--batch-size N]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from audit.utils import log_event
+from oracle.services import attestation_service, DEFAULT_MERKLE_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Attest all approved, unattested data access requests with one signature per Merkle batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Requests per Merkle tree (one signature each)',
+            default=DEFAULT_MERKLE_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if not attestation_service.is_configured:
+            raise CommandError('ORACLE_PRIVATE_KEY is not configured')
+        batches = attestation_service.attest_pending(batch_size=options['batch_size'])
+        for batch in batches:
+            log_event('attestation_batch_issued', None, {'batch_id': batch.id, 'root_hash': batch.root_hash, 'size': batch.size})
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(b.size for b in batches)} request(s) attested in {len(batches)} batch(es)"
+        ))
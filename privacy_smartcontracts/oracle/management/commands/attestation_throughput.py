@@ -0,0 +1,23 @@
+"""
+Django management command to measure oracle signing throughput
+Usage: python manage.py attestation_throughput [--count N]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from oracle.services import attestation_service
+
+class Command(BaseCommand):
+    help = 'Sign synthetic attestation payloads and report signatures per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            help='Number of payloads to sign',
+            default=1000
+        )
+
+    def handle(self, *args, **options):
+        if not attestation_service.is_configured:
+            raise CommandError('ORACLE_PRIVATE_KEY is not configured')
+        rate = attestation_service.measure_throughput(options['count'])
+        self.stdout.write(self.style.SUCCESS(f"{options['count']} payload(s) signed at {rate:,.0f} signatures/s"))
@@ -0,0 +1,39 @@
+"""
+Django management command to sign the attestation transparency log's tree head
+Usage: python manage.py sign_tree_head [--catch-up] [--batch-size N]
+"""
+from django.core.management.base import BaseCommand, CommandError
+from audit.utils import log_event
+from oracle.services import attestation_service
+from oracle.transparency import transparency_log, DEFAULT_CATCH_UP_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Sign the transparency log root (run periodically), optionally logging unlogged attestations first'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--catch-up',
+            action='store_true',
+            help='First append attestations missing from the log (e.g. issued before it existed)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Attestations read per query when catching up',
+            default=DEFAULT_CATCH_UP_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if not attestation_service.is_configured:
+            raise CommandError('ORACLE_PRIVATE_KEY is not configured')
+        if options['catch_up']:
+            appended = transparency_log.append_unlogged(batch_size=options['batch_size'])
+            self.stdout.write(f"{appended} attestation(s) appended to the log")
+        head, created = attestation_service.sign_tree_head()
+        if head is None:
+            self.stdout.write("The transparency log is empty")
+        elif created:
+            log_event('tree_head_signed', None, {'tree_size': head.tree_size, 'root_hash': head.root_hash})
+            self.stdout.write(self.style.SUCCESS(f"Tree head signed: {head.tree_size} entries, root {head.root_hash}"))
+        else:
+            self.stdout.write(f"Tree head unchanged: {head.tree_size} entries, root {head.root_hash}")
@@ -0,0 +1,78 @@
+"""
+Django management command to re-verify every stored attestation
+Usage: python manage.py verify_attestations [--workers N] [--chunk-size N] [--checkpoint PATH] [--resume] [--public-key B64]
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from oracle.reverify import DEFAULT_CHUNK_SIZE, verify_all
+
+class Command(BaseCommand):
+    help = 'Verify the oracle signature of every attestation across a process pool, with resumable checkpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Verification processes (default: CPU count; 1 verifies in this process)',
+            default=None
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Attestations per work unit',
+            default=DEFAULT_CHUNK_SIZE
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='JSON file recording progress and findings',
+            default='verify_attestations.checkpoint.json'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue from the checkpoint instead of starting over'
+        )
+        parser.add_argument(
+            '--public-key',
+            help='Base64 Ed25519 public key to verify against (default: ORACLE_PUBLIC_KEY)',
+            default=None
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            help='Number of failing/unsigned attestation ids to list',
+            default=20
+        )
+
+    def handle(self, *args, **options):
+        public_b64 = options['public_key'] or getattr(settings, 'ORACLE_PUBLIC_KEY', None)
+        if not public_b64:
+            raise CommandError('No public key: set ORACLE_PUBLIC_KEY or pass --public-key')
+        try:
+            state = verify_all(
+                public_b64,
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                checkpoint=options['checkpoint'],
+                resume=options['resume'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        show = options['show']
+        self.stdout.write(
+            f"Checked {state['checked']} attestation(s) up to id {state['last_id']} "
+            f"in {state['elapsed']:.1f}s ({state['rate']:,.0f}/s this run)"
+        )
+        if state['unsigned_count']:
+            self.stdout.write(self.style.WARNING(
+                f"{state['unsigned_count']} attestation(s) have no signer (system-issued): "
+                f"{', '.join(map(str, state['unsigned_ids'][:show]))}"
+            ))
+        if state['failed_count']:
+            self.stdout.write(self.style.ERROR(
+                f"{state['failed_count']} attestation(s) FAILED verification: "
+                f"{', '.join(map(str, state['failed_ids'][:show]))}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('All attestations verified'))
@@ -0,0 +1,63 @@
+"""
+Merkle trees over attestation payloads.
+
+Batch attestations sign one Merkle root instead of one payload per request.
+Leaves and interior nodes are hashed with distinct prefixes (as in RFC 6962),
+so a leaf can never be passed off as an interior node, and an odd node at the
+end of a level is promoted unchanged rather than paired with itself.
+
+An inclusion proof is the list of sibling hashes from the leaf up to the
+root, each tagged with the side it sits on: [["L", "<hex>"], ["R", "<hex>"], ...].
+"""
+import hashlib
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def leaf_hash(data):
+    return hashlib.sha256(LEAF_PREFIX + data).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def build_levels(leaves):
+    """Every level of the tree over `leaves` (leaf hashes), from the leaves up to the root."""
+    if not leaves:
+        raise ValueError("A Merkle tree needs at least one leaf")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def inclusion_proof(levels, index):
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(['L' if sibling < index else 'R', level[sibling].hex()])
+        index //= 2
+    return proof
+
+
+def root_from_proof(data, proof):
+    node = leaf_hash(data)
+    for side, sibling_hex in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        node = node_hash(sibling, node) if side == 'L' else node_hash(node, sibling)
+    return node
+
+
+def verify_proof(data, proof, root_hex):
+    """True if `data` is a leaf of the tree whose root is `root_hex`."""
+    try:
+        return root_from_proof(data, proof).hex() == root_hex
+    except (TypeError, ValueError):
+        return False
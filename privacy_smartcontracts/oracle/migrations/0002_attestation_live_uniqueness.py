@@ -0,0 +1,66 @@
+# Generated by Django 5.2.8 on 2026-10-19 04:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+
+def revoke_duplicate_attestations(apps, schema_editor):
+    """Keep only the newest attestation per request live so the unique constraint can be added."""
+    Attestation = apps.get_model("oracle", "Attestation")
+    duplicated = (
+        Attestation.objects.values("data_request_id")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("data_request_id", flat=True)
+    )
+    now = timezone.now()
+    for request_id in duplicated:
+        newest = (
+            Attestation.objects.filter(data_request_id=request_id)
+            .order_by("-issued_at", "-id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        Attestation.objects.filter(data_request_id=request_id).exclude(
+            id=newest
+        ).update(revoked_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oracle", "0001_initial"),
+        ("requests_app", "0003_approvaljob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attestation",
+            name="revoked_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="attestation",
+            name="signer",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="signed_attestations",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.RunPython(revoke_duplicate_attestations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="attestation",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("revoked_at__isnull", True)),
+                fields=("data_request",),
+                name="one_live_attestation_per_request",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oracle", "0003_attestationbatch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attestation",
+            name="signed_bytes",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
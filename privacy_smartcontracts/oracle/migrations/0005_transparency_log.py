@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("oracle", "0004_attestation_signed_bytes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogEntry",
+            fields=[
+                ("index", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("attestation_id", models.BigIntegerField(unique=True)),
+                ("logged_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="LogNode",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("hash", models.BinaryField(max_length=32)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SignedTreeHead",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tree_size", models.BigIntegerField(unique=True)),
+                ("root_hash", models.CharField(max_length=64)),
+                ("signed_bytes", models.BinaryField()),
+                ("signature_b64", models.TextField()),
+                ("signed_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -1,13 +1,69 @@
 from django.db import models
 from django.conf import settings
 
+class AttestationQuerySet(models.QuerySet):
+    def live(self):
+        return self.filter(revoked_at__isnull=True)
+
+class AttestationBatch(models.Model):
+    """One oracle signature over the Merkle root of many attestation payloads."""
+    root_hash = models.CharField(max_length=64, unique=True)  # hex SHA-256 Merkle root
+    signature_b64 = models.TextField()  # base64 Ed25519 signature over the raw root hash
+    size = models.PositiveIntegerField()
+    signer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='signed_attestation_batches')
+    issued_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Attestation batch {self.id} ({self.size} requests)"
+
 class Attestation(models.Model):
     id = models.AutoField(primary_key=True)
     data_request = models.ForeignKey('requests_app.DataAccessRequest', on_delete=models.CASCADE, related_name='attestations')
-    signer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='signed_attestations')
+    signer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='signed_attestations')  # None for system-issued attestations
     payload = models.JSONField()
-    signature_b64 = models.TextField()  # base64 encoded signature
+    signature_b64 = models.TextField(blank=True)  # base64 encoded signature; empty for batched attestations
+    batch = models.ForeignKey(AttestationBatch, on_delete=models.CASCADE, null=True, blank=True, related_name='attestations')
+    proof = models.JSONField(default=list, blank=True)  # Merkle inclusion proof of the payload in batch.root_hash
+    signed_bytes = models.BinaryField(null=True, blank=True)  # canonical payload bytes signed or hashed into the batch; None before canonical encoding
     issued_at = models.DateTimeField(auto_now_add=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    objects = AttestationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # At most one live (unrevoked) attestation per request
+            models.UniqueConstraint(fields=['data_request'], condition=models.Q(revoked_at__isnull=True), name='one_live_attestation_per_request'),
+        ]
 
     def __str__(self):
         return f"Attestation {self.id} for request {self.data_request.id}"
+
+class LogEntry(models.Model):
+    """One issued attestation, appended to the transparency log (see oracle.transparency)."""
+    index = models.BigIntegerField(primary_key=True)  # leaf position in the log's Merkle tree
+    # Not a foreign key: an entry must outlive the attestation row it records
+    attestation_id = models.BigIntegerField(unique=True)
+    logged_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Log entry {self.index} (attestation {self.attestation_id})"
+
+class LogNode(models.Model):
+    """
+    Hash of a complete subtree of the transparency log: the 2**level leaves from
+    index * 2**level on. Its id is transparency.node_id(level, index); level 0 are leaf hashes.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    hash = models.BinaryField(max_length=32)
+
+class SignedTreeHead(models.Model):
+    """An oracle signature over the transparency log's root at a given size."""
+    tree_size = models.BigIntegerField(unique=True)
+    root_hash = models.CharField(max_length=64)  # hex
+    signed_bytes = models.BinaryField()  # TREE_HEAD_CONTEXT + canonical {"root_hash", "timestamp", "tree_size"}
+    signature_b64 = models.TextField()
+    signed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Tree head {self.tree_size} ({self.root_hash[:12]})"
@@ -0,0 +1,154 @@
+"""
+Bulk re-verification of stored attestations.
+
+Audits that every Attestation still verifies against an oracle public key,
+e.g. after a key rotation or a database restore. Rows are streamed in primary
+key order with iterator(), verified in chunks across a process pool, and the
+highest primary key below which every chunk is done is written to a JSON
+checkpoint so an interrupted run can resume where it stopped.
+
+Workers only receive plain row tuples and never touch the database.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import hashlib
+import json
+import os
+import time
+
+from .models import Attestation
+from .services import verify_signature
+
+DEFAULT_CHUNK_SIZE = 2000
+# Failure and unsigned ids kept in the checkpoint/report; counts are always complete
+MAX_LISTED_IDS = 1000
+
+ROW_FIELDS = ('id', 'signer_id', 'payload', 'signature_b64', 'batch__root_hash', 'batch__signature_b64', 'proof',
+              'signed_bytes')
+
+_worker_public_key = None
+
+
+def _init_worker(public_b64):
+    global _worker_public_key
+    _worker_public_key = public_b64
+
+
+def verify_chunk(rows):
+    """Verify row tuples (ROW_FIELDS order); returns (checked, failed ids, unsigned ids, last id)."""
+    failed, unsigned = [], []
+    for pk, signer_id, payload, signature_b64, root_hash, batch_signature_b64, proof, signed_bytes in rows:
+        if signer_id is None:
+            unsigned.append(pk)
+        if not verify_signature(
+            _worker_public_key, payload, signature_b64, root_hash, batch_signature_b64, proof, signed_bytes
+        ):
+            failed.append(pk)
+    return len(rows), failed, unsigned, rows[-1][0]
+
+
+def key_fingerprint(public_b64):
+    return hashlib.sha256(public_b64.encode()).hexdigest()[:16]
+
+
+def empty_state(public_b64):
+    return {
+        'key_fingerprint': key_fingerprint(public_b64),
+        'last_id': 0,
+        'checked': 0,
+        'failed_count': 0,
+        'failed_ids': [],
+        'unsigned_count': 0,
+        'unsigned_ids': [],
+        'elapsed': 0.0,
+    }
+
+
+def load_checkpoint(path, public_b64):
+    """The saved state at `path`, or a fresh one. Raises ValueError if it was written for another key."""
+    if not path or not os.path.exists(path):
+        return empty_state(public_b64)
+    with open(path) as f:
+        state = json.load(f)
+    if state.get('key_fingerprint') != key_fingerprint(public_b64):
+        raise ValueError(f"Checkpoint {path} was written for a different oracle key")
+    return state
+
+
+def save_checkpoint(path, state):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _record(state, result):
+    checked, failed, unsigned, last_id = result
+    state['checked'] += checked
+    state['failed_count'] += len(failed)
+    state['unsigned_count'] += len(unsigned)
+    state['failed_ids'].extend(failed[:MAX_LISTED_IDS - len(state['failed_ids'])])
+    state['unsigned_ids'].extend(unsigned[:MAX_LISTED_IDS - len(state['unsigned_ids'])])
+    state['last_id'] = last_id
+
+
+def verify_all(public_b64, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, checkpoint=None, resume=False,
+               checkpoint_every=10, progress=None):
+    """
+    Verify every attestation with a primary key above the checkpoint and return the
+    final state dict (see empty_state), including 'rate' in rows per second for this run.
+    """
+    state = load_checkpoint(checkpoint, public_b64) if resume else empty_state(public_b64)
+    workers = workers or os.cpu_count() or 1
+    rows = (
+        Attestation.objects.filter(pk__gt=state['last_id']).order_by('pk')
+        .values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size)
+    )
+    started = time.perf_counter()
+    elapsed_before = state['elapsed']
+    checked_before = state['checked']
+    done = 0
+
+    def completed(result):
+        nonlocal done
+        _record(state, result)
+        state['elapsed'] = elapsed_before + time.perf_counter() - started
+        done += 1
+        if checkpoint and done % checkpoint_every == 0:
+            save_checkpoint(checkpoint, state)
+        if progress:
+            progress(state)
+
+    if workers == 1:
+        _init_worker(public_b64)
+        for chunk in _chunks(rows, chunk_size):
+            completed(verify_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(public_b64,)) as pool:
+            # Results are consumed in submission order so the checkpoint never skips an unfinished chunk
+            pending = deque()
+            for chunk in _chunks(rows, chunk_size):
+                pending.append(pool.submit(verify_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    completed(pending.popleft().result())
+            while pending:
+                completed(pending.popleft().result())
+
+    run_elapsed = time.perf_counter() - started
+    state['elapsed'] = elapsed_before + run_elapsed
+    if checkpoint:
+        save_checkpoint(checkpoint, state)
+    checked = state['checked'] - checked_before
+    state['rate'] = checked / run_elapsed if run_elapsed else 0.0
+    return state
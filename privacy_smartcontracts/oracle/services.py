@@ -0,0 +1,345 @@
+"""
+Oracle attestation service.
+
+The single place where Ed25519 attestations for DataAccessRequests are
+built and signed. The oracle key is decoded once per process (and again only
+if the configured key changes), payloads are built deterministically, and
+issuance is idempotent: a request has at most one live attestation, which is
+enforced by the one_live_attestation_per_request constraint.
+
+Attestations are either signed individually (signature_b64 over the
+canonical payload) or in Merkle batches: one signature over the root of a
+tree of payloads, with each attestation storing its inclusion proof. Each
+attestation also stores the exact canonical bytes that were signed or hashed
+(signed_bytes), so verification checks those rather than re-encoding the payload.
+
+Every issued attestation is also appended to the transparency log
+(oracle.transparency), in the transaction that stores it, so an attestation
+is never committed without its log entry. The oracle signs the log root with
+sign_tree_head().
+"""
+from functools import lru_cache
+import base64
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+from requests_app.events import publish_many
+from secure_computation import crypto_pool
+from . import canonical, merkle
+from .models import Attestation, AttestationBatch, SignedTreeHead
+from .transparency import parse_tree_head, transparency_log, tree_head_bytes
+
+DEFAULT_MERKLE_BATCH_SIZE = 5000
+
+
+@lru_cache(maxsize=4)
+def _decode_private_key(b64):
+    return Ed25519PrivateKey.from_private_bytes(base64.b64decode(b64))
+
+
+def load_private_key():
+    """The oracle signing key from settings.ORACLE_PRIVATE_KEY, or None if unset."""
+    b64 = getattr(settings, 'ORACLE_PRIVATE_KEY', None)
+    if not b64:
+        return None
+    return _decode_private_key(b64)
+
+
+@lru_cache(maxsize=4)
+def _decode_public_key(b64):
+    return Ed25519PublicKey.from_public_bytes(base64.b64decode(b64))
+
+
+def load_public_key():
+    """The oracle verification key from settings.ORACLE_PUBLIC_KEY, or None if unset."""
+    b64 = getattr(settings, 'ORACLE_PUBLIC_KEY', None)
+    if not b64:
+        return None
+    return _decode_public_key(b64)
+
+
+@lru_cache(maxsize=1024)
+def _root_signature_valid(public_b64, root_hash, signature_b64):
+    # A batch root is shared by thousands of attestations; verify its signature once per process
+    try:
+        _decode_public_key(public_b64).verify(base64.b64decode(signature_b64), bytes.fromhex(root_hash))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def verify_signature(public_b64, payload, signature_b64, root_hash=None, batch_signature_b64=None, proof=None,
+                     signed_bytes=None):
+    """
+    True if `payload` is signed by the key `public_b64`: directly by `signature_b64`,
+    or, for batched attestations (root_hash set), through `proof` and the signature
+    over the batch root. `signed_bytes` are the stored bytes that were signed, which
+    must be the canonical encoding of `payload`; without them (rows signed before canonical encoding)
+    the payload is encoded the legacy way.
+    """
+    if signed_bytes is None:
+        message = canonical.legacy_bytes(payload)
+    else:
+        message = bytes(signed_bytes)
+        if not canonical.matches(message, payload):
+            return False
+    if root_hash:
+        return (
+            merkle.verify_proof(message, proof or [], root_hash)
+            and _root_signature_valid(public_b64, root_hash, batch_signature_b64 or '')
+        )
+    try:
+        _decode_public_key(public_b64).verify(base64.b64decode(signature_b64), message)
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def verify_attestation(att):
+    """
+    True if `att` carries a valid oracle signature: directly over its payload, or
+    through its Merkle proof and the signature over its batch root.
+    """
+    public_b64 = getattr(settings, 'ORACLE_PUBLIC_KEY', None)
+    if not public_b64:
+        return False
+    if att.batch_id:
+        batch = att.batch
+        return verify_signature(
+            public_b64, att.payload, '', batch.root_hash, batch.signature_b64, att.proof, att.signed_bytes
+        )
+    return verify_signature(public_b64, att.payload, att.signature_b64, signed_bytes=att.signed_bytes)
+
+
+def verify_tree_head(head):
+    """
+    True if `head` carries a valid oracle signature over its tree size and root,
+    made as a tree head (with the transparency.TREE_HEAD_CONTEXT prefix).
+    """
+    public_b64 = getattr(settings, 'ORACLE_PUBLIC_KEY', None)
+    if not public_b64:
+        return False
+    try:
+        signed = parse_tree_head(head.signed_bytes)
+        if signed.get('tree_size') != head.tree_size or signed.get('root_hash') != head.root_hash:
+            return False
+        _decode_public_key(public_b64).verify(base64.b64decode(head.signature_b64), bytes(head.signed_bytes))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def pending_requests():
+    """Approved requests without a live attestation."""
+    from requests_app.models import DataAccessRequest
+    return DataAccessRequest.objects.filter(status='APPROVED').exclude(
+        pk__in=Attestation.objects.live().values('data_request_id')
+    )
+
+
+def _announce(dars):
+    publish_many('request_attested', [
+        ([dar.requester_id], {'request_id': dar.id, 'contract_id': dar.contract_id, 'status': dar.status})
+        for dar in dars
+    ])
+
+
+def build_payload(dar):
+    return {
+        "request_id": dar.id,
+        "contract_id": dar.contract_id,
+        "requester": dar.requester.email,
+        "approved_by_oracle": True,
+    }
+
+
+def canonical_bytes(payload):
+    """The exact bytes that are signed for an attestation payload (stored as signed_bytes)."""
+    return canonical.canonicalize(payload)
+
+
+class AttestationService:
+    """Issues, looks up and revokes oracle attestations."""
+
+    def __init__(self, private_key=None):
+        self._private_key = private_key
+
+    @property
+    def private_key(self):
+        return self._private_key or load_private_key()
+
+    @property
+    def is_configured(self):
+        return self.private_key is not None
+
+    def sign_payload(self, payload):
+        return self.sign_payloads([payload])[0]
+
+    def sign_payloads(self, payloads):
+        """
+        (signed bytes, base64 signature) for each of `payloads`; large bursts are
+        signed on the shared crypto process pool.
+        """
+        messages = [canonical_bytes(p) for p in payloads]
+        signatures = crypto_pool.sign_many(self.private_key, messages)
+        return [(message, base64.b64encode(signature).decode()) for message, signature in zip(messages, signatures)]
+
+    def live_attestation(self, dar):
+        return Attestation.objects.live().filter(data_request=dar).first()
+
+    def sign_one(self, dar, signer=None):
+        """
+        Return (attestation, created) for `dar`. An existing live attestation is
+        returned as is; otherwise one is signed and stored. Returns (None, False)
+        when no oracle key is configured.
+        """
+        existing = self.live_attestation(dar)
+        if existing:
+            return existing, False
+        if not self.is_configured:
+            return None, False
+        payload = build_payload(dar)
+        signed_bytes, signature = self.sign_payload(payload)
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    att = Attestation.objects.create(
+                        data_request=dar, signer=signer, payload=payload, signature_b64=signature, signed_bytes=signed_bytes
+                    )
+            except IntegrityError:
+                # Another process attested this request concurrently
+                return self.live_attestation(dar), False
+            transparency_log.append([att])
+        _announce([dar])
+        return att, True
+
+    def sign_many(self, dars, signer=None):
+        """
+        Attest every request in `dars` that has no live attestation yet, with one
+        lookup and one bulk insert. Returns the live attestations of those requests.
+        """
+        if not self.is_configured:
+            return []
+        dars = list(dars)
+        attested = set(
+            Attestation.objects.live().filter(data_request__in=dars).values_list('data_request_id', flat=True)
+        )
+        pending = [dar for dar in dars if dar.pk not in attested]
+        payloads = [build_payload(dar) for dar in pending]
+        new = [
+            Attestation(data_request=dar, signer=signer, payload=payload, signature_b64=signature, signed_bytes=signed_bytes)
+            for dar, payload, (signed_bytes, signature) in zip(pending, payloads, self.sign_payloads(payloads))
+        ]
+        with transaction.atomic():
+            # Rows that lose a race against a concurrent signer are dropped by the constraint
+            Attestation.objects.bulk_create(new, ignore_conflicts=True)
+            attestations = list(Attestation.objects.live().filter(data_request__in=pending).order_by('pk'))
+            transparency_log.append(attestations)
+        _announce(pending)
+        return attestations
+
+    def sign_batch(self, dars, signer=None):
+        """
+        Attest every request in `dars` that has no live attestation yet under a
+        single signature over the Merkle root of their payloads. Returns the new
+        AttestationBatch, or None if nothing needed attesting or no key is configured.
+        """
+        if not self.is_configured:
+            return None
+        dars = list(dars)
+        attested = set(
+            Attestation.objects.live().filter(data_request__in=dars).values_list('data_request_id', flat=True)
+        )
+        pending = [dar for dar in dars if dar.pk not in attested]
+        if not pending:
+            return None
+        payloads = [build_payload(dar) for dar in pending]
+        messages = [canonical_bytes(p) for p in payloads]
+        levels = merkle.build_levels([merkle.leaf_hash(m) for m in messages])
+        root_hash = levels[-1][0]
+        signature = base64.b64encode(self.private_key.sign(root_hash)).decode()
+        with transaction.atomic():
+            batch = AttestationBatch.objects.create(
+                root_hash=root_hash.hex(), signature_b64=signature, size=len(pending), signer=signer
+            )
+            Attestation.objects.bulk_create(
+                [
+                    Attestation(
+                        data_request=dar, signer=signer, payload=payload, batch=batch,
+                        proof=merkle.inclusion_proof(levels, index), signed_bytes=message,
+                    )
+                    for index, (dar, payload, message) in enumerate(zip(pending, payloads, messages))
+                ],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            transparency_log.append(batch.attestations.select_related('batch').order_by('pk'))
+        _announce(pending)
+        return batch
+
+    def attest_pending(self, signer=None, batch_size=DEFAULT_MERKLE_BATCH_SIZE):
+        """
+        Attest all approved, unattested requests in Merkle batches of up to
+        `batch_size`. Returns the list of batches created.
+        """
+        if not self.is_configured:
+            return []
+        batches = []
+        last_pk = 0
+        while True:
+            chunk = list(
+                pending_requests().filter(pk__gt=last_pk).select_related('requester').order_by('pk')[:batch_size]
+            )
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            batch = self.sign_batch(chunk, signer=signer)
+            if batch:
+                batches.append(batch)
+        return batches
+
+    def sign_tree_head(self):
+        """
+        Return (head, created): a new SignedTreeHead over the transparency log's
+        current root, or the latest head if it already covers every entry.
+        Returns (None, False) when the log is empty or no oracle key is configured.
+        """
+        latest = transparency_log.latest_head()
+        size = transparency_log.size()
+        if not self.is_configured or not size or (latest and latest.tree_size >= size):
+            return latest, False
+        root_hash = transparency_log.root(size).hex()
+        signed_bytes = tree_head_bytes(size, root_hash, int(time.time()))
+        signature = base64.b64encode(crypto_pool.sign(self.private_key, signed_bytes)).decode()
+        head, created = SignedTreeHead.objects.get_or_create(
+            tree_size=size,
+            defaults={'root_hash': root_hash, 'signed_bytes': signed_bytes, 'signature_b64': signature},
+        )
+        return head, created
+
+    def revoke(self, dar):
+        """Revoke the live attestation of `dar`, if any. Returns the number revoked."""
+        return Attestation.objects.live().filter(data_request=dar).update(revoked_at=timezone.now())
+
+    def measure_throughput(self, count=1000):
+        """
+        Sign `count` synthetic payloads as one burst (on the crypto process pool)
+        and return signatures per second, excluding database work. Useful for
+        comparing hosts, pool sizes and key-loading strategies.
+        """
+        payloads = [
+            {"request_id": i, "contract_id": i, "requester": f"user{i}@example.com", "approved_by_oracle": True}
+            for i in range(count)
+        ]
+        start = time.perf_counter()
+        self.sign_payloads(payloads)
+        elapsed = time.perf_counter() - start
+        return count / elapsed if elapsed else float('inf')
+
+
+attestation_service = AttestationService()
@@ -4,3 +4,366 @@ from django.test import TestCase
 from cryptography.fernet import Fernet
 print(Fernet.generate_key().decode())
 # set FERNET_KEY=<output> in .env
+
+from io import StringIO
+from unittest import mock
+import base64
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.db import IntegrityError, transaction
+from contracts.models import Contract
+from requests_app.models import DataAccessRequest
+from . import canonical, merkle, reverify, transparency
+from .models import Attestation, AttestationBatch, LogEntry
+from .services import (
+    attestation_service, build_payload, pending_requests, verify_attestation, verify_signature, verify_tree_head,
+)
+from .transparency import transparency_log
+
+User = get_user_model()
+
+
+class AttestationServiceTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+        self.dar = DataAccessRequest.objects.create(contract=self.contract, requester=self.requester, reason='Test')
+
+    def test_sign_one_is_idempotent(self):
+        att, created = attestation_service.sign_one(self.dar, signer=self.owner)
+        again, created_again = attestation_service.sign_one(self.dar, signer=self.owner)
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(att.pk, again.pk)
+        self.assertEqual(att.payload, build_payload(self.dar))
+
+    def test_approval_signal_does_not_duplicate(self):
+        """Signing on approval and the auto-attest signal produce a single attestation"""
+        attestation_service.sign_one(self.dar, signer=self.owner)
+        self.dar.status = 'APPROVED'
+        self.dar.save()
+        self.assertEqual(self.dar.attestations.count(), 1)
+
+    def test_constraint_rejects_second_live_attestation(self):
+        attestation_service.sign_one(self.dar)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Attestation.objects.create(data_request=self.dar, payload={}, signature_b64='x')
+
+    def test_sign_many(self):
+        others = [
+            DataAccessRequest.objects.create(contract=self.contract, requester=self.requester, reason=f'Test {i}')
+            for i in range(3)
+        ]
+        attestation_service.sign_one(self.dar)
+        attestations = attestation_service.sign_many([self.dar] + others)
+        self.assertEqual({a.data_request_id for a in attestations}, {d.pk for d in others})
+        self.assertEqual(Attestation.objects.count(), 4)
+
+    def test_revoke_then_resign(self):
+        att, _ = attestation_service.sign_one(self.dar)
+        self.assertEqual(attestation_service.revoke(self.dar), 1)
+        self.assertIsNone(attestation_service.live_attestation(self.dar))
+        fresh, created = attestation_service.sign_one(self.dar)
+        self.assertTrue(created)
+        self.assertNotEqual(fresh.pk, att.pk)
+
+    def test_signed_bytes_are_stored_and_checked(self):
+        att, _ = attestation_service.sign_one(self.dar)
+        att.refresh_from_db()
+        self.assertEqual(bytes(att.signed_bytes), canonical.canonicalize(build_payload(self.dar)))
+        self.assertTrue(verify_attestation(att))
+        att.payload['requester'] = 'mallory@test.com'
+        self.assertFalse(verify_attestation(att))
+
+    def test_legacy_attestation_still_verifies(self):
+        """Rows signed before canonical encoding have no signed_bytes and were signed over json.dumps output"""
+        payload = build_payload(self.dar)
+        signature = base64.b64encode(attestation_service.private_key.sign(canonical.legacy_bytes(payload))).decode()
+        att = Attestation.objects.create(data_request=self.dar, payload=payload, signature_b64=signature)
+        self.assertTrue(verify_attestation(att))
+
+
+class CanonicalJSONTestCase(TestCase):
+    def test_layout(self):
+        self.assertEqual(
+            canonical.canonicalize({'b': [1, True, None], 'a': {'d': 'x', 'c': 1.5}}),
+            b'{"a":{"c":1.5,"d":"x"},"b":[1,true,null]}'
+        )
+
+    def test_keys_sort_by_utf16_code_units(self):
+        # RFC 8785 section 3.2.3: U+1F600 (a surrogate pair) sorts before U+FB33
+        value = {'\u20ac': 1, '\r': 2, '\ufb33': 3, '1': 4, '\U0001F600': 5, '\u0080': 6, '\u00f6': 7}
+        self.assertEqual(
+            list(json.loads(canonical.canonicalize(value))),
+            ['\r', '1', '\u0080', '\u00f6', '\u20ac', '\U0001F600', '\ufb33']
+        )
+
+    def test_numbers(self):
+        cases = [
+            (0.0, '0'), (-0.0, '0'), (1.0, '1'), (-1.5, '-1.5'), (1e21, '1e+21'), (1e20, '100000000000000000000'),
+            (1e-7, '1e-7'), (0.000001, '0.000001'), (123.456, '123.456'), (5e-324, '5e-324'),
+            (2 ** 70, '1180591620717411303424'),
+        ]
+        for value, expected in cases:
+            self.assertEqual(canonical.canonicalize(value), expected.encode())
+
+    def test_string_escaping(self):
+        self.assertEqual(canonical.canonicalize('a"\\\n\x01\u00e9/'), '"a\\"\\\\\\n\\u0001\u00e9/"'.encode())
+
+    def test_matches_is_byte_exact(self):
+        signed = canonical.canonicalize({'a': 1, 'b': 'x'})
+        self.assertTrue(canonical.matches(signed, {'b': 'x', 'a': 1}))
+        self.assertTrue(canonical.matches(memoryview(signed), {'a': 1.0, 'b': 'x'}))
+        # Equal in Python, but not what was signed
+        self.assertFalse(canonical.matches(signed, {'a': True, 'b': 'x'}))
+        self.assertFalse(canonical.matches(canonical.canonicalize({'a': 1.5}), {'a': 1.5, 'b': None}))
+        # Same value, other bytes: whitespace, key order, duplicate keys
+        for other in (b'{"a": 1, "b": "x"}', b'{"b":"x","a":1}', b'{"a":2,"a":1,"b":"x"}'):
+            self.assertEqual(json.loads(other), {'a': 1, 'b': 'x'})
+            self.assertFalse(canonical.matches(other, {'a': 1, 'b': 'x'}))
+        self.assertFalse(canonical.matches(signed, {'a': float('nan')}))
+
+    def test_rejects_values_without_a_single_encoding(self):
+        for value in (float('nan'), float('inf'), {1: 'a'}, '\ud800', {'a': object()}):
+            with self.assertRaises((ValueError, TypeError)):
+                canonical.canonicalize(value)
+
+
+class MerkleTestCase(TestCase):
+    def test_every_leaf_proves_inclusion(self):
+        for size in range(1, 10):
+            data = [f'leaf-{i}'.encode() for i in range(size)]
+            levels = merkle.build_levels([merkle.leaf_hash(d) for d in data])
+            root = levels[-1][0].hex()
+            for index, leaf in enumerate(data):
+                proof = merkle.inclusion_proof(levels, index)
+                self.assertTrue(merkle.verify_proof(leaf, proof, root))
+                self.assertFalse(merkle.verify_proof(leaf + b'x', proof, root))
+
+    def test_malformed_proof_is_rejected(self):
+        levels = merkle.build_levels([merkle.leaf_hash(b'a'), merkle.leaf_hash(b'b')])
+        self.assertFalse(merkle.verify_proof(b'a', [['R', 'not-hex']], levels[-1][0].hex()))
+
+
+class AttestationBatchTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+        self.dars = [
+            DataAccessRequest.objects.create(contract=self.contract, requester=self.requester, reason=f'Test {i}')
+            for i in range(5)
+        ]
+        # Approve without the auto-attest signal so the requests are left for the batch
+        DataAccessRequest.objects.filter(pk__in=[d.pk for d in self.dars]).update(status='APPROVED')
+
+    def test_attest_pending_signs_one_root_per_batch(self):
+        batches = attestation_service.attest_pending(batch_size=3)
+        self.assertEqual([b.size for b in batches], [3, 2])
+        self.assertFalse(pending_requests().exists())
+        for att in Attestation.objects.select_related('batch'):
+            self.assertEqual(att.signature_b64, '')
+            self.assertTrue(verify_attestation(att))
+
+    def test_attest_pending_is_idempotent(self):
+        attestation_service.attest_pending()
+        self.assertEqual(attestation_service.attest_pending(), [])
+        self.assertEqual(AttestationBatch.objects.count(), 1)
+        self.assertEqual(Attestation.objects.count(), 5)
+
+    def test_tampered_payload_fails_verification(self):
+        attestation_service.attest_pending()
+        att = Attestation.objects.first()
+        att.payload['requester'] = 'mallory@test.com'
+        self.assertFalse(verify_attestation(att))
+
+    def test_root_signature_from_another_batch_is_rejected(self):
+        batch = attestation_service.sign_batch(self.dars[:1])
+        other = attestation_service.sign_batch(self.dars[1:])
+        att = batch.attestations.get()
+        att.batch.signature_b64 = other.signature_b64
+        self.assertFalse(verify_attestation(att))
+
+    def test_sign_batch_view(self):
+        self.client.login(username='owner', password='pass')
+        self.client.post(reverse('oracle:sign_batch'))
+        self.assertEqual(Attestation.objects.live().count(), 5)
+
+
+class TransparencyLogTestCase(TestCase):
+    def setUp(self):
+        transparency_log.clear_cache()
+        self.addCleanup(transparency_log.clear_cache)
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+        self.dars = [
+            DataAccessRequest.objects.create(contract=contract, requester=self.owner, reason=f'Test {i}')
+            for i in range(13)
+        ]
+        attestation_service.sign_one(self.dars[0])
+        attestation_service.sign_many(self.dars[1:6])
+        attestation_service.sign_batch(self.dars[6:])
+        self.leaves = [
+            transparency.leaf_data(Attestation.objects.select_related('batch').get(pk=pk))
+            for pk in LogEntry.objects.order_by('index').values_list('attestation_id', flat=True)
+        ]
+
+    def test_every_attestation_is_logged_once(self):
+        self.assertEqual(transparency_log.size(), 13)
+        self.assertEqual(transparency_log.append(Attestation.objects.select_related('batch')), 0)
+        self.assertEqual(transparency_log.append_unlogged(batch_size=4), 0)
+
+    def test_failed_append_rolls_back_the_attestation(self):
+        """Attestations are logged in the transaction that stores them, so none is left unlogged"""
+        dars = [
+            DataAccessRequest.objects.create(contract=self.dars[0].contract, requester=self.owner, reason=f'New {i}')
+            for i in range(3)
+        ]
+        with mock.patch.object(transparency_log, '_append', side_effect=RuntimeError('log unavailable')):
+            with self.assertRaises(RuntimeError):
+                attestation_service.sign_one(dars[0])
+            with self.assertRaises(RuntimeError):
+                attestation_service.sign_many(dars)
+            with self.assertRaises(RuntimeError):
+                attestation_service.sign_batch(dars)
+        self.assertFalse(Attestation.objects.filter(data_request__in=dars).exists())
+        self.assertFalse(AttestationBatch.objects.filter(attestations__isnull=True).exists())
+        self.assertEqual(transparency_log.size(), 13)
+
+    def test_roots_match_a_tree_built_from_scratch(self):
+        for size in range(1, 14):
+            leaves = [merkle.leaf_hash(data) for data in self.leaves[:size]]
+            self.assertEqual(transparency_log.root(size), merkle.build_levels(leaves)[-1][0])
+
+    def test_inclusion_proofs(self):
+        for size in range(1, 14):
+            root = transparency_log.root(size).hex()
+            for index in range(size):
+                proof = transparency_log.inclusion_proof(index, size)
+                self.assertTrue(merkle.verify_proof(self.leaves[index], proof, root))
+                self.assertFalse(merkle.verify_proof(self.leaves[index - 1], proof, root) and size > 1)
+
+    def test_consistency_proofs(self):
+        roots = {size: transparency_log.root(size).hex() for size in range(1, 14)}
+        for second in range(1, 14):
+            for first in range(1, second + 1):
+                proof = transparency_log.consistency_proof(first, second)
+                self.assertTrue(transparency.verify_consistency(first, second, roots[first], roots[second], proof))
+                if first < second:
+                    wrong = roots[first - 1] if first > 1 else roots[second]
+                    self.assertFalse(transparency.verify_consistency(first, second, wrong, roots[second], proof))
+
+    def test_proofs_are_served_from_cache(self):
+        transparency_log.inclusion_proof(3, 13)
+        with self.assertNumQueries(0):
+            transparency_log.inclusion_proof(3, 13)
+
+    def test_signed_tree_head(self):
+        head, created = attestation_service.sign_tree_head()
+        self.assertTrue(created)
+        self.assertEqual((head.tree_size, head.root_hash), (13, transparency_log.root(13).hex()))
+        self.assertTrue(verify_tree_head(head))
+        self.assertEqual(attestation_service.sign_tree_head(), (head, False))
+        head.root_hash = transparency_log.root(12).hex()
+        self.assertFalse(verify_tree_head(head))
+
+    def test_tree_head_signature_is_domain_separated(self):
+        head, _ = attestation_service.sign_tree_head()
+        self.assertTrue(bytes(head.signed_bytes).startswith(transparency.TREE_HEAD_CONTEXT))
+        # An attestation-style signature over the same fields, without the context tag, is not a tree head
+        fields = transparency.parse_tree_head(head.signed_bytes)
+        head.signed_bytes, head.signature_b64 = attestation_service.sign_payload(fields)
+        self.assertFalse(verify_tree_head(head))
+        # nor does a tree head signature verify as an attestation over its fields
+        head, _ = attestation_service.sign_tree_head()
+        self.assertFalse(verify_signature(
+            settings.ORACLE_PUBLIC_KEY, fields, head.signature_b64, signed_bytes=canonical.canonicalize(fields)
+        ))
+
+    def test_sign_tree_head_command_catches_up(self):
+        # Issued before the log existed
+        dar = DataAccessRequest.objects.create(contract=self.dars[0].contract, requester=self.owner, reason='Old')
+        Attestation.objects.create(data_request=dar, payload=build_payload(dar), signature_b64='x')
+        out = StringIO()
+        call_command('sign_tree_head', '--catch-up', stdout=out)
+        self.assertIn('1 attestation(s) appended', out.getvalue())
+        self.assertIn('Tree head signed: 14 entries', out.getvalue())
+
+    def test_proof_views(self):
+        attestation_service.sign_tree_head()
+        self.client.login(username='owner', password='pass')
+        head = self.client.get(reverse('oracle:log_head')).json()
+        self.assertTrue(base64.b64decode(head['signed_bytes_b64']).startswith(transparency.TREE_HEAD_CONTEXT))
+        att = Attestation.objects.get(data_request=self.dars[0])
+        inclusion = self.client.get(reverse('oracle:log_inclusion', args=[att.pk])).json()
+        self.assertTrue(inclusion['row_matches'])
+        self.assertTrue(merkle.verify_proof(inclusion['leaf_data'].encode(), inclusion['proof'], head['root_hash']))
+        consistency = self.client.get(reverse('oracle:log_consistency'), {'first': 5}).json()
+        self.assertEqual(consistency['second'], 13)
+        self.assertEqual(
+            self.client.get(reverse('oracle:log_consistency'), {'first': 14}).status_code, 400
+        )
+
+    def test_edited_row_no_longer_matches_the_log(self):
+        att = Attestation.objects.get(data_request=self.dars[0])
+        Attestation.objects.filter(pk=att.pk).update(signature_b64='forged')
+        self.client.login(username='owner', password='pass')
+        inclusion = self.client.get(reverse('oracle:log_inclusion', args=[att.pk]), {'tree_size': 13}).json()
+        self.assertFalse(inclusion['row_matches'])
+
+
+class VerifyAttestationsTestCase(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=owner)
+        dars = [
+            DataAccessRequest.objects.create(contract=contract, requester=requester, reason=f'Test {i}')
+            for i in range(6)
+        ]
+        attestation_service.sign_many(dars[:3], signer=owner)
+        attestation_service.sign_batch(dars[3:])  # system-issued, no signer
+        self.tampered = Attestation.objects.order_by('pk').first()
+        Attestation.objects.filter(pk=self.tampered.pk).update(payload={'request_id': 0})
+        fd, self.checkpoint = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        os.remove(self.checkpoint)
+
+    def tearDown(self):
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+    def test_reports_failures_and_unsigned(self):
+        state = reverify.verify_all(settings.ORACLE_PUBLIC_KEY, workers=1, chunk_size=2)
+        self.assertEqual(state['checked'], 6)
+        self.assertEqual(state['failed_ids'], [self.tampered.pk])
+        self.assertEqual(state['unsigned_count'], 3)
+
+    def test_process_pool(self):
+        state = reverify.verify_all(settings.ORACLE_PUBLIC_KEY, workers=2, chunk_size=2)
+        self.assertEqual(state['checked'], 6)
+        self.assertEqual(state['failed_ids'], [self.tampered.pk])
+
+    def test_resume_from_checkpoint(self):
+        first_three = list(Attestation.objects.order_by('pk').values_list('pk', flat=True)[:3])
+        state = reverify.empty_state(settings.ORACLE_PUBLIC_KEY)
+        state.update(last_id=first_three[-1], checked=3, failed_count=1, failed_ids=[self.tampered.pk])
+        reverify.save_checkpoint(self.checkpoint, state)
+
+        state = reverify.verify_all(settings.ORACLE_PUBLIC_KEY, workers=1, checkpoint=self.checkpoint, resume=True)
+        self.assertEqual(state['checked'], 6)
+        self.assertEqual(state['failed_count'], 1)
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['last_id'], Attestation.objects.order_by('pk').last().pk)
+
+    def test_checkpoint_for_another_key_is_refused(self):
+        reverify.save_checkpoint(self.checkpoint, reverify.empty_state('another key'))
+        with self.assertRaises(ValueError):
+            reverify.verify_all(settings.ORACLE_PUBLIC_KEY, workers=1, checkpoint=self.checkpoint, resume=True)
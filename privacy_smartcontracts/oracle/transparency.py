@@ -0,0 +1,304 @@
+"""
+Append-only transparency log of issued attestations.
+
+Every attestation the oracle issues is appended as a leaf of one ever-growing
+Merkle tree, and the tree's root is signed periodically (SignedTreeHead). With
+a signed head, anyone can check that an attestation was issued (inclusion
+proof) and that a later head extends an earlier one without rewriting or
+dropping entries (consistency proof), without trusting the Attestation table.
+
+The tree has the RFC 6962 shape and uses oracle.merkle's leaf and node hashes,
+so inclusion proofs have the same format as batch proofs and verify with
+merkle.verify_proof.
+
+- When the last leaf of a complete subtree (2**level leaves starting at a
+  multiple of 2**level) is appended, its hash is stored as a LogNode. Every
+  subtree in a proof is either one of these or splits into at most log2(n) of
+  them, so a proof costs O(log n) hashes and a single query.
+- Stored nodes never change, so they are kept in a process-local cache and
+  repeated proofs usually need no query at all.
+- Appends run in a transaction. If a concurrent append claims the same leaf
+  positions, the primary key rejects it and the append is retried.
+
+A signed tree head covers TREE_HEAD_CONTEXT followed by the canonical JSON of
+its size, root and timestamp. The prefix separates tree head signatures from
+attestation signatures (canonical JSON payloads) made with the same key.
+"""
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+
+from django.db import IntegrityError, transaction
+
+from . import canonical, merkle
+from .models import Attestation, LogEntry, LogNode, SignedTreeHead
+
+MAX_CACHED_NODES = 1 << 17
+APPEND_RETRIES = 5
+DEFAULT_CATCH_UP_BATCH_SIZE = 5000
+EMPTY_ROOT = hashlib.sha256(b'').digest()
+TREE_HEAD_CONTEXT = b'cc-tree-head-v1\x00'
+
+
+def node_id(level, index):
+    """LogNode primary key of the complete subtree `index` at `level`."""
+    return index << 6 | level
+
+
+def _split(size):
+    """The largest power of two below `size` (at least 2)."""
+    return 1 << ((size - 1).bit_length() - 1)
+
+
+def _complete_subtrees(start, end):
+    """(level, index) of the complete subtrees that [start, end) splits into, left to right."""
+    # Every range used here starts at a multiple of a power of two above its length, so each piece is aligned
+    subtrees = []
+    while start < end:
+        level = (end - start).bit_length() - 1
+        subtrees.append((level, start >> level))
+        start += 1 << level
+    return subtrees
+
+
+def leaf_data(att):
+    """The logged bytes of `att`: which request, what was signed, and the signature or batch root it was signed by."""
+    signed = bytes(att.signed_bytes) if att.signed_bytes is not None else canonical.legacy_bytes(att.payload)
+    return canonical.canonicalize({
+        'attestation_id': att.pk,
+        'data_request_id': att.data_request_id,
+        'signed_sha256': hashlib.sha256(signed).hexdigest(),
+        'signature_b64': att.signature_b64,
+        'batch_root_hash': att.batch.root_hash if att.batch_id else None,
+        'issued_at': int(att.issued_at.timestamp()),
+    })
+
+
+def tree_head_bytes(tree_size, root_hash, timestamp):
+    """The bytes the oracle signs for a tree head."""
+    return TREE_HEAD_CONTEXT + canonical.canonicalize(
+        {'tree_size': tree_size, 'root_hash': root_hash, 'timestamp': timestamp}
+    )
+
+
+def parse_tree_head(signed_bytes):
+    """The fields of signed tree head bytes; raises ValueError unless they carry TREE_HEAD_CONTEXT."""
+    signed_bytes = bytes(signed_bytes)
+    if not signed_bytes.startswith(TREE_HEAD_CONTEXT):
+        raise ValueError("Not tree head bytes")
+    fields = json.loads(signed_bytes[len(TREE_HEAD_CONTEXT):])
+    if not isinstance(fields, dict):
+        raise ValueError("Malformed tree head")
+    return fields
+
+
+def verify_consistency(first, second, first_root, second_root, proof):
+    """
+    True if `proof` (hex hashes) shows that the tree of `second` leaves with root
+    `second_root` extends the tree of `first` leaves with root `first_root`
+    (RFC 9162, section 2.1.4.2).
+    """
+    try:
+        first_hash, second_hash = bytes.fromhex(first_root), bytes.fromhex(second_root)
+        path = [bytes.fromhex(h) for h in proof]
+    except (TypeError, ValueError):
+        return False
+    if not 0 < first <= second:
+        return False
+    if first == second:
+        return not path and first_hash == second_hash
+    if first & (first - 1) == 0:
+        path.insert(0, first_hash)  # the old tree is a complete subtree, which the proof leaves out
+    if not path:
+        return False
+    fn, sn = first - 1, second - 1
+    while fn & 1:
+        fn >>= 1
+        sn >>= 1
+    fr = sr = path[0]
+    for sibling in path[1:]:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            fr = merkle.node_hash(sibling, fr)
+            sr = merkle.node_hash(sibling, sr)
+            while fn and not fn & 1:
+                fn >>= 1
+                sn >>= 1
+        else:
+            sr = merkle.node_hash(sr, sibling)
+        fn >>= 1
+        sn >>= 1
+    return fr == first_hash and sr == second_hash and sn == 0
+
+
+class TransparencyLog:
+    """Appends attestations to the log and answers root, inclusion and consistency queries."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._nodes = OrderedDict()  # node_id -> hash, least recently used first
+
+    def clear_cache(self):
+        with self._lock:
+            self._nodes.clear()
+
+    def _remember(self, nodes):
+        with self._lock:
+            self._nodes.update(nodes)
+            while len(self._nodes) > MAX_CACHED_NODES:
+                self._nodes.popitem(last=False)
+
+    def _fetch(self, subtrees):
+        """
+        {(level, index): hash} of stored complete subtrees, from the cache or with
+        one query. Raises LookupError for subtrees not in the log (yet).
+        """
+        ids = {node_id(*subtree): subtree for subtree in subtrees}
+        found, missing = {}, []
+        with self._lock:
+            for pk in ids:
+                if pk in self._nodes:
+                    self._nodes.move_to_end(pk)
+                    found[pk] = self._nodes[pk]
+                else:
+                    missing.append(pk)
+        if missing:
+            rows = {pk: bytes(h) for pk, h in LogNode.objects.filter(id__in=missing).values_list('id', 'hash')}
+            if len(rows) != len(missing):
+                raise LookupError("The transparency log is missing subtree hashes")
+            self._remember(rows)
+            found.update(rows)
+        return {subtree: found[pk] for pk, subtree in ids.items()}
+
+    def _range_hashes(self, ranges):
+        """The Merkle tree hash of each [start, end) in `ranges`."""
+        pieces = [_complete_subtrees(start, end) for start, end in ranges]
+        nodes = self._fetch([subtree for subtrees in pieces for subtree in subtrees])
+        hashes = []
+        for subtrees in pieces:
+            node = nodes[subtrees[-1]]
+            for subtree in reversed(subtrees[:-1]):
+                node = merkle.node_hash(nodes[subtree], node)
+            hashes.append(node)
+        return hashes
+
+    def size(self):
+        """The number of logged attestations."""
+        last = LogEntry.objects.order_by('-index').values_list('index', flat=True).first()
+        return 0 if last is None else last + 1
+
+    def root(self, tree_size):
+        """The root hash of the log's first `tree_size` entries."""
+        if tree_size == 0:
+            return EMPTY_ROOT
+        return self._range_hashes([(0, tree_size)])[0]
+
+    def leaf_hash(self, index):
+        return self._fetch([(0, index)])[(0, index)]
+
+    def latest_head(self):
+        return SignedTreeHead.objects.order_by('-tree_size').first()
+
+    def index_of(self, attestation_id):
+        """The log index of `attestation_id`, or None if it is not logged."""
+        return LogEntry.objects.filter(attestation_id=attestation_id).values_list('index', flat=True).first()
+
+    def inclusion_proof(self, index, tree_size):
+        """
+        The audit path of leaf `index` in the tree of `tree_size` entries, in the
+        merkle.inclusion_proof format (leaf first, each hash tagged with its side).
+        Raises LookupError if the log has fewer than `tree_size` entries.
+        """
+        if not 0 <= index < tree_size:
+            raise ValueError(f"Entry {index} is not in a tree of {tree_size} entries")
+        path, start, end = [], 0, tree_size
+        while end - start > 1:
+            k = _split(end - start)
+            if index < start + k:
+                path.append(('R', start + k, end))
+                end = start + k
+            else:
+                path.append(('L', start, start + k))
+                start += k
+        path.reverse()
+        hashes = self._range_hashes([(s, e) for _, s, e in path])
+        return [[side, h.hex()] for (side, _, _), h in zip(path, hashes)]
+
+    def consistency_proof(self, first, second):
+        """The hex hashes proving that the tree of `second` entries extends the tree of `first` entries (RFC 6962)."""
+        if not 0 < first <= second:
+            raise ValueError(f"No consistency proof from {first} to {second} entries")
+        ranges, start, end, m, whole = [], 0, second, first, True
+        while m != end - start:
+            k = _split(end - start)
+            if m <= k:
+                ranges.append((start + k, end))
+                end = start + k
+            else:
+                ranges.append((start, start + k))
+                m -= k
+                start += k
+                whole = False
+        if not whole:
+            ranges.append((start, end))
+        ranges.reverse()
+        return [h.hex() for h in self._range_hashes(ranges)]
+
+    def append(self, attestations):
+        """Append the attestations that are not logged yet, in order. Returns the number appended."""
+        attestations = list({att.pk: att for att in attestations}.values())
+        for attempt in range(APPEND_RETRIES):
+            try:
+                with transaction.atomic():
+                    return self._append(attestations)
+            except IntegrityError:
+                # Another process appended at the same positions (or logged the same attestations)
+                if attempt == APPEND_RETRIES - 1:
+                    raise
+        return 0
+
+    def _append(self, attestations):
+        logged = set(
+            LogEntry.objects.filter(attestation_id__in=[att.pk for att in attestations])
+            .values_list('attestation_id', flat=True)
+        )
+        new = [att for att in attestations if att.pk not in logged]
+        if not new:
+            return 0
+        size = self.size()
+        # Left siblings of the nodes completed below are either new or complete subtrees of the current tree
+        known = self._fetch(_complete_subtrees(0, size))
+        created = {}
+        for index, att in enumerate(new, start=size):
+            level, node = 0, merkle.leaf_hash(leaf_data(att))
+            created[(0, index)] = node
+            while index & 1:
+                node = merkle.node_hash(created.get((level, index - 1)) or known[(level, index - 1)], node)
+                level, index = level + 1, index >> 1
+                created[(level, index)] = node
+        LogEntry.objects.bulk_create(
+            [LogEntry(index=index, attestation_id=att.pk) for index, att in enumerate(new, start=size)],
+            batch_size=500,
+        )
+        LogNode.objects.bulk_create(
+            [LogNode(id=node_id(*subtree), hash=h) for subtree, h in created.items()], batch_size=500
+        )
+        return len(new)
+
+    def append_unlogged(self, batch_size=DEFAULT_CATCH_UP_BATCH_SIZE):
+        """
+        Append every attestation that is not logged yet (those issued before the
+        log existed), in primary key order. Returns the number appended.
+        """
+        appended, last_pk = 0, 0
+        while True:
+            chunk = list(Attestation.objects.filter(pk__gt=last_pk).select_related('batch').order_by('pk')[:batch_size])
+            if not chunk:
+                return appended
+            last_pk = chunk[-1].pk
+            appended += self.append(chunk)
+
+
+transparency_log = TransparencyLog()
@@ -5,4 +5,8 @@ app_name = 'oracle'
 urlpatterns = [
     path('', views.list_pending_for_oracle, name='pending'),
     path('sign/<int:request_id>/', views.sign_request, name='sign'),
+    path('sign-batch/', views.sign_batch, name='sign_batch'),
+    path('log/head/', views.log_head, name='log_head'),
+    path('log/inclusion/<int:attestation_id>/', views.log_inclusion, name='log_inclusion'),
+    path('log/consistency/', views.log_consistency, name='log_consistency'),
 ]
@@ -1,25 +1,38 @@
+import base64
+
 from django.shortcuts import render, get_object_or_404, redirect
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from requests_app.models import DataAccessRequest
 from .models import Attestation
+from . import merkle
 from django.contrib import messages
-from django.conf import settings
-import json, base64
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from audit.utils import log_event
-
-def load_private_key():
-    b64 = getattr(settings, 'ORACLE_PRIVATE_KEY', None)
-    if not b64:
-        return None
-    raw = base64.b64decode(b64)
-    return Ed25519PrivateKey.from_private_bytes(raw)
+from .services import attestation_service, pending_requests
+from .transparency import leaf_data, transparency_log
 
 @login_required
 def list_pending_for_oracle(request):
     # simple listing of approved requests (signed only after approval)
     qs = DataAccessRequest.objects.filter(status='APPROVED').order_by('-processed_at')[:50]
-    return render(request, 'oracle/pending_list.html', {'requests': qs})
+    return render(request, 'oracle/pending_list.html', {'requests': qs, 'unattested_count': pending_requests().count()})
+
+@login_required
+def sign_batch(request):
+    """Attest every approved, unattested request under Merkle-batched signatures."""
+    if request.method != 'POST':
+        return redirect('oracle:pending')
+    if not attestation_service.is_configured:
+        messages.error(request, "Oracle private key not configured.")
+        return redirect('oracle:pending')
+    batches = attestation_service.attest_pending(signer=request.user)
+    for batch in batches:
+        log_event('attestation_batch_issued', request.user, {'batch_id': batch.id, 'root_hash': batch.root_hash, 'size': batch.size})
+    if batches:
+        messages.success(request, f"{sum(b.size for b in batches)} request(s) attested in {len(batches)} batch(es)")
+    else:
+        messages.info(request, "No approved requests awaiting attestation.")
+    return redirect('oracle:pending')
 
 @login_required
 def sign_request(request, request_id):
@@ -29,17 +42,79 @@ def sign_request(request, request_id):
         messages.error(request, "Request is not approved.")
         return redirect('oracle:pending')
     if request.method == 'POST':
-        # build payload
-        payload = {"request_id": dar.id, "contract_id": dar.contract.id, "requester": dar.requester.email, "approved_by_oracle": True}
-        payload_bytes = json.dumps(payload, sort_keys=True).encode()
-        priv = load_private_key()
-        if not priv:
+        if not attestation_service.is_configured:
             messages.error(request, "Oracle private key not configured.")
             return redirect('oracle:pending')
-        signature = priv.sign(payload_bytes)
-        sig_b64 = base64.b64encode(signature).decode()
-        att = Attestation.objects.create(data_request=dar, signer=request.user, payload=payload, signature_b64=sig_b64)
-        log_event('attestation_issued', request.user, {'attestation_id': att.id, 'request_id': dar.id})
-        messages.success(request, f"Attestation created (id={att.id})")
+        att, created = attestation_service.sign_one(dar, signer=request.user)
+        if created:
+            log_event('attestation_issued', request.user, {'attestation_id': att.id, 'request_id': dar.id})
+            messages.success(request, f"Attestation created (id={att.id})")
+        else:
+            messages.info(request, f"Request already attested (id={att.id})")
         return redirect('oracle:pending')
     return render(request, 'oracle/sign_confirm.html', {'request_obj': dar})
+
+def _head_json(head):
+    return {
+        'tree_size': head.tree_size,
+        'root_hash': head.root_hash,
+        'signed_bytes_b64': base64.b64encode(bytes(head.signed_bytes)).decode(),
+        'signature_b64': head.signature_b64,
+    }
+
+def _tree_size(request, name, default):
+    """Positive integer query parameter `name`, or `default`; None if malformed."""
+    try:
+        value = int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+@login_required
+def log_head(request):
+    """The latest signed tree head of the attestation transparency log."""
+    head = transparency_log.latest_head()
+    if head is None:
+        return JsonResponse({'error': 'No signed tree head yet'}, status=404)
+    return JsonResponse(_head_json(head))
+
+@login_required
+def log_inclusion(request, attestation_id):
+    """
+    Inclusion proof of an attestation in the log at ?tree_size= (default: the
+    latest signed head), with the leaf data its current row hashes to.
+    """
+    index = transparency_log.index_of(attestation_id)
+    if index is None:
+        return JsonResponse({'error': 'Attestation not logged'}, status=404)
+    head = transparency_log.latest_head()
+    tree_size = _tree_size(request, 'tree_size', head.tree_size if head else None)
+    try:
+        proof = transparency_log.inclusion_proof(index, tree_size or 0)
+        leaf_hash = transparency_log.leaf_hash(index)
+    except (LookupError, ValueError):
+        return JsonResponse({'error': 'Entry not covered by this tree size'}, status=400)
+    att = Attestation.objects.select_related('batch').filter(pk=attestation_id).first()
+    data = leaf_data(att) if att else None
+    return JsonResponse({
+        'attestation_id': attestation_id,
+        'index': index,
+        'tree_size': tree_size,
+        'leaf_hash': leaf_hash.hex(),
+        # None if the row was deleted; a mismatch means it was edited after issuance
+        'leaf_data': data.decode() if data else None,
+        'row_matches': None if data is None else merkle.leaf_hash(data) == leaf_hash,
+        'proof': proof,
+    })
+
+@login_required
+def log_consistency(request):
+    """Consistency proof between log sizes ?first= and ?second= (default: the latest signed head)."""
+    head = transparency_log.latest_head()
+    first = _tree_size(request, 'first', None)
+    second = _tree_size(request, 'second', head.tree_size if head else None)
+    try:
+        proof = transparency_log.consistency_proof(first or 0, second or 0)
+    except (LookupError, ValueError):
+        return JsonResponse({'error': 'Invalid tree sizes'}, status=400)
+    return JsonResponse({'first': first, 'second': second, 'proof': proof})
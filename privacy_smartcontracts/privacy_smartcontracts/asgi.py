@@ -13,4 +13,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "privacy_smartcontracts.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up by get_asgi_application()
+from access_proxy.asgi import BLOB_PREFIX, blob_app  # noqa: E402
+from requests_app.sse import EVENTS_PATH, events_app  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Serve signed blob URLs and the notification feed from lean handlers and
+    everything else through Django.
+    """
+    if scope["type"] == "http" and scope["path"].startswith(BLOB_PREFIX):
+        await blob_app(scope, receive, send)
+    elif scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+        await events_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
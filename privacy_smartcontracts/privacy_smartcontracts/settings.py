@@ -52,6 +52,7 @@ INSTALLED_APPS = [
     'access_proxy',
     'audit.apps.AuditConfig',  # Use AppConfig to auto-create admin
     'secure_computation',
+    'api',
 
 ]
 
@@ -159,3 +160,54 @@ load_dotenv()  # reads .env in project root
 FERNET_KEY = os.getenv("FERNET_KEY")
 ORACLE_PRIVATE_KEY = os.getenv("ORACLE_PRIVATE_KEY")
 ORACLE_PUBLIC_KEY = os.getenv("ORACLE_PUBLIC_KEY")
+
+# Caches. "default" is per process. "shared" is seen by every web, approval-worker and
+# management-command process and holds the public catalogue version. It is Redis when
+# REDIS_URL is set (requires the redis package), otherwise the database cache table created
+# by `manage.py createcachetable`. Throttling state (access_proxy.throttling) is written on
+# every request, so it only uses the shared cache when that is Redis; without Redis each
+# process throttles in its own memory rather than writing to the database.
+REDIS_URL = os.getenv("REDIS_URL")
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}
+        if REDIS_URL else
+        {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "shared_cache"}
+    ),
+}
+THROTTLE_CACHE = "shared" if REDIS_URL else "default"
+CATALOGUE_VERSION_CACHE = "shared"
+
+# Run queued approvals inline instead of waiting for `manage.py run_approval_worker`
+APPROVAL_JOBS_EAGER = os.getenv("APPROVAL_JOBS_EAGER") == "true"
+
+# Lifetime in seconds of the signed blob URLs minted by the access proxy
+RETRIEVAL_URL_TTL = int(os.getenv("RETRIEVAL_URL_TTL", "300"))
+
+# Fan-out of notification events to SSE connections: DatabaseBackend (across processes,
+# e.g. approval workers and several ASGI servers) or LocalBackend (single process only;
+# the approval worker refuses to start with it)
+NOTIFICATIONS_BACKEND = os.getenv("NOTIFICATIONS_BACKEND", "requests_app.events.DatabaseBackend")
+
+# Persisted TEE enclave attestation key, shared by all worker processes and rotated after
+# TEE_KEY_ROTATION_DAYS (or on `manage.py rotate_tee_key`)
+TEE_KEY_FILE = os.getenv("TEE_KEY_FILE", str(BASE_DIR / "tee_enclave_key.json"))
+TEE_KEY_ROTATION_DAYS = int(os.getenv("TEE_KEY_ROTATION_DAYS", "30"))
+
+# Runs the tests with TEE_KEY_FILE in a temporary directory
+TEST_RUNNER = "privacy_smartcontracts.test_runner.TestRunner"
+
+# Run SMPC aggregation in separate (spawned) party processes (secure_computation.smpc_runtime).
+# Off by default, which computes the same protocol in-process; set "true" only in the
+# environment of approval workers and management commands, never for web servers
+SMPC_PARTY_PROCESSES = os.getenv("SMPC_PARTY_PROCESSES", "false") == "true"
+
+# Process pool for bursts of ECDSA/Ed25519 signing and verification (secure_computation.crypto_pool):
+# worker processes (default one per CPU, 0 signs inline) and the smallest burst sent to the pool
+CRYPTO_POOL_WORKERS = int(os.environ["CRYPTO_POOL_WORKERS"]) if os.getenv("CRYPTO_POOL_WORKERS") else None
+CRYPTO_POOL_MIN_BATCH = int(os.getenv("CRYPTO_POOL_MIN_BATCH", "32"))
+
+# Policy limits (inclusive) that a contract's retention_days is proved to lie within by the
+# ZKP range proof of its validations (secure_computation.zkp)
+ZKP_RETENTION_DAYS_RANGE = (0, int(os.getenv("ZKP_MAX_RETENTION_DAYS", "36500")))
@@ -0,0 +1,25 @@
+"""
+Test runner for the project.
+
+Runs the suite with settings.TEE_KEY_FILE pointing into a temporary directory,
+so tests that load, create or rotate the TEE enclave key never touch the key
+file (and its lock) of the machine running them.
+"""
+import os
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._key_dir = tempfile.TemporaryDirectory(prefix='tee-test-')
+        self._key_file = override_settings(TEE_KEY_FILE=os.path.join(self._key_dir.name, 'tee_enclave_key.json'))
+        self._key_file.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._key_file.disable()
+        self._key_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
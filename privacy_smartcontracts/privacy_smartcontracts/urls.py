@@ -30,6 +30,7 @@ urlpatterns = [
     path("access/", include(("access_proxy.urls", "access_proxy"), namespace="access_proxy")),
     path("audit/", include(("audit.urls", "audit"), namespace="audit")),
     path("secure/", include(("secure_computation.urls", "secure_computation"), namespace="secure_computation")),
+    path("api/", include(("api.urls", "api"), namespace="api")),
     path("", TemplateView.as_view(template_name="home.html"), name="home"),
 ]
 
@@ -1,3 +1,19 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 
-# Register your models here.
+from .jobs import process_approvals
+from .models import DataAccessRequest
+
+
+@admin.register(DataAccessRequest)
+class DataAccessRequestAdmin(admin.ModelAdmin):
+    list_display = ('id', 'contract', 'requester', 'status', 'created_at', 'processed_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('id', 'contract__title', 'requester__email')
+    list_select_related = ('contract', 'requester')
+    actions = ['approve_selected']
+
+    @admin.action(description='Validate and approve selected requests')
+    def approve_selected(self, request, queryset):
+        dars = list(queryset.select_related('contract', 'requester'))
+        approved = process_approvals(dars, request.user)
+        self.message_user(request, f"{len(approved)} of {len(dars)} request(s) approved and attested.", messages.SUCCESS)
@@ -0,0 +1,198 @@
+"""
+Per-user notification events for the server-sent events feed.
+
+Code that changes a request calls publish(user_ids, event_type, data), next to
+its log_event call. Events are handed to the configured backend once the
+surrounding transaction commits, and the backend feeds the in-process Broker,
+which fans them out to the asyncio queues of that user's open SSE connections
+(see requests_app.sse).
+
+Backends (settings.NOTIFICATIONS_BACKEND):
+
+    requests_app.events.DatabaseBackend   (default) writes NotificationEvent rows;
+                                          one poller per serving process fans new
+                                          rows out, so events published by workers
+                                          and other processes reach every connection
+    requests_app.events.LocalBackend      delivers within the publishing process
+                                          only (single-process deployments, tests);
+                                          the approval worker refuses to run with it
+
+A backend implements publish(batch), where batch is a list of
+(user_ids, event) pairs, and optionally an async listen(broker) that runs for
+the life of the serving event loop.
+"""
+from datetime import timedelta
+import asyncio
+import itertools
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+EVENT_TYPES = ('request_created', 'request_approved', 'request_denied', 'request_attested')
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client that stopped reading loses events rather than memory
+            self.dropped += 1
+
+
+class Broker:
+    """In-process fan-out from published events to subscribed connections."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._listening = set()
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(user_id, loop)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            start_listener = loop not in self._listening
+            self._listening.add(loop)
+        if start_listener:
+            listen = getattr(get_backend(), 'listen', None)
+            if listen:
+                loop.create_task(listen(self))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def deliver(self, user_ids, event):
+        """Queue `event` for every connection of `user_ids`; safe to call from any thread."""
+        with self._lock:
+            targets = [s for uid in set(user_ids) for s in self._subscribers.get(uid, ())]
+        for subscription in targets:
+            subscription.loop.call_soon_threadsafe(subscription._put, event)
+
+
+broker = Broker()
+_event_ids = itertools.count(1)
+
+
+def _in_worker_thread(func):
+    """
+    Run `func` in an executor thread and close that thread's database
+    connection afterwards, so the long-lived poller never leaves connections
+    open in the pool's threads (including when it is cancelled on shutdown).
+    """
+    def run(*args):
+        try:
+            return func(*args)
+        finally:
+            connection.close()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+class LocalBackend:
+    cross_process = False
+
+    def publish(self, batch):
+        for user_ids, event in batch:
+            event.setdefault('id', next(_event_ids))
+            broker.deliver(user_ids, event)
+
+
+class DatabaseBackend:
+    cross_process = True
+    poll_interval = 1.0
+    retention = timedelta(minutes=10)
+
+    def publish(self, batch):
+        from .models import NotificationEvent
+        NotificationEvent.objects.bulk_create([
+            NotificationEvent(user_id=uid, event_type=event['type'], data=event['data'])
+            for user_ids, event in batch for uid in set(user_ids)
+        ], batch_size=500)
+
+    def _fetch(self, after_id):
+        from .models import NotificationEvent
+        rows = NotificationEvent.objects.filter(pk__gt=after_id).order_by('pk').values_list(
+            'pk', 'user_id', 'event_type', 'data')[:1000]
+        return list(rows)
+
+    def _latest_id(self):
+        from .models import NotificationEvent
+        return NotificationEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+    def _prune(self):
+        from .models import NotificationEvent
+        NotificationEvent.objects.filter(created_at__lt=timezone.now() - self.retention).delete()
+
+    async def listen(self, broker):
+        fetch = _in_worker_thread(self._fetch)
+        latest_id = _in_worker_thread(self._latest_id)
+        last_id = await latest_id()
+        for polls in itertools.count(1):
+            await asyncio.sleep(self.poll_interval)
+            if polls % 600 == 0:
+                await _in_worker_thread(self._prune)()
+            if not broker.connection_count():
+                # Nobody to notify: skip the backlog instead of replaying it to the next subscriber
+                last_id = await latest_id()
+                continue
+            for pk, user_id, event_type, data in await fetch(last_id):
+                broker.deliver([user_id], {'id': pk, 'type': event_type, 'data': data})
+                last_id = pk
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    path = getattr(settings, 'NOTIFICATIONS_BACKEND', 'requests_app.events.DatabaseBackend')
+    if _backend is None or _backend[0] != path:
+        _backend = (path, import_string(path)())
+    return _backend[1]
+
+
+def publish_many(event_type, targets):
+    """
+    Send one `event_type` event per (user_ids, data) pair in `targets` to those
+    users' SSE connections once the current transaction commits.
+    """
+    if event_type not in EVENT_TYPES:
+        raise ValueError(f"Unknown event type: {event_type}")
+    batch = []
+    for user_ids, data in targets:
+        user_ids = [uid for uid in user_ids if uid is not None]
+        if user_ids:
+            batch.append((user_ids, {'type': event_type, 'data': data}))
+    if batch:
+        transaction.on_commit(lambda: get_backend().publish(batch))
+
+
+def publish(user_ids, event_type, data):
+    """Send `event_type` with `data` to the SSE connections of `user_ids` once the current transaction commits."""
+    publish_many(event_type, [(user_ids, data)])
+
+
+def request_event_data(dar):
+    return {'request_id': dar.id, 'contract_id': dar.contract_id, 'status': dar.status}
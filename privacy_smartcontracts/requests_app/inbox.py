@@ -0,0 +1,85 @@
+"""
+Paginated request inboxes for requesters and contract owners.
+
+Each page is a keyset slice ordered newest first on (created_at, id), so a
+page costs the same no matter how deep the user has scrolled. Status tabs
+filter on status, backed by the (requester|contract, status, created_at)
+indexes, and the tab counters come from a single aggregate query.
+"""
+import base64
+import json
+
+from django.db.models import Count, Exists, OuterRef, Q
+from django.utils.dateparse import parse_datetime
+
+from contracts.models import ContractDocument
+from oracle.models import Attestation
+from .models import DataAccessRequest
+
+PAGE_SIZE = 20
+STATUSES = [value for value, _ in DataAccessRequest.STATUS_CHOICES]
+
+
+def encode_cursor(dar):
+    raw = json.dumps([dar.created_at.isoformat(), dar.pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        created_at = parse_datetime(created_at)
+        return (created_at, int(pk)) if created_at else None
+    except (ValueError, TypeError):
+        return None
+
+
+def status_filter(request):
+    status = (request.GET.get('status') or '').upper()
+    return status if status in STATUSES else None
+
+
+def status_counts(queryset):
+    """Total and per-status request counts, as {'total': n, 'pending': n, ...}, in one query."""
+    aggregates = {'total': Count('id')}
+    aggregates.update({status.lower(): Count('id', filter=Q(status=status)) for status in STATUSES})
+    return queryset.aggregate(**aggregates)
+
+
+def with_row_flags(queryset):
+    """Annotate what the request cards check per row, instead of one query per card."""
+    return queryset.annotate(
+        has_attestation=Exists(Attestation.objects.live().filter(data_request=OuterRef('pk'))),
+        has_documents=Exists(ContractDocument.objects.filter(contract=OuterRef('contract_id'))),
+    )
+
+
+def inbox_page(request, queryset, row_flags=False, page_size=PAGE_SIZE):
+    """
+    Return the inbox context for `queryset`: one page of requests (honouring
+    ?status= and ?cursor=), the cursor of the next page, per-status counts and
+    the active status tab. With row_flags, rows carry has_attestation and
+    has_documents.
+    """
+    counts = status_counts(queryset)
+    if row_flags:
+        queryset = with_row_flags(queryset)
+    status = status_filter(request)
+    if status:
+        queryset = queryset.filter(status=status)
+    position = decode_cursor(request.GET.get('cursor'))
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+    rows = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return {
+        'requests': rows[:page_size],
+        'counts': counts,
+        'status_filter': status.lower() if status else 'all',
+        'next_cursor': next_cursor,
+        'is_first_page': position is None,
+    }
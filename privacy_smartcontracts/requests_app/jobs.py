@@ -0,0 +1,240 @@
+"""
+Database-backed queue for data access request approvals.
+
+Approving a request (secure computation validation, ECDSA/Ed25519 signing,
+attestation and audit writes) is too slow to do inside the owner's HTTP
+request, so process_request only enqueues an ApprovalJob. Worker processes
+started with `manage.py run_approval_worker` claim jobs with a conditional
+UPDATE (so two workers never run the same job), execute them and record the
+outcome. Job states:
+
+    QUEUED -> RUNNING -> SUCCEEDED
+                      -> QUEUED (transient error, retried after exponential backoff)
+                      -> FAILED (validation rejected, or max_attempts reached)
+
+The approval work itself is idempotent: re-running a job whose request is
+already approved and attested does nothing. A deny or revoke that lands while
+a job runs wins: the job only moves a PENDING request to APPROVED, and the deny
+commits its status change before revoking any attestation in the same
+transaction.
+"""
+from datetime import timedelta
+import os
+import random
+import socket
+import time
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from audit.utils import log_event, log_events
+from oracle.services import attestation_service
+from secure_computation.batch import validate_batch
+from secure_computation.models import SecureComputationValidation
+from .events import publish, publish_many, request_event_data
+from .models import ApprovalJob, DataAccessRequest
+
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 600
+# RUNNING jobs whose worker has been silent this long are assumed dead and re-claimed
+LOCK_TIMEOUT = timedelta(minutes=5)
+CLAIM_CANDIDATES = 10
+
+
+class ApprovalRejected(Exception):
+    """The approval cannot succeed; the job fails without further retries."""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def backoff_delay(attempts):
+    """Exponential backoff with jitter for the retry after `attempts` failed attempts."""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay + random.uniform(0, delay / 2)
+
+
+def enqueue_approval(dar, user):
+    """
+    Queue the approval of `dar` on behalf of `user` and return its job.
+
+    A denied (or revoked) request is reopened as PENDING, since the owner is
+    approving it again. Enqueuing an approval that is queued or running returns
+    the existing job, and so does one for a request that is already approved
+    with a live attestation. Any other finished job is reset so it runs again.
+    """
+    now = timezone.now()
+    if DataAccessRequest.objects.filter(pk=dar.pk, status='DENIED').update(status='PENDING', updated_at=now):
+        dar.status = 'PENDING'
+    job, created = ApprovalJob.objects.get_or_create(request=dar, defaults={'requested_by': user})
+    done = dar.status == 'APPROVED' and attestation_service.live_attestation(dar) is not None
+    reset = False
+    if not created and job.is_finished and not done:
+        reset = ApprovalJob.objects.filter(pk=job.pk, status__in=('SUCCEEDED', 'FAILED')).update(
+            status='QUEUED', attempts=0, run_after=now, last_error='', finished_at=None,
+            locked_by='', locked_at=None, requested_by=user, updated_at=now,
+        )
+        job.refresh_from_db()
+    if created or reset:
+        log_event('approval_queued', user, {'request_id': dar.id, 'job_id': job.id})
+    if getattr(settings, 'APPROVAL_JOBS_EAGER', False) and not job.is_finished:
+        claimed = claim_job(job.pk, default_worker_id())
+        if claimed:
+            execute(claimed)
+        job.refresh_from_db()
+    return job
+
+
+def _claimable(now):
+    return (
+        models.Q(status='QUEUED', run_after__lte=now) |
+        models.Q(status='RUNNING', locked_at__lt=now - LOCK_TIMEOUT)
+    )
+
+
+def claim_job(job_id, worker_id):
+    """Atomically move one claimable job to RUNNING for `worker_id`; returns it, or None if another worker won."""
+    now = timezone.now()
+    claimed = ApprovalJob.objects.filter(_claimable(now), pk=job_id).update(
+        status='RUNNING', locked_by=worker_id, locked_at=now,
+        attempts=models.F('attempts') + 1, updated_at=now,
+    )
+    if not claimed:
+        return None
+    return ApprovalJob.objects.select_related('request', 'requested_by').get(pk=job_id)
+
+
+def claim_next(worker_id):
+    now = timezone.now()
+    candidates = ApprovalJob.objects.filter(_claimable(now)).order_by('run_after', 'id').values_list('pk', flat=True)
+    for job_id in candidates[:CLAIM_CANDIDATES]:
+        job = claim_job(job_id, worker_id)
+        if job:
+            return job
+    return None
+
+
+def process_approval(dar, user):
+    """
+    Approve `dar`: secure computation validation, then the status change and oracle
+    attestation in one transaction. Safe to repeat. The status changes only from
+    PENDING, so a request denied while the validation ran stays denied.
+    """
+    if dar.status == 'DENIED':
+        raise ApprovalRejected("Request was denied before the approval ran.")
+    if dar.status == 'APPROVED' and attestation_service.live_attestation(dar):
+        return
+
+    secure_validation, _ = SecureComputationValidation.objects.get_or_create(request=dar)
+    if not secure_validation.overall_verified and not secure_validation.perform_validation():
+        raise ApprovalRejected("Secure computation validation failed. Request cannot be approved.")
+
+    with transaction.atomic():
+        now = timezone.now()
+        approved = DataAccessRequest.objects.filter(pk=dar.pk, status='PENDING').update(
+            status='APPROVED', processed_at=now, updated_at=now,
+        )
+        if approved:
+            dar.status, dar.processed_at = 'APPROVED', now
+        else:
+            # Lock the row until the attestation is committed, so a concurrent deny waits and then revokes it
+            dar.status = DataAccessRequest.objects.select_for_update().filter(pk=dar.pk).values_list('status', flat=True).first()
+            if dar.status != 'APPROVED':
+                raise ApprovalRejected("Request was denied while the approval ran.")
+        att, created = attestation_service.sign_one(dar, signer=user)
+        if created:
+            log_event('attestation_issued', user, {'attestation_id': att.id, 'request_id': dar.id})
+        if approved:
+            log_event('request_processed', user, {'request_id': dar.id, 'action': 'approve'})
+            publish([dar.requester_id, dar.contract.owner_id], 'request_approved', request_event_data(dar))
+
+
+def process_approvals(dars, user):
+    """
+    Approve many requests at once: one batched secure computation validation,
+    one status UPDATE, one Merkle-batched oracle attestation and one audit
+    insert. Denied requests and requests failing validation are skipped.
+    `dars` should have contract and requester selected. Returns the requests
+    that are approved afterwards.
+    """
+    dars = [dar for dar in dars if dar.status != 'DENIED']
+    verified = [v.request for v in validate_batch(dars) if v.overall_verified]
+    if not verified:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        pending_ids = [dar.pk for dar in verified if dar.status == 'PENDING']
+        DataAccessRequest.objects.filter(pk__in=pending_ids, status='PENDING').update(
+            status='APPROVED', processed_at=now, updated_at=now,
+        )
+        # Requests denied concurrently stay denied and are not attested
+        approved_ids = set(
+            DataAccessRequest.objects.select_for_update().filter(pk__in=[dar.pk for dar in verified], status='APPROVED')
+            .values_list('pk', flat=True)
+        )
+        approved = [dar for dar in verified if dar.pk in approved_ids]
+        newly_approved = [dar for dar in approved if dar.status == 'PENDING']
+        for dar in newly_approved:
+            dar.status, dar.processed_at = 'APPROVED', now
+        batch = attestation_service.sign_batch(approved, signer=user)
+        events = [('request_processed', user, {'request_id': dar.id, 'action': 'approve'}) for dar in newly_approved]
+        if batch:
+            events.append(('attestation_batch_issued', user, {'batch_id': batch.id, 'root_hash': batch.root_hash, 'size': batch.size}))
+        log_events(events)
+        publish_many('request_approved', [
+            ([dar.requester_id, dar.contract.owner_id], request_event_data(dar)) for dar in newly_approved
+        ])
+    return approved
+
+
+def _finish(job, **changes):
+    """Record the outcome of an attempt, unless the job has since been re-claimed by another worker."""
+    now = timezone.now()
+    return ApprovalJob.objects.filter(pk=job.pk, status='RUNNING', locked_by=job.locked_by).update(
+        locked_by='', locked_at=None, updated_at=now, **changes,
+    )
+
+
+def execute(job):
+    """Run one claimed job and record its outcome. Returns the job's new status."""
+    try:
+        process_approval(job.request, job.requested_by)
+    except ApprovalRejected as e:
+        status = 'FAILED'
+        _finish(job, status=status, last_error=str(e), finished_at=timezone.now())
+        log_event('approval_failed', job.requested_by, {'request_id': job.request_id, 'job_id': job.id, 'error': str(e)})
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if job.attempts >= job.max_attempts:
+            status = 'FAILED'
+            _finish(job, status=status, last_error=error, finished_at=timezone.now())
+            log_event('approval_failed', job.requested_by, {'request_id': job.request_id, 'job_id': job.id, 'error': error})
+        else:
+            status = 'QUEUED'
+            run_after = timezone.now() + timedelta(seconds=backoff_delay(job.attempts))
+            _finish(job, status=status, last_error=error, run_after=run_after)
+    else:
+        status = 'SUCCEEDED'
+        _finish(job, status=status, last_error='', finished_at=timezone.now())
+    return status
+
+
+def work(worker_id=None, once=False, poll_interval=1.0, max_jobs=None):
+    """
+    Claim and execute jobs until interrupted. With once=True, return as soon as no
+    job is claimable. Returns the number of jobs executed.
+    """
+    worker_id = worker_id or default_worker_id()
+    executed = 0
+    while max_jobs is None or executed < max_jobs:
+        job = claim_next(worker_id)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        execute(job)
+        executed += 1
+    return executed
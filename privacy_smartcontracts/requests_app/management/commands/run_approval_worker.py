@@ -0,0 +1,79 @@
+"""
+Django management command to process queued request approvals
+Usage: python manage.py run_approval_worker [--processes N] [--once] [--poll-interval SECONDS]
+"""
+import os
+import multiprocessing
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+def _worker_main(settings_module, once, poll_interval):
+    # Spawned: a fresh interpreter that sets Django up and opens its own database connection
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+    from requests_app.jobs import work, default_worker_id
+    executed = work(default_worker_id(), once=once, poll_interval=poll_interval)
+    connections.close_all()
+    return executed
+
+class Command(BaseCommand):
+    help = 'Run approval queue workers that validate, approve and attest queued data access requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            help='Number of worker processes (default: 1, run in this process)',
+            default=1
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when no job is ready instead of polling'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            help='Seconds to wait between polls when the queue is empty',
+            default=1.0
+        )
+
+    def handle(self, *args, **options):
+        # Imported here rather than at module level, so spawned workers can import _worker_main before django.setup()
+        from requests_app.events import get_backend
+        from requests_app.jobs import work
+
+        backend = get_backend()
+        if not getattr(backend, 'cross_process', False):
+            # Events published here would only reach SSE connections of this process, i.e. none
+            raise CommandError(
+                f'NOTIFICATIONS_BACKEND {type(backend).__name__} only delivers within one process; '
+                'use requests_app.events.DatabaseBackend with approval workers'
+            )
+        processes = max(1, options['processes'])
+        once = options['once']
+        poll_interval = options['poll_interval']
+
+        if processes == 1:
+            executed = work(once=once, poll_interval=poll_interval)
+            self.stdout.write(self.style.SUCCESS(f'Processed {executed} approval job(s)'))
+            return
+
+        # Spawned like the crypto and SMPC pools: no fork, so nothing (connections, threads) is inherited
+        ctx = multiprocessing.get_context('spawn')
+        settings_module = os.environ['DJANGO_SETTINGS_MODULE']
+        workers = [
+            ctx.Process(target=_worker_main, args=(settings_module, once, poll_interval), daemon=False)
+            for _ in range(processes)
+        ]
+        for p in workers:
+            p.start()
+        self.stdout.write(self.style.SUCCESS(f'Started {processes} approval worker process(es)'))
+        try:
+            for p in workers:
+                p.join()
+        except KeyboardInterrupt:
+            for p in workers:
+                p.terminate()
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("requests_app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataaccessrequest",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
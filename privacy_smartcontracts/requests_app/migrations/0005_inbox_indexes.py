@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contracts", "0006_contract_expires_at"),
+        ("requests_app", "0004_notificationevent"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="dataaccessrequest",
+            index=models.Index(
+                fields=["requester", "status", "created_at"],
+                name="dar_requester_status_created",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dataaccessrequest",
+            index=models.Index(
+                fields=["contract", "status", "created_at"],
+                name="dar_contract_status_created",
+            ),
+        ),
+    ]
@@ -3,19 +3,10 @@ from django.conf import settings
 from contracts.models import Contract
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from oracle.models import Attestation
-import json, base64
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from django.utils import timezone
+from oracle.services import attestation_service
 from audit.utils import log_event
 
-def load_private_key():
-    from django.conf import settings
-    b64 = getattr(settings, 'ORACLE_PRIVATE_KEY', None)
-    if not b64:
-        return None
-    raw = base64.b64decode(b64)
-    return Ed25519PrivateKey.from_private_bytes(raw)
-
 class DataAccessRequest(models.Model):
     STATUS_CHOICES = (('PENDING','Pending'),('APPROVED','Approved'),('DENIED','Denied'))
     id = models.AutoField(primary_key=True)
@@ -25,20 +16,66 @@ class DataAccessRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
     created_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Requester and owner inboxes: status tabs, newest first
+            models.Index(fields=['requester', 'status', 'created_at'], name='dar_requester_status_created'),
+            models.Index(fields=['contract', 'status', 'created_at'], name='dar_contract_status_created'),
+        ]
 
     def __str__(self):
         return f"Request {self.id} for {self.contract} by {self.requester}"
 
+class ApprovalJob(models.Model):
+    """
+    Queued approval of a DataAccessRequest, processed by `manage.py run_approval_worker`.
+    There is at most one job per request, so re-submitting an approval is idempotent.
+    """
+    STATUS_CHOICES = (
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    )
+    id = models.AutoField(primary_key=True)
+    request = models.OneToOneField(DataAccessRequest, on_delete=models.CASCADE, related_name='approval_job')
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='approval_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)  # earliest time the next attempt may start
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'], name='approvaljob_status_run_after')]
+
+    def __str__(self):
+        return f"Approval job {self.id} for request {self.request_id} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ('SUCCEEDED', 'FAILED')
+
+
+class NotificationEvent(models.Model):
+    """A published notification, kept briefly for requests_app.events.DatabaseBackend to fan out across processes."""
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notification_events')
+    event_type = models.CharField(max_length=40)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
 @receiver(post_save, sender=DataAccessRequest)
 def auto_attest_on_approval(sender, instance, **kwargs):
-    if instance.status == 'APPROVED' and not instance.attestations.exists():
-        # Auto-attest for approved requests (webhook simulation)
-        payload = {"request_id": instance.id, "contract_id": instance.contract.id, "requester": instance.requester.email, "approved_by_oracle": True}
-        payload_bytes = json.dumps(payload, sort_keys=True).encode()
-        priv = load_private_key()
-        if priv:
-            signature = priv.sign(payload_bytes)
-            sig_b64 = base64.b64encode(signature).decode()
-            # Create attestation as system (no signer user)
-            Attestation.objects.create(data_request=instance, signer=None, payload=payload, signature_b64=sig_b64)
-            log_event('auto_attestation_issued', None, {'request_id': instance.id})
+    if instance.status == 'APPROVED':
+        # Auto-attest for approved requests (webhook simulation), as system (no signer user)
+        att, created = attestation_service.sign_one(instance, signer=None)
+        if created:
+            log_event('auto_attestation_issued', None, {'request_id': instance.id, 'attestation_id': att.id})
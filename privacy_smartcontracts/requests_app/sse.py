@@ -0,0 +1,111 @@
+"""
+Server-sent events endpoint for request notifications.
+
+privacy_smartcontracts.asgi routes EVENTS_PATH here, ahead of Django's
+handler. The user is resolved from the session cookie once per connection;
+after that an idle connection is one coroutine waiting on its asyncio.Queue
+(plus one waiting for the disconnect), with a comment line every
+KEEPALIVE_SECONDS so proxies keep it open. No thread or database connection
+is held while idle.
+
+Under WSGI the same URL is answered by views.events_unavailable with
+204 No Content, which tells EventSource clients not to reconnect.
+"""
+import asyncio
+import json
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.urls import reverse
+
+from .events import broker
+
+EVENTS_PATH = reverse('requests_app:events')
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 5000
+
+
+class _SessionRequest:
+    """The minimum of an HttpRequest that django.contrib.auth.aget_user needs."""
+
+    def __init__(self, session):
+        self.session = session
+
+
+def _session_key(scope):
+    for name, value in scope.get('headers', ()):
+        if name == b'cookie':
+            for part in value.decode('latin-1').split(';'):
+                key, _, val = part.strip().partition('=')
+                if key == settings.SESSION_COOKIE_NAME:
+                    return val
+    return None
+
+
+async def authenticate(scope):
+    session_key = _session_key(scope)
+    if not session_key:
+        return None
+    engine = import_module(settings.SESSION_ENGINE)
+    user = await aget_user(_SessionRequest(engine.SessionStore(session_key)))
+    return user if user.is_authenticated else None
+
+
+def format_event(event):
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['type']}\n"
+        f"data: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+    ).encode()
+
+
+async def _plain(send, status, message):
+    await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body', 'body': message.encode()})
+
+
+async def events_app(scope, receive, send):
+    if scope['method'] != 'GET':
+        return await _plain(send, 405, 'Method not allowed')
+    user = await authenticate(scope)
+    if user is None:
+        return await _plain(send, 401, 'Authentication required')
+
+    subscription = broker.subscribe(user.pk)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': f"retry: {RETRY_MS}\n\n".encode(), 'more_body': True})
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait({next_event, disconnected}, timeout=KEEPALIVE_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if next_event in done:
+                body = format_event(next_event.result())
+            else:
+                next_event.cancel()
+                if disconnected in done:
+                    break
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    except OSError:
+        pass  # client went away mid-write
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
@@ -1,3 +1,359 @@
-from django.test import TestCase
+import asyncio
+import os
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from contracts.models import Contract
+from oracle.models import Attestation, AttestationBatch
+from oracle.services import attestation_service
+from secure_computation.models import SecureComputationValidation
+from . import events
+from .events import DatabaseBackend, broker
+from .inbox import PAGE_SIZE, status_counts
+from .jobs import enqueue_approval, claim_job, process_approvals, work
+from .models import DataAccessRequest, ApprovalJob, NotificationEvent
+from .sse import EVENTS_PATH, events_app
+
+User = get_user_model()
+
+
+class ApprovalQueueTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+        self.dar = DataAccessRequest.objects.create(contract=self.contract, requester=self.requester, reason='Test')
+
+    def test_worker_processes_are_spawned(self):
+        """Worker processes are spawned (not forked) and set Django up themselves"""
+        from requests_app.management.commands import run_approval_worker
+        with mock.patch.object(run_approval_worker.multiprocessing, 'get_context') as get_context:
+            call_command('run_approval_worker', processes=2, once=True, stdout=StringIO())
+        get_context.assert_called_once_with('spawn')
+        process = get_context.return_value.Process
+        self.assertEqual(process.call_count, 2)
+        self.assertIs(process.call_args.kwargs['target'], run_approval_worker._worker_main)
+        self.assertEqual(process.call_args.kwargs['args'], (os.environ['DJANGO_SETTINGS_MODULE'], True, 1.0))
+
+    def test_approve_view_only_enqueues(self):
+        """The owner's approve request returns without validating or approving"""
+        self.client.login(username='owner', password='pass')
+        self.client.get(reverse('requests_app:process_request', args=[self.dar.id, 'approve']))
+        self.dar.refresh_from_db()
+        self.assertEqual(self.dar.status, 'PENDING')
+        self.assertEqual(self.dar.approval_job.status, 'QUEUED')
+        self.assertFalse(SecureComputationValidation.objects.exists())
+
+    def test_enqueue_is_idempotent(self):
+        first = enqueue_approval(self.dar, self.owner)
+        second = enqueue_approval(self.dar, self.owner)
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(ApprovalJob.objects.count(), 1)
+
+    def test_worker_approves_and_attests(self):
+        job = enqueue_approval(self.dar, self.owner)
+        self.assertEqual(work(once=True), 1)
+        job.refresh_from_db()
+        self.dar.refresh_from_db()
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(self.dar.status, 'APPROVED')
+        self.assertTrue(self.dar.secure_validation.overall_verified)
+
+    def test_bulk_approval_attests_in_one_batch(self):
+        others = [DataAccessRequest.objects.create(contract=self.contract, requester=self.requester) for _ in range(3)]
+        denied = DataAccessRequest.objects.create(contract=self.contract, requester=self.requester, status='DENIED')
+        dars = DataAccessRequest.objects.filter(contract=self.contract).select_related('contract', 'requester')
+        approved = process_approvals(list(dars), self.owner)
+        self.assertEqual({d.pk for d in approved}, {self.dar.pk} | {d.pk for d in others})
+        self.assertEqual(DataAccessRequest.objects.filter(status='APPROVED').count(), 4)
+        self.assertEqual(AttestationBatch.objects.get().size, 4)
+        self.assertFalse(Attestation.objects.filter(data_request=denied).exists())
+        # Already approved and attested: nothing new
+        self.assertEqual(len(process_approvals(list(dars), self.owner)), 4)
+        self.assertEqual(AttestationBatch.objects.count(), 1)
+
+    def test_admin_bulk_approve_action(self):
+        admin = User.objects.create_superuser(username='admin', email='admin@test.com', password='pass')
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:requests_app_dataaccessrequest_changelist'), {
+            'action': 'approve_selected', '_selected_action': [self.dar.pk],
+        })
+        self.dar.refresh_from_db()
+        self.assertEqual(self.dar.status, 'APPROVED')
+        self.assertTrue(Attestation.objects.live().filter(data_request=self.dar).exists())
+
+    def test_job_claimed_by_one_worker_only(self):
+        job = enqueue_approval(self.dar, self.owner)
+        self.assertIsNotNone(claim_job(job.pk, 'worker-a'))
+        self.assertIsNone(claim_job(job.pk, 'worker-b'))
+
+    def test_transient_error_retries_with_backoff(self):
+        """A crash requeues the job for later; it succeeds on a later attempt"""
+        job = enqueue_approval(self.dar, self.owner)
+        with mock.patch.object(SecureComputationValidation, 'perform_validation', side_effect=RuntimeError('HSM busy')):
+            work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'QUEUED')
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('HSM busy', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertEqual(work(once=True), 0)  # not due yet
+
+        ApprovalJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'SUCCEEDED')
+        self.assertEqual(job.attempts, 2)
+
+    def test_rejected_validation_fails_without_retry(self):
+        job = enqueue_approval(self.dar, self.owner)
+        with mock.patch.object(SecureComputationValidation, 'perform_validation', return_value=False):
+            work(once=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.attempts, 1)
+
+    def test_reapproval_after_revoke_runs_again(self):
+        """Approve, revoke, approve: the finished job is reset and the request ends approved and attested"""
+        self.client.login(username='owner', password='pass')
+        url = lambda action: reverse('requests_app:process_request', args=[self.dar.id, action])
+        self.client.get(url('approve'))
+        work(once=True)
+        self.client.get(url('revoke'))
+        self.dar.refresh_from_db()
+        self.assertEqual(self.dar.status, 'DENIED')
+
+        response = self.client.get(url('approve'), follow=True)
+        self.assertNotIn('approved with secure computation', response.content.decode())
+        self.dar.refresh_from_db()
+        self.assertEqual(self.dar.status, 'PENDING')
+        self.assertEqual(self.dar.approval_job.status, 'QUEUED')
+        work(once=True)
+        self.dar.refresh_from_db()
+        self.assertEqual(self.dar.status, 'APPROVED')
+        self.assertTrue(Attestation.objects.live().filter(data_request=self.dar).exists())
+
+    def test_approved_and_attested_request_keeps_its_job(self):
+        job = enqueue_approval(self.dar, self.owner)
+        work(once=True)
+        self.dar.refresh_from_db()
+        again = enqueue_approval(self.dar, self.owner)
+        self.assertEqual((again.pk, again.status), (job.pk, 'SUCCEEDED'))
+
+    def test_deny_during_validation_wins(self):
+        """A deny landing while the worker validates is not overwritten by the approval"""
+        job = enqueue_approval(self.dar, self.owner)
+        original = SecureComputationValidation.perform_validation
+
+        def validate_then_deny(validation):
+            DataAccessRequest.objects.filter(pk=self.dar.pk).update(status='DENIED')
+            return original(validation)
+
+        with mock.patch.object(SecureComputationValidation, 'perform_validation', validate_then_deny):
+            work(once=True)
+        job.refresh_from_db()
+        self.dar.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(self.dar.status, 'DENIED')
+        self.assertFalse(Attestation.objects.live().filter(data_request=self.dar).exists())
+
+    def test_deny_is_saved_before_revoking(self):
+        """The deny commits DENIED before revoking, in one transaction, so a running job aborts"""
+        enqueue_approval(self.dar, self.owner)
+        work(once=True)
+        original = attestation_service.revoke
+        seen = []
+
+        def record_status_then_revoke(dar):
+            seen.append(DataAccessRequest.objects.get(pk=dar.pk).status)
+            return original(dar)
+
+        self.client.login(username='owner', password='pass')
+        with mock.patch.object(attestation_service, 'revoke', record_status_then_revoke):
+            self.client.get(reverse('requests_app:process_request', args=[self.dar.id, 'deny']))
+        self.assertEqual(seen, ['DENIED'])
+        self.assertFalse(Attestation.objects.live().filter(data_request=self.dar).exists())
+        # A job running after the deny aborts instead of re-attesting
+        ApprovalJob.objects.filter(request=self.dar).update(status='QUEUED', run_after=timezone.now())
+        work(once=True)
+        self.assertEqual(ApprovalJob.objects.get(request=self.dar).status, 'FAILED')
+        self.assertFalse(Attestation.objects.live().filter(data_request=self.dar).exists())
+
+    def test_status_endpoint(self):
+        enqueue_approval(self.dar, self.owner)
+        url = reverse('requests_app:approval_status', args=[self.dar.id])
+        self.client.login(username='owner', password='pass')
+        body = self.client.get(url).json()
+        self.assertEqual(body['job_status'], 'QUEUED')
+        self.assertFalse(body['finished'])
+
+        stranger = User.objects.create_user(username='stranger', password='pass')
+        self.client.force_login(stranger)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(APPROVAL_JOBS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        job = enqueue_approval(self.dar, self.owner)
+        self.assertEqual(job.status, 'SUCCEEDED')
+
+
+# The DatabaseBackend poller reads from another thread, which the open test transaction locks out
+@override_settings(NOTIFICATIONS_BACKEND='requests_app.events.LocalBackend')
+class NotificationFeedTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+        self.dar = DataAccessRequest.objects.create(contract=self.contract, requester=self.requester, reason='Test')
+
+    def approve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enqueue_approval(self.dar, self.owner)
+            work(once=True)
+
+    def test_approval_notifies_requester(self):
+        received = []
+
+        async def scenario():
+            subscription = broker.subscribe(self.requester.pk)
+            try:
+                await sync_to_async(self.approve)()
+                while len(received) < 2:
+                    received.append(await asyncio.wait_for(subscription.queue.get(), 1))
+            finally:
+                broker.unsubscribe(subscription)
+
+        async_to_sync(scenario)()
+        self.assertEqual({e['type'] for e in received}, {'request_attested', 'request_approved'})
+        self.assertEqual(received[0]['data']['request_id'], self.dar.id)
+
+    def test_event_stream(self):
+        self.client.login(username='requester', password='pass')
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        sent = []
+
+        async def scenario():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                body = message.get('body', b'')
+                if body.startswith(b'retry'):
+                    broker.deliver([self.requester.pk], {'id': 7, 'type': 'request_denied', 'data': {'request_id': 1}})
+                elif b'request_denied' in body:
+                    disconnect.set()
+
+            scope = {'type': 'http', 'method': 'GET', 'path': EVENTS_PATH, 'headers': [(b'cookie', cookie.encode())]}
+            await asyncio.wait_for(events_app(scope, receive, send), 5)
+
+        async_to_sync(scenario)()
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(sent[2]['body'], b'id: 7\nevent: request_denied\ndata: {"request_id":1}\n\n')
+        self.assertEqual(broker.connection_count(), 0)
+
+    def test_event_stream_requires_login(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async_to_sync(events_app)({'type': 'http', 'method': 'GET', 'path': EVENTS_PATH, 'headers': []}, None, send)
+        self.assertEqual(sent[0]['status'], 401)
+
+    def test_database_backend_round_trip(self):
+        backend = DatabaseBackend()
+        backend.publish([([self.owner.pk, self.requester.pk], {'type': 'request_created', 'data': {'request_id': 1}})])
+        rows = backend._fetch(0)
+        self.assertEqual({row[1] for row in rows}, {self.owner.pk, self.requester.pk})
+        self.assertEqual(backend._latest_id(), NotificationEvent.objects.latest('pk').pk)
+
+    def test_poller_closes_its_thread_connections(self):
+        with mock.patch.object(events, 'connection') as conn:
+            self.assertEqual(async_to_sync(events._in_worker_thread(lambda: 7))(), 7)
+            with self.assertRaises(ZeroDivisionError):
+                async_to_sync(events._in_worker_thread(lambda: 1 / 0))()
+        self.assertEqual(conn.close.call_count, 2)
+
+    def test_worker_refuses_single_process_backend(self):
+        with self.assertRaisesMessage(CommandError, 'LocalBackend only delivers within one process'):
+            call_command('run_approval_worker', once=True)
+
+
+class InboxTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+
+    def _create(self, count, status='PENDING'):
+        return [
+            DataAccessRequest.objects.create(contract=self.contract, requester=self.requester, status=status)
+            for _ in range(count)
+        ]
+
+    def _query_count(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Both inboxes render in a fixed number of queries"""
+        self._create(2)
+        self.client.login(username='requester', password='pass')
+        mine_small = self._query_count(reverse('requests_app:my_requests'))
+        self.client.login(username='owner', password='pass')
+        owner_small = self._query_count(reverse('requests_app:owner_requests'))
+        self._create(10, status='APPROVED')
+        self.client.login(username='requester', password='pass')
+        self.assertEqual(self._query_count(reverse('requests_app:my_requests')), mine_small)
+        self.client.login(username='owner', password='pass')
+        self.assertEqual(self._query_count(reverse('requests_app:owner_requests')), owner_small)
+
+    def test_cursor_pages_cover_every_request_once(self):
+        created = self._create(PAGE_SIZE + 5)
+        self.client.login(username='requester', password='pass')
+        first = self.client.get(reverse('requests_app:my_requests'))
+        self.assertEqual(len(first.context['requests']), PAGE_SIZE)
+        self.assertTrue(first.context['next_cursor'])
+        second = self.client.get(reverse('requests_app:my_requests'), {'cursor': first.context['next_cursor']})
+        self.assertEqual(len(second.context['requests']), 5)
+        self.assertIsNone(second.context['next_cursor'])
+        seen = [r.pk for r in first.context['requests']] + [r.pk for r in second.context['requests']]
+        self.assertEqual(seen, sorted((d.pk for d in created), reverse=True))
+
+    def test_status_tab_and_counts(self):
+        self._create(3)
+        self._create(2, status='APPROVED')
+        self._create(1, status='DENIED')
+        self.client.login(username='owner', password='pass')
+        response = self.client.get(reverse('requests_app:owner_requests'), {'status': 'approved'})
+        self.assertEqual(response.context['status_filter'], 'approved')
+        self.assertEqual({r.status for r in response.context['requests']}, {'APPROVED'})
+        self.assertEqual(response.context['counts'], {'total': 6, 'pending': 3, 'approved': 2, 'denied': 1})
+
+    def test_counts_use_one_query(self):
+        self._create(2)
+        with self.assertNumQueries(1):
+            status_counts(DataAccessRequest.objects.filter(contract__owner=self.owner))
+
+    def test_bad_cursor_and_status_fall_back_to_first_page(self):
+        self._create(2)
+        self.client.login(username='requester', password='pass')
+        response = self.client.get(reverse('requests_app:my_requests'), {'cursor': '!!', 'status': 'bogus'})
+        self.assertEqual(len(response.context['requests']), 2)
+        self.assertEqual(response.context['status_filter'], 'all')
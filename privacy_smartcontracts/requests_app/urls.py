@@ -6,5 +6,7 @@ urlpatterns = [
     path('create/<int:contract_id>/', views.create_request, name='create_request'),
     path('mine/', views.my_requests, name='my_requests'),
     path('owner/', views.contract_requests_for_owner, name='owner_requests'),
+    path('events/', views.events_unavailable, name='events'),
+    path('process/<int:request_id>/status/', views.approval_status, name='approval_status'),
     path('process/<int:request_id>/<str:action>/', views.process_request, name='process_request'),
 ]
@@ -1,18 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from .models import DataAccessRequest
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+from .models import DataAccessRequest, ApprovalJob
+from .events import publish, request_event_data
+from .inbox import inbox_page
+from .jobs import enqueue_approval
+from oracle.services import attestation_service
 from .forms import DataAccessRequestForm
 from contracts.models import Contract
 from django.contrib import messages
 from audit.utils import log_event
+from access_proxy.throttling import throttle
 from django.utils import timezone
-from oracle.models import Attestation
-from oracle.views import load_private_key
-from secure_computation.models import SecureComputationValidation
-import json, base64
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 
 @login_required
+@throttle('create_request', methods=('POST',))
 def create_request(request, contract_id):
     contract = get_object_or_404(Contract, pk=contract_id)
     # Check if contract has any documents (stored_object is on ContractDocument, not Contract)
@@ -27,6 +31,7 @@ def create_request(request, contract_id):
             dar.requester = request.user
             dar.save()
             log_event('request_created', request.user, {'request_id': dar.id, 'contract_id': contract.id})
+            publish([contract.owner_id], 'request_created', request_event_data(dar))
             messages.success(request, "Request created.")
             return redirect('requests_app:my_requests')
     else:
@@ -35,14 +40,14 @@ def create_request(request, contract_id):
 
 @login_required
 def my_requests(request):
-    qs = DataAccessRequest.objects.filter(requester=request.user).order_by('-created_at')
-    return render(request, 'requests_app/my_requests.html', {'requests': qs})
+    qs = DataAccessRequest.objects.filter(requester=request.user).select_related('contract')
+    return render(request, 'requests_app/my_requests.html', inbox_page(request, qs, row_flags=True))
 
 @login_required
 def contract_requests_for_owner(request):
     # owner sees requests for their contracts
-    qs = DataAccessRequest.objects.filter(contract__owner=request.user).order_by('-created_at')
-    return render(request, 'requests_app/owner_requests.html', {'requests': qs})
+    qs = DataAccessRequest.objects.filter(contract__owner=request.user).select_related('contract', 'requester', 'approval_job')
+    return render(request, 'requests_app/owner_requests.html', inbox_page(request, qs))
 
 @login_required
 def process_request(request, request_id, action):
@@ -52,32 +57,61 @@ def process_request(request, request_id, action):
         messages.error(request, "Not allowed")
         return redirect('requests_app:owner_requests')
     if action == 'approve':
-        # Perform secure computation validation before approval
-        secure_validation, created = SecureComputationValidation.objects.get_or_create(request=dar)
-        if not secure_validation.overall_verified:
-            validation_success = secure_validation.perform_validation()
-            if not validation_success:
-                messages.error(request, "Secure computation validation failed. Request cannot be approved.")
-                return redirect('requests_app:owner_requests')
-
-        dar.status = 'APPROVED'
-        # Auto-attest for PoC
-        payload = {"request_id": dar.id, "contract_id": dar.contract.id, "requester": dar.requester.email, "approved_by_oracle": True}
-        payload_bytes = json.dumps(payload, sort_keys=True).encode()
-        priv = load_private_key()
-        if priv:
-            signature = priv.sign(payload_bytes)
-            sig_b64 = base64.b64encode(signature).decode()
-            att = Attestation.objects.create(data_request=dar, signer=request.user, payload=payload, signature_b64=sig_b64)
-            log_event('attestation_issued', request.user, {'attestation_id': att.id, 'request_id': dar.id})
-            messages.success(request, f"Request approved with secure computation validation and attested (id={att.id}).")
+        # Validation, signing and attestation run on the approval workers (see requests_app.jobs)
+        job = enqueue_approval(dar, request.user)
+        dar.refresh_from_db(fields=['status'])
+        if dar.status == 'APPROVED':
+            messages.success(request, "Request approved with secure computation validation and attested.")
+        elif job.status == 'FAILED':
+            messages.error(request, job.last_error or "Approval failed.")
         else:
-            messages.warning(request, "Request approved but oracle key not configured for auto-attestation.")
+            messages.info(request, "Approval queued. This page will update when secure computation validation completes.")
+        return redirect('requests_app:owner_requests')
     elif action in ['deny', 'revoke']:
-        dar.status = 'DENIED'
+        with transaction.atomic():
+            # Deny first, so an approval job still running sees DENIED and aborts; then revoke
+            # whatever attestation one that already finished has issued
+            now = timezone.now()
+            denied = DataAccessRequest.objects.filter(pk=dar.pk).exclude(status='DENIED').update(
+                status='DENIED', processed_at=now, updated_at=now,
+            )
+            attestation_service.revoke(dar)
+        dar.status, dar.processed_at = 'DENIED', now
+        log_event('request_processed', request.user, {'request_id': dar.id, 'action': action})
+        if denied:
+            publish([dar.requester_id], 'request_denied', request_event_data(dar))
+        messages.success(request, f"Request {action}d.")
+        return redirect('requests_app:owner_requests')
     dar.processed_at = timezone.now()
     dar.save()
     log_event('request_processed', request.user, {'request_id': dar.id, 'action': action})
-    if action != 'approve':
-        messages.success(request, f"Request {action}d.")
+    if dar.status == 'DENIED':
+        publish([dar.requester_id], 'request_denied', request_event_data(dar))
+    messages.success(request, f"Request {action}d.")
     return redirect('requests_app:owner_requests')
+
+def events_unavailable(request):
+    """
+    Fallback for the notification feed, which is served by requests_app.sse under
+    ASGI only; 204 tells EventSource clients to stop reconnecting.
+    """
+    return HttpResponse(status=204)
+
+@login_required
+def approval_status(request, request_id):
+    """Lightweight JSON status of a queued approval, polled by the owner requests page."""
+    jobs = ApprovalJob.objects.filter(request_id=request_id)
+    if not request.user.is_superuser:
+        jobs = jobs.filter(Q(request__contract__owner=request.user) | Q(request__requester=request.user))
+    job = jobs.values('status', 'attempts', 'last_error', 'request__status', 'updated_at').first()
+    if job is None:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return JsonResponse({
+        'request_id': request_id,
+        'job_status': job['status'],
+        'request_status': job['request__status'],
+        'attempts': job['attempts'],
+        'error': job['last_error'],
+        'finished': job['status'] in ('SUCCEEDED', 'FAILED'),
+        'updated_at': job['updated_at'],
+    })
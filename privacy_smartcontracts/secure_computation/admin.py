@@ -1,9 +1,15 @@
 from django.contrib import admin
-from .models import SecureComputationValidation
+from .models import SecureComputationValidation, TEEKey
 
 @admin.register(SecureComputationValidation)
 class SecureComputationValidationAdmin(admin.ModelAdmin):
     list_display = ('request', 'zkp_verified', 'tee_verified', 'smpc_verified', 'overall_verified', 'created_at', 'validated_at')
     list_filter = ('zkp_verified', 'tee_verified', 'smpc_verified', 'overall_verified', 'created_at', 'validated_at')
-    readonly_fields = ('zkp_proof', 'tee_attestation', 'smpc_result', 'created_at', 'validated_at')
+    readonly_fields = ('zkp_proof', 'tee_key', 'tee_attestation', 'smpc_result', 'created_at', 'validated_at')
     search_fields = ('request__id', 'request__contract__title', 'request__requester__email')
+
+
+@admin.register(TEEKey)
+class TEEKeyAdmin(admin.ModelAdmin):
+    list_display = ('key_id', 'registered_at')
+    readonly_fields = ('key_id', 'public_key', 'registered_at')
@@ -0,0 +1,61 @@
+"""
+Batched secure computation validation.
+
+validate_batch validates many DataAccessRequests together instead of one
+perform_validation call each: the TEE inputs are hashed in one pass, all
+computation results are covered by a single ECDSA signature over their
+Merkle root (each validation stores its inclusion proof next to the shared
+signed attestation data), the SMPC aggregations of all rows share one run of
+the party runtime, their ZKP range proofs are checked with one batch
+verification, the SecureComputationValidation rows are written
+with bulk_update, and the audit events with one bulk insert.
+
+Used by the DataAccessRequest admin bulk-approve action (through
+requests_app.jobs.process_approvals) and `manage.py validate_requests`.
+"""
+from audit.utils import log_events
+from . import smpc_runtime, zkp
+from .models import SecureComputationValidation, TEEKey, tee_gateway
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def validations_for(dars):
+    """The SecureComputationValidation of every request in `dars`, creating missing rows in bulk."""
+    dars = {dar.pk: dar for dar in dars}
+    existing = set(
+        SecureComputationValidation.objects.filter(request_id__in=dars).values_list('request_id', flat=True)
+    )
+    SecureComputationValidation.objects.bulk_create(
+        [SecureComputationValidation(request_id=pk) for pk in dars if pk not in existing],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    validations = list(SecureComputationValidation.objects.filter(request_id__in=dars).order_by('request_id'))
+    for validation in validations:
+        validation.request = dars[validation.request_id]
+    return validations
+
+
+def validate_batch(dars, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validate every request in `dars` (with contract selected) that has no
+    verified validation yet, `batch_size` requests per signature. Returns the
+    validations of all of `dars`, already verified ones included.
+    """
+    validations = validations_for(dars)
+    todo = [v for v in validations if not v.overall_verified]
+    for start in range(0, len(todo), batch_size):
+        chunk = todo[start:start + batch_size]
+        results = tee_gateway.perform_secure_computations([v.request_data() for v in chunk])
+        attestation, proofs = tee_gateway.generate_batch_attestation(results)
+        TEEKey.register(attestation['key_id'])
+        smpc_results = smpc_runtime.aggregate_many([v.contract_figures() for v in chunk])
+        zkp_proofs = zkp.verify_statements([v.prove_statements() for v in chunk])
+        for validation, result, proof, smpc_result, zkp_proof in zip(chunk, results, proofs, smpc_results, zkp_proofs):
+            validation.apply_results(result, attestation, proof, smpc_result, zkp_proof)
+        SecureComputationValidation.objects.bulk_update(
+            chunk, SecureComputationValidation.VALIDATION_FIELDS, batch_size=500
+        )
+        log_events([('secure_computation_validated', None, v.audit_details()) for v in chunk])
+    return validations
@@ -0,0 +1,234 @@
+"""
+Shared process pool for CPU-bound signing and verification.
+
+ECDSA and Ed25519 operations hold the GIL for their whole duration, so a
+burst of them on a web or approval worker stalls everything else the process
+does. sign_many and verify_many hand large bursts to a warm pool of worker
+processes instead:
+
+- Worker processes are started once (on first use) and receive the private
+  keys in their initializer, so a task only carries messages. Keys are named by
+  the fingerprint of their public key; signing with a key the pool does not
+  hold yet (e.g. after a TEE key rotation) restarts the pool with it, keeping
+  the MAX_KEYS most recently added keys.
+- A burst is split into chunks of at most CHUNK_SIZE messages, one task each,
+  and at most `max_pending` tasks are in flight across all threads of the
+  process: submitters block until a slot frees up (backpressure) rather than
+  queueing unbounded work.
+- Bursts smaller than settings.CRYPTO_POOL_MIN_BATCH, and everything when
+  settings.CRYPTO_POOL_WORKERS is 0, are handled inline, where the pool's IPC
+  would cost more than the operations. So is a burst whose pool died; the pool
+  is restarted on next use.
+
+EC keys sign with ECDSA over SHA3-256 (the TEE attestation scheme), Ed25519
+keys with Ed25519 (the oracle scheme).
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+import atexit
+import hashlib
+import multiprocessing
+import os
+import threading
+
+from django.conf import settings
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+CHUNK_SIZE = 256
+DEFAULT_MIN_BATCH = 32
+MAX_KEYS = 4
+
+_ECDSA = ec.ECDSA(hashes.SHA3_256())
+
+
+def public_der(public_key):
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+
+def fingerprint(private_key):
+    return hashlib.sha256(public_der(private_key.public_key())).hexdigest()
+
+
+def sign(private_key, message):
+    """Signature of `message` under `private_key` (ECDSA/SHA3-256 or Ed25519)."""
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        return private_key.sign(message)
+    return private_key.sign(message, _ECDSA)
+
+
+@lru_cache(maxsize=64)
+def _load_public(der):
+    return serialization.load_der_public_key(der)
+
+
+def verify(der, message, signature):
+    """True if `signature` over `message` is valid for the public key `der` (DER SubjectPublicKeyInfo)."""
+    try:
+        public_key = _load_public(der)
+        if isinstance(public_key, ed25519.Ed25519PublicKey):
+            public_key.verify(signature, message)
+        else:
+            public_key.verify(signature, message, _ECDSA)
+    except (InvalidSignature, ValueError, TypeError):
+        return False
+    return True
+
+
+# Worker side
+
+_worker_keys = {}
+
+
+def _init_worker(keys):
+    for name, der in keys.items():
+        _worker_keys[name] = serialization.load_der_private_key(der, password=None)
+
+
+def _sign_chunk(name, messages):
+    key = _worker_keys[name]
+    return [sign(key, message) for message in messages]
+
+
+def _verify_chunk(items):
+    return [verify(der, message, signature) for der, message, signature in items]
+
+
+class CryptoExecutor:
+    """A lazily started pool of `workers` processes holding the signing keys."""
+
+    def __init__(self, workers=None, max_pending=None, min_batch=DEFAULT_MIN_BATCH, chunk_size=CHUNK_SIZE):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or 2 * max(self.workers, 1)
+        self.min_batch = min_batch
+        self.chunk_size = chunk_size
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()  # fingerprint -> PKCS8 DER
+        self._pool = None
+        self._pid = None
+
+    def _get_pool(self, private_key=None):
+        with self._lock:
+            if self._pool is not None and self._pid != os.getpid():
+                self._pool = None  # inherited through fork; its workers belong to the parent
+            if private_key is not None:
+                name = fingerprint(private_key)
+                if name not in self._keys:
+                    self._keys[name] = private_key.private_bytes(
+                        encoding=serialization.Encoding.DER,
+                        format=serialization.PrivateFormat.PKCS8,
+                        encryption_algorithm=serialization.NoEncryption()
+                    )
+                    while len(self._keys) > MAX_KEYS:
+                        self._keys.popitem(last=False)
+                    self._close_pool()
+            if self._pool is None:
+                # Spawned, not forked: forking a multi-threaded web worker is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(dict(self._keys),),
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def _close_pool(self):
+        if self._pool is not None and self._pid == os.getpid():
+            # Tasks already submitted by other threads still complete
+            self._pool.shutdown(wait=False)
+        self._pool = None
+
+    def shutdown(self):
+        with self._lock:
+            self._close_pool()
+
+    def _inline(self, count):
+        return self.workers < 1 or count < self.min_batch
+
+    def _run(self, pool, fn, argument_lists):
+        """Submit fn(*args) for every args, at most max_pending at a time; results in order, flattened."""
+        futures = []
+        for args in argument_lists:
+            self._slots.acquire()
+            try:
+                future = pool.submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            futures.append(future)
+        return [result for future in futures for result in future.result()]
+
+    def _chunks(self, items):
+        size = max(1, min(self.chunk_size, -(-len(items) // max(self.workers, 1))))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def _submit(self, private_key, fn, argument_lists):
+        """_run on the pool; None if the pool died, so the caller computes inline."""
+        for _ in range(2):
+            try:
+                return self._run(self._get_pool(private_key), fn, argument_lists)
+            except BrokenProcessPool:
+                self.shutdown()
+                return None
+            except RuntimeError:
+                continue  # another thread restarted the pool (new key) before we submitted
+        return None
+
+    def sign_many(self, private_key, messages):
+        """Signatures of `messages` under `private_key`, in order."""
+        messages = [bytes(m) for m in messages]
+        if not self._inline(len(messages)):
+            name = fingerprint(private_key)
+            signatures = self._submit(private_key, _sign_chunk, [(name, chunk) for chunk in self._chunks(messages)])
+            if signatures is not None:
+                return signatures
+        return [sign(private_key, m) for m in messages]
+
+    def verify_many(self, items):
+        """For (public key DER, message, signature) items, whether each signature is valid, in order."""
+        items = [(bytes(der), bytes(message), bytes(signature)) for der, message, signature in items]
+        if not self._inline(len(items)):
+            results = self._submit(None, _verify_chunk, [(chunk,) for chunk in self._chunks(items)])
+            if results is not None:
+                return results
+        return [verify(*item) for item in items]
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """This process's executor, sized by settings.CRYPTO_POOL_WORKERS (default: one per CPU)."""
+    global _executor
+    workers = getattr(settings, 'CRYPTO_POOL_WORKERS', None)
+    min_batch = getattr(settings, 'CRYPTO_POOL_MIN_BATCH', DEFAULT_MIN_BATCH)
+    with _executor_lock:
+        if _executor is None or (workers is not None and _executor.workers != workers) or _executor.min_batch != min_batch:
+            if _executor is not None:
+                _executor.shutdown()
+            _executor = CryptoExecutor(workers, min_batch=min_batch)
+        return _executor
+
+
+@atexit.register
+def _shutdown():
+    if _executor is not None:
+        _executor.shutdown()
+
+
+def sign_many(private_key, messages):
+    return get_executor().sign_many(private_key, messages)
+
+
+def verify_many(items):
+    return get_executor().verify_many(items)
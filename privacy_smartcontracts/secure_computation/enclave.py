@@ -0,0 +1,223 @@
+"""
+Long-lived TEE enclave identity.
+
+The enclave's SECP256R1 attestation key is generated once, persisted to a
+key file (settings.TEE_KEY_FILE) and shared by every worker process, instead
+of being generated for each TEEGateway. Each process loads the key the first
+time it is needed and keeps it in memory; afterwards it only stats the file
+(at most every RECHECK_SECONDS, to notice a rotation by another process) and
+rotates once the key is older than settings.TEE_KEY_ROTATION_DAYS, so key
+generation and file I/O stay off the request path.
+
+Writers hold an exclusive lock on "<key file>.lock" while they read, rotate
+and atomically replace the file, so concurrent workers that find the key due
+at the same time agree on one successor. Retired keys keep their public half
+in the file, and attestations name their key by key_id, so attestations
+signed before a rotation still verify.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, fine for the single-process dev server
+    fcntl = None
+
+DEFAULT_ROTATION_DAYS = 30
+RECHECK_SECONDS = 60
+
+
+@lru_cache(maxsize=1)
+def enclave_measurement():
+    """Code/data measurement hash using SHA-3-256 (PCR measurement); constant per build."""
+    code_hash = hashlib.sha3_256(b"privacy_smart_contract_tee_code_v2.0").hexdigest()
+    data_hash = hashlib.sha3_256(b"secure_computation_data_integrity").hexdigest()
+    return hashlib.sha3_256((code_hash + data_hash).encode()).hexdigest()
+
+
+def key_file():
+    return Path(getattr(settings, 'TEE_KEY_FILE', None) or settings.BASE_DIR / 'tee_enclave_key.json')
+
+
+def rotation_period():
+    return timedelta(days=getattr(settings, 'TEE_KEY_ROTATION_DAYS', DEFAULT_ROTATION_DAYS))
+
+
+def public_pem(public_key):
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+
+
+def key_id_for(public_key):
+    """Short stable identifier of a public key: SHA-256 of its DER encoding."""
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+class EnclaveIdentity:
+    """The enclave's attestation key with its key_id, enclave_id and measurement."""
+
+    def __init__(self, entry, path, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.checked_at = time.monotonic()
+        self.key_id = entry['key_id']
+        self.enclave_id = entry['enclave_id']
+        self.created_at = datetime.fromisoformat(entry['created_at'])
+        self.public_key_pem = entry['public_pem']
+        self.attestation_key = serialization.load_pem_private_key(entry['private_pem'].encode(), password=None)
+        self.measurement = enclave_measurement()
+
+    def is_due(self, now=None):
+        return (now or timezone.now()) >= self.created_at + rotation_period()
+
+    def is_current(self, path, now):
+        """False if this identity is due for rotation or the key file was replaced since it was loaded."""
+        if path != self.path or self.is_due(now):
+            return False
+        if time.monotonic() - self.checked_at < RECHECK_SECONDS:
+            return True
+        try:
+            if os.stat(path).st_mtime_ns != self.mtime:
+                return False
+        except FileNotFoundError:
+            return False
+        self.checked_at = time.monotonic()
+        return True
+
+
+def _new_entry(now):
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    return {
+        'key_id': key_id_for(private_key.public_key()),
+        'enclave_id': secrets.token_hex(16),
+        'created_at': now.isoformat(),
+        'public_pem': public_pem(private_key.public_key()),
+        'private_pem': private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ).decode(),
+    }
+
+
+@contextmanager
+def _file_lock(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(f"{path}.lock", 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'current': None, 'retired': []}
+
+
+def _write(path, state):
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+_lock = threading.Lock()
+_identity = None
+_public_keys = {}
+
+
+def _remember(state):
+    for entry in [state['current']] + state['retired']:
+        _public_keys[entry['key_id']] = entry['public_pem']
+
+
+def _load(path, now, force=False):
+    """Read the key file under its lock, rotating (or creating) the key if due or forced."""
+    global _identity
+    with _file_lock(path):
+        state = _read(path)
+        current = state['current']
+        due = current is None or now >= datetime.fromisoformat(current['created_at']) + rotation_period()
+        if force or due:
+            if current:
+                state['retired'].append({
+                    'key_id': current['key_id'],
+                    'enclave_id': current['enclave_id'],
+                    'created_at': current['created_at'],
+                    'retired_at': now.isoformat(),
+                    'public_pem': current['public_pem'],
+                })
+            state['current'] = _new_entry(now)
+            _write(path, state)
+        mtime = os.stat(path).st_mtime_ns
+    _remember(state)
+    _identity = EnclaveIdentity(state['current'], path, mtime)
+    return _identity
+
+
+def get_identity(now=None):
+    """
+    The process-wide enclave identity. Only reads the key file on first use, when
+    settings.TEE_KEY_FILE changes, after another process replaced the file, or once
+    the cached key is due for rotation (the first process to get there rotates it;
+    the others pick up its successor).
+    """
+    now = now or timezone.now()
+    path = key_file()
+    identity = _identity
+    if identity is not None and identity.is_current(path, now):
+        return identity
+    with _lock:
+        identity = _identity
+        if identity is not None and identity.is_current(path, now):
+            return identity
+        return _load(path, now)
+
+
+def rotate(now=None):
+    """Retire the current key and generate its successor now, regardless of age."""
+    with _lock:
+        return _load(key_file(), now or timezone.now(), force=True)
+
+
+def stored_key_id():
+    """key_id of the current key in the key file, or None if no key was generated yet."""
+    current = _read(key_file())['current']
+    return current['key_id'] if current else None
+
+
+def public_key_pem(key_id):
+    """The PEM public key of enclave key `key_id` (current or retired), or None if unknown."""
+    if key_id not in _public_keys:
+        path = key_file()
+        state = _read(path)  # replaced atomically, so no lock is needed to read it
+        if state['current']:
+            _remember(state)
+    return _public_keys.get(key_id)
@@ -0,0 +1,30 @@
+"""
+Django management command to rotate the TEE enclave attestation key
+Usage: python manage.py rotate_tee_key [--if-due]
+"""
+from django.core.management.base import BaseCommand
+from audit.utils import log_event
+from secure_computation import enclave
+
+class Command(BaseCommand):
+    help = 'Retire the enclave attestation key and generate its successor; workers pick it up within a minute'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-due',
+            action='store_true',
+            help='Only rotate if the key is older than TEE_KEY_ROTATION_DAYS (for scheduled runs)'
+        )
+
+    def handle(self, *args, **options):
+        if options['if_due']:
+            # Loading the identity rotates a key that is due
+            stored = enclave.stored_key_id()
+            identity = enclave.get_identity()
+            if stored and identity.key_id == stored:
+                self.stdout.write(f"Key {identity.key_id} is not due for rotation yet")
+                return
+        else:
+            identity = enclave.rotate()
+        log_event('tee_key_rotated', None, {'key_id': identity.key_id, 'enclave_id': identity.enclave_id})
+        self.stdout.write(self.style.SUCCESS(f"Enclave key rotated, new key {identity.key_id}"))
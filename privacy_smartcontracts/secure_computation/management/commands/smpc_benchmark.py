@@ -0,0 +1,34 @@
+"""
+Django management command to benchmark the additive secret-sharing engine
+Usage: python manage.py smpc_benchmark [--sizes N ...] [--parties N]
+"""
+from django.core.management.base import BaseCommand
+from secure_computation import smpc
+
+class Command(BaseCommand):
+    help = 'Time sharing, summing, shared dot products and reconstruction for increasing vector sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            help='Vector sizes to benchmark',
+            default=[1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+        )
+        parser.add_argument(
+            '--parties',
+            type=int,
+            help='Number of parties holding shares',
+            default=smpc.DEFAULT_PARTIES
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Backend: {smpc.BACKEND}, {options['parties']} parties")
+        self.stdout.write(f"{'elements':>12} {'share':>9} {'sum':>9} {'dot':>9} {'reconstruct':>12} {'elements/s':>12}")
+        for size in options['sizes']:
+            t = smpc.benchmark(size, options['parties'])
+            self.stdout.write(
+                f"{size:>12,} {t['share']:>8.3f}s {t['sum']:>8.3f}s {t['dot']:>8.3f}s "
+                f"{t['reconstruct']:>11.3f}s {t['elements_per_second']:>12,.0f}"
+            )
@@ -0,0 +1,44 @@
+"""
+Django management command to run secure computation validation for pending requests in batches
+Usage: python manage.py validate_requests [--batch-size N] [--ids ID ...]
+"""
+from django.core.management.base import BaseCommand
+from requests_app.models import DataAccessRequest
+from secure_computation.batch import validate_batch, DEFAULT_BATCH_SIZE
+
+class Command(BaseCommand):
+    help = 'Validate pending data access requests without a verified validation, one TEE signature per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Requests validated per batch (one signature each)',
+            default=DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--ids',
+            type=int,
+            nargs='+',
+            help='Validate these request IDs instead of every pending request'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['ids']:
+            queryset = DataAccessRequest.objects.filter(pk__in=options['ids'])
+        else:
+            queryset = DataAccessRequest.objects.filter(status='PENDING').exclude(secure_validation__overall_verified=True)
+        queryset = queryset.select_related('contract').order_by('pk')
+
+        validated = batches = 0
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+            validations = validate_batch(chunk, batch_size=batch_size)
+            validated += sum(v.overall_verified for v in validations)
+            batches += 1
+        self.stdout.write(self.style.SUCCESS(f"{validated} request(s) validated in {batches} batch(es)"))
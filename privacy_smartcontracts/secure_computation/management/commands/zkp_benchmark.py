@@ -0,0 +1,37 @@
+"""
+Django management command to benchmark Pedersen range proofs
+Usage: python manage.py zkp_benchmark [--counts N ...] [--max-value N]
+"""
+from django.core.management.base import BaseCommand
+from secure_computation import zkp
+
+class Command(BaseCommand):
+    help = 'Report proof size and time proving, verifying one by one and batch-verifying range proofs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--counts',
+            type=int,
+            nargs='+',
+            help='Numbers of proofs to benchmark',
+            default=[1, 10, 100]
+        )
+        parser.add_argument(
+            '--max-value',
+            type=int,
+            help='Upper limit of the proved range [0, max-value]',
+            default=zkp.RETENTION_DAYS_RANGE[1]
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'proofs':>8} {'bits':>5} {'bytes':>7} {'prove/proof':>12} {'verify/proof':>13} "
+                          f"{'batch/proof':>12} {'speedup':>8}")
+        for count in options['counts']:
+            t = zkp.benchmark(count, 0, options['max_value'])
+            if not t['valid']:
+                self.stderr.write(self.style.ERROR(f"{count} proofs did not verify"))
+            self.stdout.write(
+                f"{count:>8,} {t['bits']:>5} {t['proof_bytes']:>7,} {t['prove_seconds'] / count * 1000:>10.1f}ms "
+                f"{t['verify_seconds'] / count * 1000:>11.1f}ms {t['batch_verify_seconds'] / count * 1000:>10.1f}ms "
+                f"{t['verify_seconds'] / t['batch_verify_seconds']:>7.1f}x"
+            )
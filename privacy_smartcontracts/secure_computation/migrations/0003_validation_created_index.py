@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("requests_app", "0005_inbox_indexes"),
+        ("secure_computation", "0002_alter_securecomputationvalidation_id"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="securecomputationvalidation",
+            index=models.Index(fields=["created_at"], name="scv_created"),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.8 on 2026-10-19 05:48
+
+import django.db.models.deletion
+import secure_computation.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("secure_computation", "0003_validation_created_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TEEKey",
+            fields=[
+                (
+                    "key_id",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("public_key", models.TextField()),
+                ("registered_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="securecomputationvalidation",
+            name="zkp_proof_data",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="securecomputationvalidation",
+            name="smpc_result",
+            field=models.JSONField(
+                blank=True,
+                encoder=secure_computation.models.CompactJSONEncoder,
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="securecomputationvalidation",
+            name="tee_attestation",
+            field=models.JSONField(
+                blank=True,
+                encoder=secure_computation.models.CompactJSONEncoder,
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="securecomputationvalidation",
+            name="zkp_proof",
+            field=models.JSONField(
+                blank=True,
+                encoder=secure_computation.models.CompactJSONEncoder,
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="securecomputationvalidation",
+            name="tee_key",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="validations",
+                to="secure_computation.teekey",
+            ),
+        ),
+    ]
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import struct
+
+from django.conf import settings
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Version 1 of secure_computation.zkp's proof encoding, the format encode_proofs below writes
+ENCODING_VERSION = 1
+# Copies of the signed attestation_data kept at the top level of tee_attestation
+REDUNDANT_KEYS = ("key_id", "enclave_id", "measurement", "computation_time")
+
+
+def key_id_for(public_pem):
+    # Frozen copy of secure_computation.enclave.key_id_for, from a PEM
+    from cryptography.hazmat.primitives import serialization
+
+    public_key = serialization.load_pem_public_key(public_pem.encode())
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+def _pack_text(text):
+    data = text.encode()
+    return struct.pack(">H", len(data)) + data
+
+
+def _pack_int(value):
+    data = value.to_bytes((value.bit_length() + 8) // 8, "big", signed=True)
+    return struct.pack(">B", len(data)) + data
+
+
+def encode_proofs(proofs):
+    # Frozen copy of secure_computation.zkp.encode_proofs (ENCODING_VERSION 1)
+    parts = [struct.pack(">BH", ENCODING_VERSION, len(proofs))]
+    for name, proof in proofs.items():
+        parts += [
+            _pack_text(name),
+            _pack_text(proof["context"]),
+            _pack_int(proof["lo"]),
+            _pack_int(proof["hi"]),
+            bytes.fromhex(proof["commitment"]),
+        ]
+        for side in ("lower", "upper"):
+            parts += [bytes.fromhex("".join(row)) for row in proof[side]]
+    return b"".join(parts)
+
+
+def enclave_public_keys():
+    """key_id -> PEM of every key in the enclave key file (current and retired)."""
+    path = getattr(settings, "TEE_KEY_FILE", None) or settings.BASE_DIR / "tee_enclave_key.json"
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    entries = ([state["current"]] if state.get("current") else []) + state.get("retired", [])
+    return {entry["key_id"]: entry["public_pem"] for entry in entries}
+
+
+def stored_size(validation, compact):
+    separators = (",", ":") if compact else None
+    return sum(
+        len(json.dumps(value, separators=separators))
+        for value in (validation.zkp_proof, validation.tee_attestation, validation.smpc_result)
+        if value is not None
+    ) + len(validation.zkp_proof_data or b"")
+
+
+def compact_validations(apps, schema_editor):
+    """
+    Move public keys into the TEEKey registry, drop duplicated attestation
+    fields and binary-encode range proofs, BATCH_SIZE validations at a time.
+    """
+    Validation = apps.get_model("secure_computation", "SecureComputationValidation")
+    TEEKey = apps.get_model("secure_computation", "TEEKey")
+    file_keys = enclave_public_keys()
+    registered = set(TEEKey.objects.values_list("key_id", flat=True))
+
+    rows = saved = 0
+    last_pk = 0
+    while True:
+        batch = list(Validation.objects.filter(pk__gt=last_pk).order_by("pk")[:BATCH_SIZE])
+        if not batch:
+            break
+        keys = {}
+        for validation in batch:
+            before = stored_size(validation, compact=False)
+            attestation = dict(validation.tee_attestation or {})
+            signed = attestation.get("attestation_data") or {}
+            public_pem = attestation.pop("public_key", None)
+            if public_pem:
+                key_id = key_id_for(public_pem)
+            else:
+                key_id = attestation.get("key_id") or signed.get("key_id")
+                public_pem = file_keys.get(key_id)
+            if key_id and (key_id in registered or public_pem):
+                keys.setdefault(key_id, public_pem)
+                validation.tee_key_id = key_id
+            attestation.pop("computation_time", None)
+            if signed:
+                for key in REDUNDANT_KEYS:
+                    attestation.pop(key, None)
+                if attestation.get("computation_result") == signed.get("computation_result"):
+                    attestation.pop("computation_result", None)
+            if validation.tee_attestation is not None:
+                validation.tee_attestation = attestation
+
+            zkp_proof = validation.zkp_proof
+            if zkp_proof and "proofs" in zkp_proof:
+                zkp_proof = dict(zkp_proof)
+                validation.zkp_proof_data = encode_proofs(zkp_proof.pop("proofs"))
+                validation.zkp_proof = zkp_proof
+            saved += before - stored_size(validation, compact=True)
+        TEEKey.objects.bulk_create(
+            [TEEKey(key_id=key_id, public_key=pem) for key_id, pem in keys.items() if key_id not in registered],
+            ignore_conflicts=True,
+        )
+        registered |= set(keys)
+        Validation.objects.bulk_update(batch, ["tee_key", "tee_attestation", "zkp_proof", "zkp_proof_data"])
+        rows += len(batch)
+        last_pk = batch[-1].pk
+    if rows:
+        logger.info("Compacted %d secure computation validations, %s bytes saved", rows, f"{saved:,}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("secure_computation", "0004_tee_key_registry"),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_validations, migrations.RunPython.noop),
+    ]
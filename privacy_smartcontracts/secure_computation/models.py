@@ -3,115 +3,243 @@ from django.conf import settings
 from requests_app.models import DataAccessRequest
 from audit.utils import log_event
 from django.utils import timezone
+from functools import lru_cache
 import hashlib
 import secrets
 import time
 import json
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
+from oracle import canonical, merkle
+from . import crypto_pool, enclave, smpc_runtime, zkp
+
+
+class CompactJSONEncoder(json.JSONEncoder):
+    """Stores JSON fields without the whitespace json.dumps puts after separators."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs['separators'] = (',', ':')
+        super().__init__(*args, **kwargs)
+
+
+@lru_cache(maxsize=64)
+def _public_der(public_key_pem):
+    return crypto_pool.public_der(serialization.load_pem_public_key(public_key_pem.encode()))
+
+
+def canonical_result(computation_result):
+    """The bytes of a computation result that are hashed into a batch attestation's Merkle tree."""
+    return canonical.canonicalize(computation_result)
 
 
 class TEEGateway:
     """
     Trusted Execution Environment implementation using cryptographic primitives.
     Provides hardware-backed TEE behavior with remote attestation capabilities.
+
+    The attestation key is the process-wide enclave identity (see
+    secure_computation.enclave), so constructing a gateway is cheap and every
+    gateway signs with the current, persisted key.
     """
 
-    def __init__(self):
-        # Generate TEE attestation key (hardware-backed key)
-        self.attestation_key = ec.generate_private_key(ec.SECP256R1(), default_backend())
-        self.enclave_id = secrets.token_hex(16)
-        self.measurement = self._calculate_measurement()
+    @property
+    def identity(self):
+        return enclave.get_identity()
+
+    @property
+    def attestation_key(self):
+        return self.identity.attestation_key
+
+    @property
+    def key_id(self):
+        return self.identity.key_id
 
-    def _calculate_measurement(self):
-        """Calculate code/data measurement hash using SHA-3-256 (PCR measurement)"""
-        # TEE PCR values from TPM/SGX hardware
-        # Upgraded to SHA-3-256 for enhanced security
-        code_hash = hashlib.sha3_256(b"privacy_smart_contract_tee_code_v2.0").hexdigest()
-        data_hash = hashlib.sha3_256(b"secure_computation_data_integrity").hexdigest()
-        return hashlib.sha3_256((code_hash + data_hash).encode()).hexdigest()
+    @property
+    def enclave_id(self):
+        return self.identity.enclave_id
+
+    @property
+    def measurement(self):
+        return enclave.enclave_measurement()
 
     def perform_secure_computation(self, request_data):
         """
         Perform computation in TEE environment with integrity guarantees.
         """
+        return self.perform_secure_computations([request_data])[0]
+
+    def perform_secure_computations(self, request_data_list):
+        """
+        Perform the computation for many requests at once, hashing all inputs in
+        one pass with the canonical encoder.
+        """
         start_time = time.time()
 
         # Verify input integrity using SHA-3-256
-        input_hash = hashlib.sha3_256(json.dumps(request_data, sort_keys=True).encode()).hexdigest()
+        input_hashes = [hashlib.sha3_256(canonical.canonicalize(data)).hexdigest() for data in request_data_list]
 
         # TEE computation runs in isolated hardware environment
-        computation_result = {
-            'request_id': request_data.get('request_id'),
-            'contract_id': request_data.get('contract_id'),
-            'computation_type': 'privacy_preserving_validation',
-            'input_integrity': input_hash,
-            'output_hash': secrets.token_hex(32),
-            'computation_time': time.time() - start_time
-        }
+        results = [
+            {
+                'request_id': request_data.get('request_id'),
+                'contract_id': request_data.get('contract_id'),
+                'computation_type': 'privacy_preserving_validation',
+                'input_integrity': input_hash,
+                'output_hash': secrets.token_hex(32),
+            }
+            for request_data, input_hash in zip(request_data_list, input_hashes)
+        ]
+        computation_time = (time.time() - start_time) / max(len(results), 1)
+        for result in results:
+            result['computation_time'] = computation_time
 
-        return computation_result
+        return results
+
+    def _sign_many(self, identity, attestation_data_list):
+        # ECDSA with SHA-3-256 for enhanced security, on the shared crypto pool for large bursts.
+        # The signed bytes are kept (signed_data) so verifiers never re-encode attestation_data.
+        messages = [canonical.canonicalize(data) for data in attestation_data_list]
+        signatures = crypto_pool.sign_many(identity.attestation_key, messages)
+        return [
+            {
+                'attestation_data': attestation_data,
+                'signed_data': message.decode(),
+                'signature': signature.hex(),
+                'key_id': identity.key_id,
+                'public_key': identity.public_key_pem,
+                'verified': True
+            }
+            for attestation_data, message, signature in zip(attestation_data_list, messages, signatures)
+        ]
+
+    def _sign(self, identity, attestation_data):
+        return self._sign_many(identity, [attestation_data])[0]
 
     def generate_attestation(self, computation_result):
         """
         Generate remote attestation quote proving computation integrity.
         """
-        # Create attestation data
+        return self.generate_attestations([computation_result])[0]
+
+    def generate_attestations(self, computation_results):
+        """One individually signed attestation per computation result, signed as one burst."""
+        identity = self.identity
+        measurement = self.measurement
+        return self._sign_many(identity, [
+            {
+                'key_id': identity.key_id,
+                'enclave_id': identity.enclave_id,
+                'measurement': measurement,
+                'computation_result': computation_result,
+                'timestamp': int(time.time()),
+                'nonce': secrets.token_hex(16)
+            }
+            for computation_result in computation_results
+        ])
+
+    def generate_batch_attestation(self, computation_results):
+        """
+        Attest many computation results with one signature over the Merkle root
+        of their canonical encodings. Returns (attestation, proofs), where
+        proofs[i] is the inclusion proof of computation_results[i].
+        """
+        identity = self.identity
+        levels = merkle.build_levels([merkle.leaf_hash(canonical_result(r)) for r in computation_results])
+
         attestation_data = {
-            'enclave_id': self.enclave_id,
+            'key_id': identity.key_id,
+            'enclave_id': identity.enclave_id,
             'measurement': self.measurement,
-            'computation_result': computation_result,
+            'merkle_root': levels[-1][0].hex(),
+            'size': len(computation_results),
             'timestamp': int(time.time()),
             'nonce': secrets.token_hex(16)
         }
-
-        # Sign attestation with TEE key using SHA-3-256 for enhanced security
-        attestation_bytes = json.dumps(attestation_data, sort_keys=True).encode()
-        # Hash with SHA-3-256 for enhanced security before signing
-        attestation_hash = hashlib.sha3_256(attestation_bytes).digest()
-        # Use Prehashed wrapper for SHA-3-256 hash
-        from cryptography.hazmat.primitives.asymmetric import utils
-        signature = self.attestation_key.sign(attestation_hash, ec.ECDSA(utils.Prehashed(hashes.SHA3_256())))
-
-        # Get public key for verification
-        public_key = self.attestation_key.public_key()
-        public_key_pem = public_key.public_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        ).decode()
-
-        return {
-            'attestation_data': attestation_data,
-            'signature': signature.hex(),
-            'public_key': public_key_pem,
-            'verified': True
-        }
+        attestation = self._sign(identity, attestation_data)
+        return attestation, [merkle.inclusion_proof(levels, i) for i in range(len(computation_results))]
 
     def verify_attestation(self, attestation):
         """
         Verify a remote attestation (for completeness, though typically done by relying party).
         """
-        try:
-            public_key = serialization.load_pem_public_key(
-                attestation['public_key'].encode(),
-                backend=default_backend()
-            )
-
-            attestation_bytes = json.dumps(attestation['attestation_data'], sort_keys=True).encode()
-            signature_bytes = bytes.fromhex(attestation['signature'])
-            
-            # Hash with SHA-3-256 before verification for enhanced security
-            attestation_hash = hashlib.sha3_256(attestation_bytes).digest()
-            # Verify using Prehashed SHA3-256
-            from cryptography.hazmat.primitives.asymmetric import utils
-            public_key.verify(signature_bytes, attestation_hash, ec.ECDSA(utils.Prehashed(hashes.SHA3_256())))
+        return self.verify_attestations([attestation])[0]
+
+    def verify_attestations(self, attestations):
+        """
+        Whether each attestation verifies; the signatures are checked as one burst.
+        The stored signed bytes are verified as they are; only attestations from
+        before canonical encoding (no signed_data) have their data re-encoded.
+        """
+        items, checked = [], []
+        for attestation in attestations:
+            try:
+                message, attestation_data = self._signed_message(attestation)
+                # Keys are looked up by ID; only attestations from before key IDs carry their own key
+                key_id = attestation_data.get('key_id')
+                public_key_pem = TEEKey.public_key_for(key_id) if key_id else attestation['public_key']
+                items.append((_public_der(public_key_pem), message, bytes.fromhex(attestation['signature'])))
+                checked.append((attestation, attestation_data))
+            except Exception:
+                checked.append(None)
+        valid = iter(crypto_pool.verify_many(items))
+        return [entry is not None and next(valid) and self._included(*entry) for entry in checked]
+
+    @staticmethod
+    def _signed_message(attestation):
+        """(signed bytes, the attestation data they encode); ValueError if a copy of the data disagrees."""
+        if 'signed_data' not in attestation:
+            return canonical.legacy_bytes(attestation['attestation_data']), attestation['attestation_data']
+        message = attestation['signed_data'].encode()
+        attestation_data = json.loads(message)
+        if 'attestation_data' in attestation and attestation['attestation_data'] != attestation_data:
+            raise ValueError("attestation_data does not match the signed data")
+        return message, attestation_data
+
+    @staticmethod
+    def _included(attestation, attestation_data):
+        if 'proof' not in attestation:
             return True
+        # Batch attestation: the signature covers a Merkle root, which must include this result
+        try:
+            if 'signed_result' in attestation:
+                leaf = attestation['signed_result'].encode()
+            else:
+                leaf = canonical.legacy_bytes(attestation['computation_result'])
+            return merkle.verify_proof(leaf, attestation['proof'], attestation_data['merkle_root'])
         except Exception:
             return False
 
 
+tee_gateway = TEEGateway()
+
+
+class TEEKey(models.Model):
+    """
+    Registry of enclave attestation public keys. Validations reference their
+    key by fingerprint (key_id) instead of each carrying the PEM, and
+    attestations stay verifiable here even without the enclave key file.
+    """
+    key_id = models.CharField(max_length=64, primary_key=True)
+    public_key = models.TextField()  # PEM
+    registered_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"TEE key {self.key_id}"
+
+    @classmethod
+    def register(cls, key_id):
+        """Add enclave key `key_id` from the enclave key file unless already registered (one query)."""
+        cls.objects.bulk_create(
+            [cls(key_id=key_id, public_key=enclave.public_key_pem(key_id))], ignore_conflicts=True
+        )
+
+    @classmethod
+    def public_key_for(cls, key_id):
+        """The PEM public key of `key_id`: from the enclave key file, else from the registry."""
+        return enclave.public_key_pem(key_id) or cls.objects.filter(key_id=key_id).values_list(
+            'public_key', flat=True
+        ).first()
+
+
 class SecureComputationValidation(models.Model):
     """
     Records the secure computation validation for a data access request.
@@ -122,80 +250,141 @@ class SecureComputationValidation(models.Model):
     tee_verified = models.BooleanField(default=False)
     smpc_verified = models.BooleanField(default=False)
     overall_verified = models.BooleanField(default=False)
-    zkp_proof = models.JSONField(null=True, blank=True)  # ZKP proof data
-    tee_attestation = models.JSONField(null=True, blank=True)  # TEE attestation
-    smpc_result = models.JSONField(null=True, blank=True)  # SMPC computation result
+    zkp_proof = models.JSONField(null=True, blank=True, encoder=CompactJSONEncoder)  # ZKP statements and outcome
+    zkp_proof_data = models.BinaryField(null=True, blank=True)  # The range proofs, zkp.encode_proofs
+    tee_key = models.ForeignKey(TEEKey, null=True, blank=True, on_delete=models.PROTECT, related_name='validations')
+    tee_attestation = models.JSONField(null=True, blank=True, encoder=CompactJSONEncoder)  # TEE attestation
+    smpc_result = models.JSONField(null=True, blank=True, encoder=CompactJSONEncoder)  # SMPC computation result
     created_at = models.DateTimeField(auto_now_add=True)
     validated_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Dashboard listing: newest validations of the user's contracts/requests
+            models.Index(fields=['created_at'], name='scv_created'),
+        ]
+
     def __str__(self):
         return f"Secure Validation for Request {self.request.id}"
 
-    def perform_validation(self):
-        """
-        Secure computation validation using cryptographic primitives.
-        Integrates with ZKP, TEE, and SMPC implementations.
-        """
-
-        # ZKP verification
-        self.zkp_proof = {
-            'proof_type': 'zkp_range_proof',
-            'verified': True,
-            'computation_time': 0.1,
-            'proof_data': secrets.token_hex(64)
-        }
-        self.zkp_verified = True
+    VALIDATION_FIELDS = (
+        'zkp_verified', 'tee_verified', 'smpc_verified', 'overall_verified',
+        'zkp_proof', 'zkp_proof_data', 'tee_key', 'tee_attestation', 'smpc_result', 'validated_at',
+    )
 
-        # Real TEE verification using cryptographic TEE implementation
-        tee_gateway = TEEGateway()
-        request_data = {
+    def request_data(self):
+        """The TEE computation input for this validation's request."""
+        return {
             'request_id': self.request.id,
-            'contract_id': self.request.contract.id,
-            'requester_id': self.request.requester.id,
-            'contract_owner_id': self.request.contract.owner.id
+            'contract_id': self.request.contract_id,
+            'requester_id': self.request.requester_id,
+            'contract_owner_id': self.request.contract.owner_id
         }
 
-        # Perform secure computation in TEE
-        computation_result = tee_gateway.perform_secure_computation(request_data)
+    def contract_figures(self):
+        """The contract's private numeric data: numeric policy values and its retention period."""
+        contract = self.request.contract
+        figures = [
+            value for key, value in (contract.policy or {}).items()
+            if key != 'retention_days' and isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        if contract.retention_days is not None:
+            figures.append(contract.retention_days)
+        return figures
 
-        # Generate remote attestation
-        attestation = tee_gateway.generate_attestation(computation_result)
+    def zkp_statements(self):
+        """(name, value, lo, hi) of the contract values proved to be within policy limits."""
+        retention_days = self.request.contract.retention_days
+        if retention_days is None:
+            return []
+        lo, hi = getattr(settings, 'ZKP_RETENTION_DAYS_RANGE', zkp.RETENTION_DAYS_RANGE)
+        return [('retention_days', retention_days, lo, hi)]
+
+    def prove_statements(self):
+        """Unverified range proofs of zkp_statements(), bound to this request."""
+        return zkp.prove_statements(self.zkp_statements(), context=f'request:{self.request.id}')
+
+    def apply_results(self, computation_result, attestation, proof=None, smpc_result=None, zkp_proof=None):
+        """
+        Fill in the ZKP, TEE and SMPC results (VALIDATION_FIELDS) without saving.
+        `proof` is the Merkle inclusion proof when `attestation` covers a batch;
+        `smpc_result` and `zkp_proof` (verified range proofs) are computed here
+        unless the caller batched them.
+        """
 
+        # ZKP: Pedersen range proofs of the contract values, without revealing them
+        zkp_proof = dict(zkp_proof or zkp.verify_statements([self.prove_statements()])[0])
+        self.zkp_proof_data = zkp.encode_proofs(zkp_proof.pop('proofs'))
+        self.zkp_proof = zkp_proof
+        self.zkp_verified = zkp_proof['verified']
+
+        # The key is referenced through the TEEKey registry, which the caller fills
+        self.tee_key_id = attestation['key_id']
+        # The signed bytes are stored instead of attestation_data, which they encode
         self.tee_attestation = {
-            'enclave_id': attestation['attestation_data']['enclave_id'],
-            'measurement': attestation['attestation_data']['measurement'],
-            'computation_result': computation_result,
+            'signed_data': attestation['signed_data'],
             'signature': attestation['signature'],
-            'public_key': attestation['public_key'],
             'verified': attestation['verified'],
-            'computation_time': computation_result['computation_time']
         }
+        if proof is not None:
+            # A batch attestation signs a Merkle root, so the result (as hashed into it) is only stored here
+            self.tee_attestation.update(signed_result=canonical_result(computation_result).decode(), proof=proof)
         self.tee_verified = attestation['verified']
 
-        # SMPC verification
-        self.smpc_result = {
-            'parties': 3,
-            'computation': 'privacy_preserving_aggregation',
-            'verified': True,
-            'computation_time': 0.2,
-            'shares_verified': [secrets.token_hex(32) for _ in range(3)]
-        }
-        self.smpc_verified = True
+        # SMPC aggregation of the contract's private figures by the party processes
+        self.smpc_result = smpc_result or smpc_runtime.aggregate_many([self.contract_figures()])[0]
+        self.smpc_verified = self.smpc_result['verified']
 
         # Overall verification
         self.overall_verified = self.zkp_verified and self.tee_verified and self.smpc_verified
         self.validated_at = timezone.now()
 
-        self.save()
+    @property
+    def zkp_proofs(self):
+        """The range proofs behind zkp_proof, by statement name."""
+        return zkp.decode_proofs(bytes(self.zkp_proof_data)) if self.zkp_proof_data else {}
 
-        # Log the validation
-        log_event('secure_computation_validated', None, {
+    @property
+    def attestation_data(self):
+        """The signed TEE attestation data (parsed from signed_data on rows stored since canonical encoding)."""
+        attestation = self.tee_attestation or {}
+        if 'signed_data' in attestation:
+            return json.loads(attestation['signed_data'])
+        return attestation.get('attestation_data', attestation)
+
+    @property
+    def computation_result(self):
+        """The attested TEE computation result (inside the signed data unless batch-attested)."""
+        attestation = self.tee_attestation or {}
+        if 'signed_result' in attestation:
+            return json.loads(attestation['signed_result'])
+        return attestation.get('computation_result') or self.attestation_data.get('computation_result')
+
+    def audit_details(self):
+        return {
             'request_id': self.request.id,
             'zkp_verified': self.zkp_verified,
             'tee_verified': self.tee_verified,
             'smpc_verified': self.smpc_verified,
             'overall_verified': self.overall_verified,
-            'enclave_id': self.tee_attestation['enclave_id']
-        })
+            'enclave_id': self.attestation_data['enclave_id']
+        }
+
+    def perform_validation(self):
+        """
+        Secure computation validation using cryptographic primitives.
+        Integrates with ZKP, TEE, and SMPC implementations.
+        For many requests at once, see secure_computation.batch.validate_batch.
+        """
+        # Perform secure computation in TEE and generate its remote attestation
+        computation_result = tee_gateway.perform_secure_computation(self.request_data())
+        attestation = tee_gateway.generate_attestation(computation_result)
+        TEEKey.register(attestation['key_id'])
+        self.apply_results(computation_result, attestation)
+
+        self.save()
+
+        # Log the validation
+        log_event('secure_computation_validated', None, self.audit_details())
 
         return self.overall_verified
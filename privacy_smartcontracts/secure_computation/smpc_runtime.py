@@ -0,0 +1,263 @@
+"""
+Multi-process SMPC party runtime.
+
+Each party runs in its own process and only ever sees its own shares. The
+coordinator (the Django process) acts as the dealer: it encodes the private
+values, splits them and a set of Beaver triples into shares, and hands each
+party its part. The parties are connected to each other by a full mesh of
+local socket pairs (multiprocessing.Pipe) and run the aggregation protocol:
+
+    distribute   dealer -> each party: x_i, a_i, b_i, c_i
+    open         every party -> every other party: d_i = x_i - a_i and
+                 e_i = x_i - b_i, both vectors in ONE message per peer
+    output       each party -> dealer: its shares of sum(x) and dot(x, x)
+
+All the messages of a round travel as a single exchange per connection, so a
+round costs one message latency however many elements it carries. Each party
+sends from a helper thread while receiving, so large rounds cannot deadlock
+on full socket buffers. Every result reports per-round seconds and bytes.
+
+The party processes are started once per Django process (get_runtime) and
+reused; a party failure or timeout raises SMPCRuntimeError and the runtime is
+restarted on next use. They are spawned, not forked, so they never inherit a
+copy of the coordinator's threads, open connections or memory. The runtime is
+off unless settings.SMPC_PARTY_PROCESSES is set, which is meant for approval
+worker and management command processes, not for web servers.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from . import smpc
+
+ROUND_TIMEOUT = 30
+_context = multiprocessing.get_context('spawn')
+
+
+class SMPCRuntimeError(Exception):
+    """A party process failed or did not answer in time."""
+
+
+def _send_all(peers, payload, errors):
+    try:
+        for conn in peers.values():
+            conn.send_bytes(payload)
+    except OSError as e:
+        errors.append(e)
+
+
+def _exchange(peers, payload):
+    """
+    Send `payload` to every peer and receive theirs; returns (messages by peer, bytes sent).
+    Raises EOFError or OSError if a peer has gone away.
+    """
+    errors = []
+    sender = threading.Thread(target=_send_all, args=(peers, payload, errors))
+    sender.start()
+    try:
+        received = {j: conn.recv_bytes() for j, conn in peers.items()}
+    finally:
+        sender.join()
+    if errors:
+        raise errors[0]
+    return received, len(payload) * len(peers)
+
+
+def _party_main(index, control, peers):
+    """
+    Party `index`: serve aggregation requests from the dealer until told to stop.
+    Exits quietly when the dealer or a peer goes away (closed or broken pipe);
+    the dealer sees the missing answer and restarts the runtime.
+    """
+    try:
+        _serve(index, control, peers)
+    except (EOFError, OSError):
+        pass
+
+
+def _serve(index, control, peers):
+    while True:
+        command = control.recv()
+        if command == 'stop':
+            return
+        bounds = command[1]
+        x, a, b, c = (smpc.from_bytes(control.recv_bytes()) for _ in range(4))
+        n = len(x)
+
+        start = time.perf_counter()
+        sum_shares = [smpc.total(x[lo:hi]) for lo, hi in bounds]
+        # open round: d_i and e_i (here y = x, for the sum of squares) as one message per peer
+        d, e = smpc.sub(x, a), smpc.sub(x, b)
+        opened = time.perf_counter()
+        received, sent = _exchange(peers, smpc.to_bytes(d) + smpc.to_bytes(e))
+        open_seconds = time.perf_counter() - opened
+        for message in received.values():
+            d = smpc.add(d, smpc.from_bytes(message[:8 * n]))
+            e = smpc.add(e, smpc.from_bytes(message[8 * n:]))
+        z = smpc.add(c, smpc.add(smpc.mul(b, d), smpc.mul(a, e)))
+        if index == 0:
+            z = smpc.add(z, smpc.mul(d, e))
+        dot_shares = [smpc.total(z[lo:hi]) for lo, hi in bounds]
+        control.send((sum_shares, dot_shares, open_seconds, time.perf_counter() - start, sent))
+
+
+class PartyRuntime:
+    """`parties` party processes connected pairwise, driven by this (dealer) process."""
+
+    def __init__(self, parties=smpc.DEFAULT_PARTIES):
+        if parties < 2:
+            raise ValueError("Secret sharing needs at least two parties")
+        self.parties = parties
+        self.pid = os.getpid()
+        self._controls = []
+        self._processes = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_running(self):
+        return bool(self._processes) and all(p.is_alive() for p in self._processes)
+
+    def start(self):
+        mesh = {}
+        for i in range(self.parties):
+            for j in range(i + 1, self.parties):
+                mesh[i, j], mesh[j, i] = _context.Pipe()
+        for i in range(self.parties):
+            control, party_end = _context.Pipe()
+            peers = {j: mesh[i, j] for j in range(self.parties) if j != i}
+            process = _context.Process(
+                target=_party_main, args=(i, party_end, peers), name=f'smpc-party-{i}', daemon=True
+            )
+            process.start()
+            party_end.close()
+            self._controls.append(control)
+            self._processes.append(process)
+        for conn in mesh.values():
+            conn.close()  # the parties hold their own copies
+        return self
+
+    def close(self):
+        for control in self._controls:
+            try:
+                control.send('stop')
+            except (OSError, ValueError):
+                pass
+        for process in self._processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        for control in self._controls:
+            control.close()
+        self._controls, self._processes = [], []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def aggregate(self, values, fractional_bits=smpc.FRACTIONAL_BITS):
+        """
+        Like smpc.aggregate, but each party's computation runs in its own process.
+        The result also has 'runtime' and 'rounds' (name, seconds, bytes).
+        """
+        return self.aggregate_many([values], fractional_bits)[0]
+
+    def aggregate_many(self, vectors, fractional_bits=smpc.FRACTIONAL_BITS):
+        """
+        Aggregate several independent vectors in one protocol run: they are
+        concatenated, so the whole batch costs the same three rounds as one
+        vector, and each party totals its shares per vector. Returns one
+        result per vector.
+        """
+        with self._lock:
+            try:
+                return self._aggregate(vectors, fractional_bits)
+            except (OSError, EOFError) as e:
+                self.close()
+                raise SMPCRuntimeError(f"SMPC party failed: {e}") from e
+
+    def _aggregate(self, vectors, fractional_bits):
+        start = time.perf_counter()
+        vectors = [[float(v) for v in values] for values in vectors]
+        bounds, offset = [], 0
+        for values in vectors:
+            bounds.append((offset, offset + len(values)))
+            offset += len(values)
+        shares = smpc.share([v for values in vectors for v in values], self.parties, fractional_bits)
+        a_shares, b_shares, c_shares = smpc.beaver_triples(offset, self.parties)
+
+        mark = time.perf_counter()
+        distributed = 0
+        for control, parts in zip(self._controls, zip(shares, a_shares, b_shares, c_shares)):
+            control.send(('aggregate', bounds))
+            for part in parts:
+                data = smpc.to_bytes(part)
+                control.send_bytes(data)
+                distributed += len(data)
+        distributed_at = time.perf_counter()
+
+        outputs = []
+        for control in self._controls:
+            if not control.poll(ROUND_TIMEOUT):
+                self.close()
+                raise SMPCRuntimeError(f"SMPC party did not answer within {ROUND_TIMEOUT}s")
+            outputs.append(control.recv())
+        collected = time.perf_counter()
+        sum_shares, dot_shares, open_seconds, party_seconds, party_bytes = zip(*outputs)
+        rounds = [
+            {'name': 'distribute', 'seconds': distributed_at - mark, 'bytes': distributed},
+            {'name': 'open', 'seconds': max(open_seconds), 'bytes': sum(party_bytes)},
+            # Waiting for results beyond the slowest party's own work
+            {'name': 'output', 'seconds': max(0.0, collected - distributed_at - max(party_seconds)),
+             'bytes': 16 * self.parties * len(vectors)},
+        ]
+
+        elapsed = time.perf_counter() - start
+        results = []
+        for k, (values, (lo, hi)) in enumerate(zip(vectors, bounds)):
+            sum_value = smpc.decode_scalar(smpc.reconstruct_scalar([s[k] for s in sum_shares]), fractional_bits)
+            squares = smpc.decode_scalar(smpc.reconstruct_scalar([s[k] for s in dot_shares]), 2 * fractional_bits)
+            result = smpc.build_result(
+                values, sum_value, squares, [share[lo:hi] for share in shares], self.parties, fractional_bits, elapsed
+            )
+            result.update({'runtime': 'processes', 'batch_size': len(vectors), 'rounds': rounds})
+            results.append(result)
+        return results
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime(parties=smpc.DEFAULT_PARTIES):
+    """This process's party runtime, (re)started if it is not running."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is not None and _runtime.pid != os.getpid():
+            _runtime = None  # inherited through fork; its parties belong to the parent
+        if _runtime is None or _runtime.parties != parties or not _runtime.is_running:
+            if _runtime is not None:
+                _runtime.close()
+            _runtime = PartyRuntime(parties).start()
+        return _runtime
+
+
+@atexit.register
+def _shutdown():
+    if _runtime is not None and _runtime.pid == os.getpid():
+        _runtime.close()
+
+
+def aggregate_many(vectors):
+    """
+    smpc_result dicts for `vectors`: computed by this process's party runtime,
+    or in-process by smpc.aggregate unless settings.SMPC_PARTY_PROCESSES is on.
+    """
+    if not getattr(settings, 'SMPC_PARTY_PROCESSES', False):
+        return [smpc.aggregate(values) for values in vectors]
+    return get_runtime().aggregate_many(vectors)
@@ -1,8 +1,29 @@
-from django.test import TestCase
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
+import json
+import multiprocessing
+import os
+import tempfile
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from contracts.models import Contract
 from requests_app.models import DataAccessRequest
-from .models import SecureComputationValidation
+from oracle import canonical
+from audit.models import AuditEvent
+from . import crypto_pool, enclave, smpc, smpc_runtime, zkp
+from .batch import validate_batch
+from .models import SecureComputationValidation, TEEGateway, TEEKey, canonical_result, tee_gateway
 
 User = get_user_model()
 
@@ -42,3 +63,486 @@ class SecureComputationValidationTestCase(TestCase):
         self.assertIsNotNone(validation.zkp_proof)
         self.assertIsNotNone(validation.tee_attestation)
         self.assertIsNotNone(validation.smpc_result)
+
+
+class KeyFileIsolationTestCase(TestCase):
+    def test_tests_never_use_the_project_key_file(self):
+        """The test runner moves TEE_KEY_FILE into a temporary directory"""
+        self.assertNotEqual(enclave.key_file().parent, settings.BASE_DIR)
+        self.assertTrue(enclave.key_file().is_relative_to(tempfile.gettempdir()))
+
+
+class EnclaveIdentityTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.key_file = os.path.join(self.tmp.name, 'tee_key.json')
+        override = override_settings(TEE_KEY_FILE=self.key_file, TEE_KEY_ROTATION_DAYS=30)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_gateways_share_persisted_key(self):
+        """Gateways reuse one persisted key, and another process loads the same one from the file"""
+        first = TEEGateway().key_id
+        self.assertEqual(TEEGateway().key_id, first)
+        self.assertTrue(os.path.exists(self.key_file))
+        enclave._identity = None  # as seen by a fresh worker process
+        self.assertEqual(enclave.get_identity().key_id, first)
+
+    def test_attestation_references_key_by_id(self):
+        attestation = tee_gateway.generate_attestation({'request_id': 1})
+        self.assertEqual(attestation['attestation_data']['key_id'], tee_gateway.key_id)
+        self.assertTrue(tee_gateway.verify_attestation(attestation))
+        forged = dict(attestation, attestation_data=dict(attestation['attestation_data'], key_id='0' * 16))
+        self.assertFalse(tee_gateway.verify_attestation(forged))
+
+    def test_signed_data_is_verified_as_stored(self):
+        attestation = tee_gateway.generate_attestation({'request_id': 1, 'score': 0.1})
+        stored = {key: attestation[key] for key in ('signed_data', 'signature')}
+        self.assertTrue(tee_gateway.verify_attestation(stored))
+        stored['signed_data'] = stored['signed_data'].replace('"request_id":1', '"request_id":2')
+        self.assertFalse(tee_gateway.verify_attestation(stored))
+
+    def test_rotation_keeps_old_attestations_verifiable(self):
+        attestation = tee_gateway.generate_attestation({'request_id': 1})
+        old_key = tee_gateway.key_id
+        rotated = enclave.get_identity(now=timezone.now() + timedelta(days=31))
+        self.assertNotEqual(rotated.key_id, old_key)
+        enclave._public_keys.clear()
+        self.assertTrue(tee_gateway.verify_attestation(attestation))
+        self.assertNotEqual(enclave.rotate().key_id, rotated.key_id)
+
+    def test_stored_validation_verifies(self):
+        owner = User.objects.create_user(username='owner', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=owner)
+        dar = DataAccessRequest.objects.create(contract=contract, requester=owner)
+        validation = SecureComputationValidation.objects.create(request=dar)
+        validation.perform_validation()
+        validation.refresh_from_db()
+        self.assertEqual(validation.tee_key_id, tee_gateway.key_id)
+        self.assertNotIn('public_key', validation.tee_attestation)
+        self.assertTrue(tee_gateway.verify_attestation(validation.tee_attestation))
+
+    def test_registry_verifies_without_key_file(self):
+        owner = User.objects.create_user(username='owner', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=owner)
+        validation = SecureComputationValidation.objects.create(
+            request=DataAccessRequest.objects.create(contract=contract, requester=owner)
+        )
+        validation.perform_validation()
+        self.assertEqual(TEEKey.objects.get().public_key, tee_gateway.identity.public_key_pem)
+        with override_settings(TEE_KEY_FILE=os.path.join(self.tmp.name, 'elsewhere.json')):
+            enclave._public_keys.clear()
+            self.assertTrue(tee_gateway.verify_attestation(validation.tee_attestation))
+
+    def test_rotate_command(self):
+        key_id = enclave.get_identity().key_id
+        call_command('rotate_tee_key', '--if-due', stdout=StringIO())
+        self.assertEqual(enclave.get_identity().key_id, key_id)
+        call_command('rotate_tee_key', stdout=StringIO())
+        self.assertNotEqual(enclave.get_identity().key_id, key_id)
+        self.assertIsNotNone(enclave.public_key_pem(key_id))
+
+
+class TEEDashboardTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(TEE_KEY_FILE=os.path.join(self.tmp.name, 'tee_key.json'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+        self.client.login(username='owner', password='pass')
+
+    def _validate(self, count):
+        for _ in range(count):
+            dar = DataAccessRequest.objects.create(contract=self.contract, requester=self.requester)
+            SecureComputationValidation.objects.create(request=dar).perform_validation()
+
+    def _load(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('secure_computation:tee_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_demo_attestation_generated_once_per_key(self):
+        with mock.patch.object(tee_gateway, 'generate_attestation', wraps=tee_gateway.generate_attestation) as sign:
+            first, _ = self._load()
+            second, _ = self._load()
+            self.assertEqual(sign.call_count, 1)
+            self.assertEqual(first.context['demo_tee'], second.context['demo_tee'])
+            enclave.rotate()
+            third, _ = self._load()
+            self.assertEqual(sign.call_count, 2)
+        self.assertEqual(third.context['demo_tee']['attestation']['key_id'], tee_gateway.key_id)
+
+    def test_listing_query_count_does_not_grow(self):
+        self._validate(2)
+        _, few = self._load()
+        self._validate(5)
+        response, many = self._load()
+        self.assertEqual(len(response.context['validations']), 7)
+        self.assertEqual(many, few)
+
+
+class BatchValidationTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@test.com', password='pass')
+        self.requester = User.objects.create_user(username='requester', email='requester@test.com', password='pass')
+        self.contract = Contract.objects.create(title='Test Contract', owner=self.owner)
+        self.dars = [
+            DataAccessRequest.objects.create(contract=self.contract, requester=self.requester) for _ in range(5)
+        ]
+
+    def _dars(self):
+        return list(DataAccessRequest.objects.filter(pk__in=[d.pk for d in self.dars]).select_related('contract'))
+
+    def test_batch_signs_once_and_every_row_verifies(self):
+        with mock.patch.object(tee_gateway, '_sign', wraps=tee_gateway._sign) as sign:
+            validations = validate_batch(self._dars())
+        self.assertEqual(sign.call_count, 1)
+        self.assertEqual(len(validations), 5)
+        self.assertEqual(AuditEvent.objects.filter(event_type='secure_computation_validated').count(), 5)
+        for validation in SecureComputationValidation.objects.all():
+            self.assertTrue(validation.overall_verified)
+            self.assertTrue(tee_gateway.verify_attestation(validation.tee_attestation))
+
+    def test_tampered_result_fails_verification(self):
+        validation = validate_batch(self._dars())[0]
+        attestation = dict(validation.tee_attestation)
+        result = dict(validation.computation_result, request_id=999)
+        attestation['signed_result'] = canonical_result(result).decode()
+        self.assertFalse(tee_gateway.verify_attestation(attestation))
+
+    def test_query_count_does_not_grow_with_batch(self):
+        """Lookup, bulk create, re-fetch, key registration, bulk update and one audit insert, however many rows"""
+        dars = self._dars()
+        with self.assertNumQueries(6):
+            validate_batch(dars)
+
+    def test_verified_requests_are_skipped(self):
+        first = SecureComputationValidation.objects.create(request=self.dars[0])
+        first.perform_validation()
+        signature = first.tee_attestation['signature']
+        validate_batch(self._dars(), batch_size=2)
+        first.refresh_from_db()
+        self.assertEqual(first.tee_attestation['signature'], signature)
+        self.assertEqual(SecureComputationValidation.objects.filter(overall_verified=True).count(), 5)
+
+    def test_validate_requests_command(self):
+        out = StringIO()
+        call_command('validate_requests', '--batch-size', '2', stdout=out)
+        self.assertIn('5 request(s) validated in 3 batch(es)', out.getvalue())
+
+
+class SecretSharingTestCase(TestCase):
+    def _check_backend(self):
+        values = [1.5, -2.25, 1000, 0, 42.125]
+        shares = smpc.share(values)
+        self.assertEqual(len(shares), smpc.DEFAULT_PARTIES)
+        self.assertEqual(
+            smpc.decode_scalar(smpc.reconstruct_scalar(smpc.sum_shared(shares))), sum(values)
+        )
+        other = smpc.share([2, 2, 2, 2, 2])
+        self.assertAlmostEqual(
+            smpc.decode_scalar(smpc.reconstruct_scalar(smpc.dot_shared(shares, other)), 2 * smpc.FRACTIONAL_BITS),
+            2 * sum(values)
+        )
+        result = smpc.aggregate(values)
+        self.assertTrue(result['verified'])
+        self.assertEqual(result['mean'], sum(values) / len(values))
+        self.assertAlmostEqual(result['sum_of_squares'], sum(v * v for v in values), places=2)
+        return result
+
+    def test_default_backend(self):
+        self._check_backend()
+
+    def test_list_backend(self):
+        with mock.patch.object(smpc, 'np', None):
+            result = self._check_backend()
+            self.assertEqual(len(result['share_checksums']), smpc.DEFAULT_PARTIES)
+
+    def test_chunked_dot_product(self):
+        values = list(range(-50, 50))
+        shares = smpc.share(values, fractional_bits=0)
+        with mock.patch.object(smpc, 'CHUNK_ELEMENTS', 16):
+            dot = smpc.dot_shared(shares, shares)
+        self.assertEqual(smpc.decode_scalar(smpc.reconstruct_scalar(dot), 0), sum(v * v for v in values))
+
+    def test_shares_hide_values(self):
+        shares = smpc.share([7] * 8, fractional_bits=0)
+        self.assertTrue(any(int(v) != 7 for v in shares[0]))
+
+    @override_settings(SMPC_PARTY_PROCESSES=True)
+    def test_validation_aggregates_contract_figures(self):
+        owner = User.objects.create_user(username='owner', password='pass')
+        contract = Contract.objects.create(
+            title='Test Contract', owner=owner, policy={'retention_days': 30, 'budget': 1200.5, 'purpose': 'research'}
+        )
+        dar = DataAccessRequest.objects.create(contract=contract, requester=owner)
+        validation = SecureComputationValidation.objects.create(request=dar)
+        validation.perform_validation()
+        self.assertTrue(validation.smpc_verified)
+        self.assertEqual(validation.smpc_result['runtime'], 'processes')
+        self.assertEqual(validation.smpc_result['elements'], 2)
+        self.assertAlmostEqual(validation.smpc_result['sum'], 1200.5 + 30, places=2)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('smpc_benchmark', '--sizes', '100', '1000', stdout=out)
+        self.assertIn('1,000', out.getvalue())
+
+
+@skipUnless(smpc.np is not None, "NumPy is not installed; only the list backend is available")
+class NumpyBackendTestCase(TestCase):
+    """The uint64 array arithmetic agrees with exact Python integer arithmetic."""
+    EDGE = [0, 1, 2, (1 << 31) - 1, 1 << 31, (1 << 60) + 12345, smpc.PRIME - 2, smpc.PRIME - 1]
+
+    def array(self, elements):
+        return smpc.np.array(elements, dtype=smpc.np.uint64)
+
+    def test_backend_is_numpy(self):
+        self.assertEqual(smpc.BACKEND, 'numpy')
+        self.assertEqual(smpc.aggregate([1, 2, 3])['backend'], 'numpy')
+
+    def test_field_operations_match_python_integers(self):
+        a = self.EDGE + [int(v) for v in smpc.random_elements(64)]
+        b = list(reversed(a))
+        x, y = self.array(a), self.array(b)
+        self.assertEqual([int(v) for v in smpc.mul(x, y)], [p * q % smpc.PRIME for p, q in zip(a, b)])
+        self.assertEqual([int(v) for v in smpc.mul(x, smpc.PRIME - 1)], [p * (smpc.PRIME - 1) % smpc.PRIME for p in a])
+        self.assertEqual([int(v) for v in smpc.add(x, y)], [(p + q) % smpc.PRIME for p, q in zip(a, b)])
+        self.assertEqual([int(v) for v in smpc.sub(x, y)], [(p - q) % smpc.PRIME for p, q in zip(a, b)])
+
+    def test_total_does_not_overflow(self):
+        elements = [smpc.PRIME - 1] * 5000
+        self.assertEqual(smpc.total(self.array(elements)), sum(elements) % smpc.PRIME)
+
+    def test_random_elements_are_in_the_field(self):
+        elements = smpc.random_elements(10000)
+        self.assertEqual(elements.dtype, smpc.np.uint64)
+        self.assertTrue((elements < smpc.np.uint64(smpc.PRIME)).all())
+
+    def test_encoding_matches_list_backend(self):
+        values = [1.5, -2.25, 1000, 0, -0.0001]
+        with mock.patch.object(smpc, 'np', None):
+            expected = smpc.encode(values)
+        self.assertEqual([int(v) for v in smpc.encode(values)], expected)
+
+    def test_checksums_match_across_backends(self):
+        elements = [1, 2, smpc.PRIME - 1]
+        with mock.patch.object(smpc, 'np', None):
+            expected = smpc.share_checksum(elements)
+            wire = smpc.to_bytes(elements)
+        self.assertEqual(smpc.share_checksum(self.array(elements)), expected)
+        self.assertEqual([int(v) for v in smpc.from_bytes(wire)], elements)
+
+
+class PartyRuntimeTestCase(TestCase):
+    def test_parties_run_in_separate_processes(self):
+        with smpc_runtime.PartyRuntime(3) as runtime:
+            self.assertEqual(len({p.pid for p in runtime._processes} - {os.getpid()}), 3)
+            # Spawned, so the parties share nothing with a (possibly threaded) web process
+            self.assertTrue(all(p._start_method == 'spawn' for p in runtime._processes))
+            results = runtime.aggregate_many([[1, 2, 3.5], [], [-4, 10]])
+        self.assertEqual([r['sum'] for r in results], [6.5, 0, 6])
+        self.assertEqual(results[2]['sum_of_squares'], 116)
+        self.assertTrue(all(r['verified'] for r in results))
+        rounds = {r['name']: r for r in results[0]['rounds']}
+        self.assertEqual(list(rounds), ['distribute', 'open', 'output'])
+        # 5 elements: 4 vectors of 8 bytes to each of 3 parties; d and e to 2 peers from each party
+        self.assertEqual(rounds['distribute']['bytes'], 5 * 8 * 4 * 3)
+        self.assertEqual(rounds['open']['bytes'], 5 * 8 * 2 * 2 * 3)
+
+    def test_dead_party_raises_and_runtime_restarts(self):
+        runtime = smpc_runtime.get_runtime()
+        runtime._processes[1].kill()
+        runtime._processes[1].join()
+        with self.assertRaises(smpc_runtime.SMPCRuntimeError):
+            runtime.aggregate([1, 2, 3])
+        restarted = smpc_runtime.get_runtime()
+        self.assertIsNot(restarted, runtime)
+        self.assertEqual(restarted.aggregate([1, 2, 3])['sum'], 6)
+
+    def test_party_exits_quietly_when_a_peer_is_gone(self):
+        """A party whose peer has gone away returns instead of dying with a traceback"""
+        control, party_control = multiprocessing.Pipe()
+        peer, gone = multiprocessing.Pipe()
+        gone.close()
+        control.send(('aggregate', [(0, 2)]))
+        for part in smpc.share([1.0, 2.0], 2)[0], [0, 0], [0, 0], [0, 0]:
+            control.send_bytes(smpc.to_bytes(part))
+        with mock.patch('threading.excepthook') as excepthook:
+            smpc_runtime._party_main(0, party_control, {1: peer})
+        excepthook.assert_not_called()
+        self.assertFalse(control.poll())
+
+    def test_in_process_by_default(self):
+        result = smpc_runtime.aggregate_many([[1, 2]])[0]
+        self.assertEqual(result['sum'], 3)
+        self.assertNotIn('runtime', result)
+
+
+class RangeProofTestCase(TestCase):
+    def test_proof_verifies_and_is_bound_to_context(self):
+        proof = zkp.prove_range(30, 0, 36500, context='request:1:retention_days')
+        self.assertEqual(proof['bits'], 16)
+        self.assertTrue(zkp.verify(proof, context='request:1:retention_days'))
+        self.assertFalse(zkp.verify(proof, context='request:2:retention_days'))
+
+    def test_value_outside_range_cannot_be_proved(self):
+        with self.assertRaises(ValueError):
+            zkp.prove_range(36501, 0, 36500)
+
+    def test_tampered_proofs_fail(self):
+        proof = zkp.prove_range(5, 1, 10)
+        other = dict(proof, commitment=zkp.encode_point(zkp.commit(5)[0]).hex())
+        self.assertFalse(zkp.verify(other))
+        rows = [list(row) for row in proof['lower']]
+        rows[0][4] = zkp._scalar(int(rows[0][4], 16) + 1)
+        self.assertFalse(zkp.verify(dict(proof, lower=rows)))
+        self.assertFalse(zkp.verify(dict(proof, hi=20)))
+        self.assertFalse(zkp.verify(dict(proof, commitment='02' + 'ff' * 32)))
+
+    def test_batch_verification(self):
+        proofs = [zkp.prove_range(v, 0, 100, context=str(v)) for v in (0, 1, 50, 100)]
+        self.assertTrue(zkp.batch_verify(proofs))
+        self.assertTrue(zkp.batch_verify([]))
+        bad = dict(proofs[2], commitment=proofs[3]['commitment'])
+        self.assertFalse(zkp.batch_verify(proofs + [bad]))
+        results = zkp.verify_statements([
+            zkp.prove_statements([('v', 7, 0, 100)], 'a'),
+            dict(zkp.prove_statements([('v', 7, 0, 100)], 'b'), proofs={'v': bad}),
+            zkp.prove_statements([('v', 700, 0, 100)], 'c'),
+        ])
+        self.assertEqual([r['verified'] for r in results], [True, False, False])
+        self.assertEqual(results[2]['failed'], ['v'])
+
+    def test_multi_mul_matches_scalar_multiplication(self):
+        pairs = [(zkp.G, 3), (zkp.H, 5), (zkp.G, zkp.N - 3)]
+        self.assertTrue(zkp._equal(zkp.multi_mul(pairs), zkp._mul(zkp.H, 5)))
+
+    @override_settings(ZKP_RETENTION_DAYS_RANGE=(0, 365))
+    def test_validation_proves_retention_within_policy(self):
+        owner = User.objects.create_user(username='owner', password='pass')
+        within = Contract.objects.create(title='A', owner=owner, policy={'retention_days': 30})
+        beyond = Contract.objects.create(title='B', owner=owner, policy={'retention_days': 400})
+        dars = [DataAccessRequest.objects.create(contract=c, requester=owner) for c in (within, beyond)]
+        validations = validate_batch(DataAccessRequest.objects.filter(pk__in=[d.pk for d in dars])
+                                     .select_related('contract').order_by('pk'))
+        self.assertTrue(validations[0].zkp_verified)
+        self.assertEqual(validations[0].zkp_proof['statements'], {'retention_days': [0, 365]})
+        self.assertTrue(zkp.verify(validations[0].zkp_proofs['retention_days'],
+                                   context=f'request:{dars[0].pk}:retention_days'))
+        self.assertFalse(validations[1].zkp_verified)
+        self.assertFalse(validations[1].overall_verified)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('zkp_benchmark', '--counts', '2', '--max-value', '100', stdout=out)
+        self.assertIn('x', out.getvalue().splitlines()[1])
+
+
+class CompactStorageTestCase(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username='owner', password='pass')
+        contract = Contract.objects.create(title='Test Contract', owner=owner, policy={'retention_days': 30})
+        self.dar = DataAccessRequest.objects.create(contract=contract, requester=owner)
+
+    def test_proof_encoding_round_trips(self):
+        proofs = zkp.prove_statements([('a', 30, 0, 36500), ('b', -5, -10, 2 ** 70)], 'ctx')['proofs']
+        data = zkp.encode_proofs(proofs)
+        self.assertEqual(zkp.decode_proofs(data), proofs)
+        self.assertLess(len(data), len(json.dumps(proofs)) / 2)
+        with self.assertRaises(ValueError):
+            zkp.decode_proofs(data[:-1])
+
+    def test_validation_stores_result_and_key_once(self):
+        validation = SecureComputationValidation.objects.create(request=self.dar)
+        validation.perform_validation()
+        validation.refresh_from_db()
+        self.assertEqual(set(validation.tee_attestation), {'signed_data', 'signature', 'verified'})
+        self.assertEqual(validation.computation_result['request_id'], self.dar.id)
+        self.assertEqual(validation.attestation_data['key_id'], validation.tee_key_id)
+        self.assertNotIn('proofs', validation.zkp_proof)
+        self.assertTrue(zkp.verify(validation.zkp_proofs['retention_days']))
+
+    def test_backfill_compacts_existing_rows(self):
+        backfill = import_module('secure_computation.migrations.0005_compact_validations')
+        result = tee_gateway.perform_secure_computation({'request_id': self.dar.id})
+        attestation = tee_gateway.generate_attestation(result)
+        # Rows of that age were signed over the json.dumps encoding
+        attestation['signature'] = crypto_pool.sign(
+            tee_gateway.attestation_key, canonical.legacy_bytes(attestation['attestation_data'])
+        ).hex()
+        statements = zkp.verify_statements([zkp.prove_statements([('retention_days', 30, 0, 36500)], 'ctx')])[0]
+        validation = SecureComputationValidation.objects.create(
+            request=self.dar,
+            zkp_proof=statements,
+            tee_attestation={
+                'key_id': attestation['key_id'], 'enclave_id': tee_gateway.enclave_id,
+                'measurement': tee_gateway.measurement, 'computation_result': result,
+                'attestation_data': attestation['attestation_data'], 'signature': attestation['signature'],
+                'public_key': tee_gateway.identity.public_key_pem, 'verified': True, 'computation_time': 0.1,
+            },
+        )
+        with self.assertLogs(backfill.logger, 'INFO') as logs:
+            backfill.compact_validations(django_apps, None)
+        self.assertIn('1 secure computation validations', logs.output[0])
+        # The frozen encoder writes what the current decoder reads
+        self.assertEqual(backfill.encode_proofs(statements['proofs']), zkp.encode_proofs(statements['proofs']))
+        validation.refresh_from_db()
+        self.assertEqual(validation.tee_key_id, attestation['key_id'])
+        self.assertEqual(set(validation.tee_attestation), {'attestation_data', 'signature', 'verified'})
+        self.assertTrue(tee_gateway.verify_attestation(validation.tee_attestation))
+        self.assertEqual(validation.zkp_proofs, statements['proofs'])
+
+
+class CryptoPoolTestCase(TestCase):
+    def setUp(self):
+        self.executor = crypto_pool.CryptoExecutor(workers=2, max_pending=2, min_batch=4, chunk_size=8)
+        self.addCleanup(self.executor.shutdown)
+
+    def _keys(self):
+        from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+        return ec.generate_private_key(ec.SECP256R1()), ed25519.Ed25519PrivateKey.generate()
+
+    def test_pool_signatures_verify(self):
+        messages = [f'message {i}'.encode() for i in range(40)]
+        for key in self._keys():
+            signatures = self.executor.sign_many(key, messages)
+            der = crypto_pool.public_der(key.public_key())
+            self.assertTrue(all(crypto_pool.verify(der, m, s) for m, s in zip(messages, signatures)))
+            items = [(der, m, s) for m, s in zip(messages, signatures)]
+            items[7] = (der, b'tampered', signatures[7])
+            self.assertEqual(self.executor.verify_many(items), [i != 7 for i in range(40)])
+        # Every task released its slot
+        self.assertEqual(self.executor._slots._value, self.executor.max_pending)
+
+    def test_small_bursts_run_inline(self):
+        key, _ = self._keys()
+        with mock.patch.object(self.executor, '_get_pool') as get_pool:
+            self.assertEqual(len(self.executor.sign_many(key, [b'a', b'b', b'c'])), 3)
+        get_pool.assert_not_called()
+
+    def test_dead_pool_falls_back_inline(self):
+        key, _ = self._keys()
+        self.executor.sign_many(key, [b'x'] * 8)
+        for process in self.executor._pool._processes.values():
+            process.kill()
+            process.join()
+        signatures = self.executor.sign_many(key, [b'y'] * 8)
+        der = crypto_pool.public_der(key.public_key())
+        self.assertTrue(all(crypto_pool.verify(der, b'y', s) for s in signatures))
+        self.assertIsNone(self.executor._pool)
+
+    @override_settings(CRYPTO_POOL_WORKERS=2, CRYPTO_POOL_MIN_BATCH=4)
+    def test_tee_attestation_burst(self):
+        results = tee_gateway.perform_secure_computations([{'request_id': i} for i in range(10)])
+        attestations = tee_gateway.generate_attestations(results)
+        self.assertEqual(len({a['signature'] for a in attestations}), 10)
+        attestations[3] = dict(attestations[3], signature=attestations[4]['signature'])
+        self.assertEqual(tee_gateway.verify_attestations(attestations), [i != 3 for i in range(10)])
@@ -1,10 +1,40 @@
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
 from django.db import models
-from .models import SecureComputationValidation, TEEGateway
+from .enclave import rotation_period
+from .models import SecureComputationValidation, tee_gateway
 from requests_app.models import DataAccessRequest
 import json
 
+DEMO_REQUEST_DATA = {
+    'request_id': 'example-123',
+    'contract_id': 'example-contract-456',
+    'requester_id': 'example-user-789',
+    'contract_owner_id': 'example-owner-101'
+}
+
+
+def demo_tee():
+    """
+    The example computation and attestation shown on the dashboard. It only
+    depends on the enclave key, so it is generated once per key and cached.
+    """
+    identity = tee_gateway.identity
+    key = f'tee_dashboard:demo:{identity.key_id}'
+    demo = cache.get(key)
+    if demo is None:
+        computation = tee_gateway.perform_secure_computation(DEMO_REQUEST_DATA)
+        demo = {
+            'enclave_id': identity.enclave_id,
+            'measurement': identity.measurement,
+            'computation': computation,
+            'attestation': tee_gateway.generate_attestation(computation)
+        }
+        cache.set(key, demo, int(rotation_period().total_seconds()))
+    return demo
+
+
 @login_required
 def tee_dashboard(request):
     """Dashboard showing TEE attestation and cryptographic verification details"""
@@ -21,39 +51,21 @@ def tee_dashboard(request):
             selected_contract = Contract.objects.get(id=contract_filter, owner=request.user)
             validations = SecureComputationValidation.objects.filter(
                 request__contract=selected_contract
-            ).order_by('-created_at')[:20]
+            ).select_related('request').order_by('-created_at')[:20]
         except Contract.DoesNotExist:
             validations = SecureComputationValidation.objects.none()
     else:
-        # Show validations for user's contracts OR user's requests
+        # Show validations for user's contracts OR user's requests; request is one-to-one, so no duplicates
         validations = SecureComputationValidation.objects.filter(
             models.Q(request__contract__owner=request.user) |  # Contracts owned by user
             models.Q(request__requester=request.user)          # Requests made by user
-        ).distinct().order_by('-created_at')[:20]
-
-    # Create TEE instance to show capabilities
-    tee_instance = TEEGateway()
-    request_data = {
-        'request_id': 'example-123',
-        'contract_id': 'example-contract-456',
-        'requester_id': 'example-user-789',
-        'contract_owner_id': 'example-owner-101'
-    }
-
-    # Perform computation and attestation
-    computation = tee_instance.perform_secure_computation(request_data)
-    attestation = tee_instance.generate_attestation(computation)
+        ).select_related('request').order_by('-created_at')[:20]
 
     context = {
         'validations': validations,
         'user_contracts': user_contracts,
         'selected_contract': contract_filter,
-        'demo_tee': {
-            'enclave_id': tee_instance.enclave_id,
-            'measurement': tee_instance.measurement,
-            'computation': computation,
-            'attestation': attestation
-        },
+        'demo_tee': demo_tee(),
         'page_title': 'TEE Security Dashboard'
     }
 
@@ -76,7 +88,6 @@ def tee_validation_detail(request, validation_id):
     attestation_valid = False
     if validation.tee_attestation and 'signature' in validation.tee_attestation:
         try:
-            tee_gateway = TEEGateway()
             attestation_valid = tee_gateway.verify_attestation(validation.tee_attestation)
         except:
             attestation_valid = False
@@ -1,3 +1,58 @@
+import io
+
+from cryptography.fernet import InvalidToken
 from django.test import TestCase
+from .utils import CHUNK_SIZE, FILE_ID_SIZE, STREAM_MAGIC, decrypt_bytes, encrypt_bytes, iter_decrypt, iter_encrypt
+
+
+class ChunkedEncryptionTestCase(TestCase):
+    def encrypt(self, data, chunk_size=CHUNK_SIZE):
+        return b''.join(iter_encrypt([data], chunk_size))
+
+    def split(self, enc):
+        """The stream header and its length-prefixed records."""
+        header_size = len(STREAM_MAGIC) + FILE_ID_SIZE
+        header, records, pos = enc[:header_size], [], header_size
+        while pos < len(enc):
+            end = pos + 4 + int.from_bytes(enc[pos:pos + 4], 'big')
+            records.append(enc[pos:end])
+            pos = end
+        return header, records
+
+    def test_round_trip(self):
+        for size in (0, 1, 15, 16, 17, 100):
+            data = bytes(range(256)) * (size // 256 + 1)
+            data = data[:size]
+            enc = self.encrypt(data, chunk_size=16)
+            self.assertEqual(decrypt_bytes(enc), data)
+            self.assertEqual(b''.join(iter_decrypt(io.BytesIO(enc))), data)
+
+    def test_decrypts_in_chunks(self):
+        enc = self.encrypt(b'x' * 40, chunk_size=16)
+        self.assertEqual([len(c) for c in iter_decrypt(io.BytesIO(enc))], [16, 16, 8])
+
+    def test_legacy_single_token_files(self):
+        self.assertEqual(decrypt_bytes(encrypt_bytes(b'legacy')), b'legacy')
+        self.assertEqual(b''.join(iter_decrypt(io.BytesIO(encrypt_bytes(b'legacy')))), b'legacy')
+
+    def test_truncated_stream_is_rejected(self):
+        enc = self.encrypt(b'x' * 40, chunk_size=16)
+        first_record_end = enc.index(b'gAAAA', enc.index(b'gAAAA') + 1) - 4
+        with self.assertRaises(InvalidToken):
+            decrypt_bytes(enc[:first_record_end])
 
-# Create your tests here.
+    def test_tampered_streams_are_rejected(self):
+        header, records = self.split(self.encrypt(b'a' * 40, chunk_size=16))
+        other_header, other_records = self.split(self.encrypt(b'b' * 40, chunk_size=16))
+        self.assertEqual(len(records), 3)
+        tampered = {
+            'reordered': header + records[1] + records[0] + records[2],
+            'duplicated': header + records[0] + records[0] + records[1] + records[2],
+            'last chunk dropped': header + records[0] + records[1],
+            'spliced from another file': header + records[0] + other_records[1] + records[2],
+            'other file id': other_header + b''.join(records),
+            'data after the last chunk': header + b''.join(records) + other_records[2],
+        }
+        for name, enc in tampered.items():
+            with self.subTest(name), self.assertRaises(InvalidToken):
+                decrypt_bytes(enc)
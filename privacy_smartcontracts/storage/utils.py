@@ -1,8 +1,32 @@
-from cryptography.fernet import Fernet
+"""
+Encryption helpers for stored objects.
+
+New uploads use a chunked format so files can be decrypted as a stream:
+
+    MAGIC | file id | (4-byte big-endian length | Fernet token)*
+
+The file id is 16 random bytes. Each token encrypts a 25-byte header (file id,
+chunk index, last-chunk flag) followed by up to CHUNK_SIZE bytes of plaintext,
+and decryption checks all three. A chunk spliced in from another file (same
+key, other id), a reordered or duplicated chunk, a stream cut short before its
+last chunk or extended after it is therefore rejected. Files written before the chunked format are a single
+Fernet token and are still read (in one piece) by the same functions.
+"""
+import io
+import os
+import struct
+
+from cryptography.fernet import Fernet, InvalidToken
 from django.conf import settings
 from django.core.files.base import ContentFile
 from .models import StoredObject
 
+STREAM_MAGIC = b'PSCSTRM2'
+CHUNK_SIZE = 64 * 1024
+FILE_ID_SIZE = 16
+_CHUNK_HEADER = struct.Struct(f'>{FILE_ID_SIZE}sQ?')
+_LENGTH = struct.Struct('>I')
+
 def get_fernet():
     key = settings.FERNET_KEY
     if not key:
@@ -17,13 +41,85 @@ def encrypt_bytes(raw_bytes: bytes) -> bytes:
     return f.encrypt(raw_bytes)
 
 def decrypt_bytes(enc_bytes: bytes) -> bytes:
+    if enc_bytes.startswith(STREAM_MAGIC):
+        return b''.join(iter_decrypt(io.BytesIO(enc_bytes)))
     f = get_fernet()
     return f.decrypt(enc_bytes)
 
+def _rechunk(chunks, size):
+    buffer = b''
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            yield buffer[:size]
+            buffer = buffer[size:]
+    yield buffer
+
+def iter_encrypt(chunks, chunk_size=CHUNK_SIZE):
+    """Encrypt an iterable of byte strings into the chunked format, yielding the output piece by piece."""
+    f = get_fernet()
+    file_id = os.urandom(FILE_ID_SIZE)
+    yield STREAM_MAGIC + file_id
+    pieces = _rechunk(chunks, chunk_size)
+    current = next(pieces)
+    index = 0
+    for following in pieces:
+        if not following:
+            break
+        token = f.encrypt(_CHUNK_HEADER.pack(file_id, index, False) + current)
+        yield _LENGTH.pack(len(token)) + token
+        current = following
+        index += 1
+    token = f.encrypt(_CHUNK_HEADER.pack(file_id, index, True) + current)
+    yield _LENGTH.pack(len(token)) + token
+
+def _read_exactly(fileobj, size):
+    data = fileobj.read(size)
+    if len(data) != size:
+        raise InvalidToken
+    return data
+
+def iter_decrypt(fileobj):
+    """Yield the plaintext of an encrypted file object chunk by chunk, in constant memory for chunked files."""
+    f = get_fernet()
+    magic = fileobj.read(len(STREAM_MAGIC))
+    if magic != STREAM_MAGIC:
+        # Legacy single-token file
+        yield f.decrypt(magic + fileobj.read())
+        return
+    file_id = _read_exactly(fileobj, FILE_ID_SIZE)
+    expected = 0
+    while True:
+        (length,) = _LENGTH.unpack(_read_exactly(fileobj, _LENGTH.size))
+        plain = f.decrypt(_read_exactly(fileobj, length))
+        if len(plain) < _CHUNK_HEADER.size:
+            raise InvalidToken
+        chunk_file_id, index, last = _CHUNK_HEADER.unpack_from(plain)
+        if chunk_file_id != file_id or index != expected:
+            raise InvalidToken
+        if last and fileobj.read(1):
+            # Data after the last chunk
+            raise InvalidToken
+        yield plain[_CHUNK_HEADER.size:]
+        if last:
+            return
+        expected += 1
+
 def save_encrypted_file(owner, uploaded_file, name=None, meta=None):
-    raw = uploaded_file.read()
-    enc = encrypt_bytes(raw)
+    if hasattr(uploaded_file, 'chunks'):
+        chunks = uploaded_file.chunks()
+    else:
+        chunks = iter(lambda: uploaded_file.read(CHUNK_SIZE), b'')
+    size = 0
+    def counted(chunks):
+        nonlocal size
+        for chunk in chunks:
+            size += len(chunk)
+            yield chunk
+    enc = b''.join(iter_encrypt(counted(chunks)))
     filename = (name or uploaded_file.name) + ".enc"
-    obj = StoredObject(owner=owner, name=(name or uploaded_file.name), meta=meta or {})
+    # Plaintext size, so streamed archives can write tar headers without a decryption pass
+    meta = dict(meta or {}, size=size)
+    obj = StoredObject(owner=owner, name=(name or uploaded_file.name), meta=meta)
     obj.encrypted_file.save(filename, ContentFile(enc), save=True)
     return obj